@@ -0,0 +1,324 @@
+"""
+Control de admisión para el sistema RAG: colas acotadas, límites por sesión y prioridades
+"""
+
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Deque
+
+from config import RAGConfig, rag_config
+
+logger = logging.getLogger(__name__)
+
+QUERY = "query"
+INGEST = "ingest"
+REQUEST_KINDS = (QUERY, INGEST)
+
+
+class RejectedError(Exception):
+    """Solicitud rechazada por el control de admisión"""
+
+    def __init__(self, message: str, retry_after: float, reason: str = "queue_full"):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    """Token bucket clásico: `rate` tokens por segundo con ráfaga máxima `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def try_acquire(self, now: Optional[float] = None) -> float:
+        """
+        Intenta consumir un token
+        Returns:
+            0.0 si se consumió, o los segundos hasta que haya un token disponible
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (1 - self.tokens) / self.rate
+
+    def is_idle(self, now: float) -> bool:
+        """True si el bucket estaría lleno (se puede descartar sin perder estado)"""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Waiter:
+    __slots__ = ("kind", "session_id", "enqueued", "granted")
+
+    def __init__(self, kind: str, session_id: str):
+        self.kind = kind
+        self.session_id = session_id
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class _KindStats:
+    """Métricas por tipo de solicitud (consultas o ingesta)"""
+
+    def __init__(self, window: int = 1000):
+        self.admitted = 0
+        self.completed = 0
+        self.rejected_rate_limited = 0
+        self.rejected_queue_full = 0
+        self.timed_out = 0
+        self.active = 0
+        self.waits: Deque[float] = deque(maxlen=window)
+        self.wait_max = 0.0
+        self.service_ewma = 0.0
+
+    def record_wait(self, seconds: float):
+        self.waits.append(seconds)
+        self.wait_max = max(self.wait_max, seconds)
+
+    def record_service(self, seconds: float):
+        # Media móvil exponencial para estimar el retry-after
+        if self.service_ewma == 0.0:
+            self.service_ewma = seconds
+        else:
+            self.service_ewma = 0.8 * self.service_ewma + 0.2 * seconds
+
+
+class AdmissionController:
+    """
+    Controla cuántas consultas e ingestas se ejecutan a la vez contra el sistema RAG.
+
+    Hay un número fijo de slots de ejecución compartidos. Las consultas interactivas
+    tienen prioridad sobre las ingestas, que además tienen su propio tope de slots.
+    Cada tipo tiene una cola de espera acotada y cada sesión un token bucket propio;
+    cuando no hay sitio la solicitud se rechaza de inmediato con un retry-after.
+    """
+
+    def __init__(self,
+                 max_concurrent: int = 4,
+                 max_concurrent_ingest: int = 1,
+                 query_queue_size: int = 32,
+                 ingest_queue_size: int = 8,
+                 query_rate_per_minute: float = 20.0,
+                 query_burst: int = 5,
+                 ingest_rate_per_minute: float = 4.0,
+                 ingest_burst: int = 2,
+                 max_wait_seconds: float = 30.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_concurrent_ingest = max(1, min(max_concurrent_ingest, self.max_concurrent))
+        self.queue_limits = {QUERY: query_queue_size, INGEST: ingest_queue_size}
+        self.bucket_params = {
+            QUERY: (query_rate_per_minute / 60.0, float(query_burst)),
+            INGEST: (ingest_rate_per_minute / 60.0, float(ingest_burst)),
+        }
+        self.max_wait_seconds = max_wait_seconds
+
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[_Waiter]] = {kind: deque() for kind in REQUEST_KINDS}
+        self._buckets: Dict[tuple, TokenBucket] = {}
+        self._stats = {kind: _KindStats() for kind in REQUEST_KINDS}
+        self._active = 0
+        self._last_prune = time.monotonic()
+
+    @classmethod
+    def from_config(cls, config: RAGConfig) -> "AdmissionController":
+        """Crea un controlador a partir de la configuración RAG"""
+        return cls(
+            max_concurrent=config.max_concurrent_requests,
+            max_concurrent_ingest=config.max_concurrent_ingest,
+            query_queue_size=config.query_queue_size,
+            ingest_queue_size=config.ingest_queue_size,
+            query_rate_per_minute=config.query_rate_per_minute,
+            query_burst=config.query_burst,
+            ingest_rate_per_minute=config.ingest_rate_per_minute,
+            ingest_burst=config.ingest_burst,
+            max_wait_seconds=config.max_queue_wait_seconds,
+        )
+
+    def _check_rate_limit(self, session_id: str, kind: str, now: float) -> float:
+        key = (session_id, kind)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, capacity = self.bucket_params[kind]
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+        return bucket.try_acquire(now)
+
+    def _prune_buckets(self, now: float):
+        # Las sesiones inactivas tienen el bucket lleno y se pueden olvidar
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        for key in [k for k, b in self._buckets.items() if b.is_idle(now)]:
+            del self._buckets[key]
+
+    def _can_run(self, kind: str) -> bool:
+        if self._active >= self.max_concurrent:
+            return False
+        if kind == INGEST:
+            return self._stats[INGEST].active < self.max_concurrent_ingest
+        return True
+
+    def _estimate_retry_after(self, kind: str) -> float:
+        stats = self._stats[kind]
+        service = stats.service_ewma or 1.0
+        slots = self.max_concurrent if kind == QUERY else self.max_concurrent_ingest
+        return max(1.0, (len(self._queues[kind]) + 1) * service / slots)
+
+    def _dispatch(self):
+        """Asigna slots libres a los que esperan, consultas primero"""
+        granted = False
+        for kind in REQUEST_KINDS:
+            queue = self._queues[kind]
+            while queue and self._can_run(kind):
+                waiter = queue.popleft()
+                waiter.granted = True
+                self._start(waiter.kind, time.monotonic() - waiter.enqueued)
+                granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _start(self, kind: str, waited: float):
+        stats = self._stats[kind]
+        self._active += 1
+        stats.active += 1
+        stats.admitted += 1
+        stats.record_wait(waited)
+
+    def acquire(self, session_id: str, kind: str = QUERY) -> float:
+        """
+        Reserva un slot de ejecución, esperando en cola si es necesario
+        Args:
+            session_id: Identificador de la sesión que hace la solicitud
+            kind: 'query' o 'ingest'
+        Returns:
+            Instante (monotonic) en que empezó la ejecución, para `release`
+        Raises:
+            RejectedError: si se supera el límite de la sesión, la cola está llena
+                o se agota el tiempo máximo de espera
+        """
+        if kind not in REQUEST_KINDS:
+            raise ValueError(f"Tipo de solicitud no reconocido: {kind}")
+
+        with self._cond:
+            now = time.monotonic()
+            self._prune_buckets(now)
+            stats = self._stats[kind]
+
+            # Entrada directa si hay slot y nadie con más prioridad esperando
+            nobody_ahead = not self._queues[kind] and (kind == QUERY or not self._queues[QUERY])
+            runs_now = nobody_ahead and self._can_run(kind)
+
+            # La cola llena se comprueba antes de consumir un token de la sesión
+            if not runs_now and len(self._queues[kind]) >= self.queue_limits[kind]:
+                stats.rejected_queue_full += 1
+                raise RejectedError(
+                    "El sistema está saturado, inténtalo más tarde",
+                    retry_after=self._estimate_retry_after(kind)
+                )
+
+            wait_for_token = self._check_rate_limit(session_id, kind, now)
+            if wait_for_token > 0:
+                stats.rejected_rate_limited += 1
+                raise RejectedError(
+                    "Has alcanzado el límite de solicitudes de tu sesión",
+                    retry_after=wait_for_token,
+                    reason="rate_limited"
+                )
+
+            if runs_now:
+                self._start(kind, 0.0)
+                return time.monotonic()
+
+            waiter = _Waiter(kind, session_id)
+            self._queues[kind].append(waiter)
+            deadline = waiter.enqueued + self.max_wait_seconds
+            while not waiter.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queues[kind].remove(waiter)
+                    stats.timed_out += 1
+                    raise RejectedError(
+                        "Tiempo de espera en cola agotado",
+                        retry_after=self._estimate_retry_after(kind),
+                        reason="timeout"
+                    )
+                self._cond.wait(remaining)
+            return time.monotonic()
+
+    def release(self, kind: str, started: float):
+        """Libera el slot reservado con `acquire`"""
+        with self._cond:
+            stats = self._stats[kind]
+            self._active -= 1
+            stats.active -= 1
+            stats.completed += 1
+            stats.record_service(time.monotonic() - started)
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, session_id: str, kind: str = QUERY):
+        """Context manager que envuelve `acquire`/`release`"""
+        started = self.acquire(session_id, kind)
+        try:
+            yield
+        finally:
+            self.release(kind, started)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Obtiene métricas de profundidad de cola y tiempos de espera
+        Returns:
+            Diccionario con métricas globales y por tipo de solicitud
+        """
+        with self._cond:
+            metrics = {
+                "active": self._active,
+                "max_concurrent": self.max_concurrent,
+                "tracked_sessions": len({key[0] for key in self._buckets}),
+            }
+            for kind in REQUEST_KINDS:
+                stats = self._stats[kind]
+                waits = sorted(stats.waits)
+                metrics[kind] = {
+                    "queue_depth": len(self._queues[kind]),
+                    "queue_limit": self.queue_limits[kind],
+                    "active": stats.active,
+                    "admitted": stats.admitted,
+                    "completed": stats.completed,
+                    "rejected_rate_limited": stats.rejected_rate_limited,
+                    "rejected_queue_full": stats.rejected_queue_full,
+                    "timed_out": stats.timed_out,
+                    "wait_avg_ms": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+                    "wait_p95_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+                    "wait_max_ms": round(1000 * stats.wait_max, 1),
+                }
+            return metrics
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Obtiene el controlador de admisión compartido por todo el proceso"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController.from_config(rag_config)
+            logger.info("Control de admisión inicializado")
+        return _controller
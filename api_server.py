@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Endpoint HTTP mínimo para hacer preguntas al sistema RAG
+
+Expone el mismo camino que el chat de la app (control de admisión por sesión y
+`RAGSystem.ask_question`) sin Streamlit, para integraciones y pruebas de carga.
+Usa solo la biblioteca estándar; cada petición se atiende en su propio hilo.
+
+    POST /ask     {"question": "...", "session_id": "..."}
+                  200 {"answer", "sources", "latency_ms", "queue_ms"}
+                  429 si el control de admisión la rechaza (cabecera Retry-After)
+                  500 si falla la cadena QA
+    GET  /health  estado de preparación del sistema
+
+Con `--metrics-port` (o RAG_METRICS_PORT) expone además `/metrics` en formato
+Prometheus en un listener aparte.
+
+Uso:
+    python api_server.py --port 8000 --metrics-port 9464
+    python api_server.py --offline --documents documents/ --llm-latency-ms 800
+"""
+
+import argparse
+import json
+import logging
+import math
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+from admission import QUERY, RejectedError, get_admission_controller
+from config import get_environment_config, rag_config
+from query_log import log_response
+from session_recorder import set_current_session
+
+logger = logging.getLogger("api_server")
+
+MAX_BODY_BYTES = 64 * 1024
+
+
+class RAGRequestHandler(BaseHTTPRequestHandler):
+    """Atiende /ask y /health sobre el RAGSystem del servidor"""
+
+    server_version = "RAGServer/1.0"
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            readiness = self.server.rag.get_readiness()
+            self._send_json(200 if readiness["state"] == "ready" else 503, readiness)
+        else:
+            self._send_json(404, {"error": "Ruta no encontrada"})
+
+    def do_POST(self):
+        if self.path != "/ask":
+            self._send_json(404, {"error": "Ruta no encontrada"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            # Una longitud negativa dejaría la lectura bloqueada hasta que el cliente cierre
+            self._send_json(400, {"error": "Content-Length inválido"})
+            return
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {"error": "Cuerpo demasiado grande"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            question = str(body.get("question") or "").strip()
+        except (json.JSONDecodeError, AttributeError):
+            self._send_json(400, {"error": "JSON inválido"})
+            return
+        if not question:
+            self._send_json(400, {"error": "La pregunta no puede estar vacía"})
+            return
+        session_id = str(body.get("session_id") or self.client_address[0])
+        set_current_session(session_id)
+
+        received = time.perf_counter()
+        admission = get_admission_controller()
+        try:
+            with admission.admit(session_id, QUERY):
+                queued = time.perf_counter() - received
+                response = self.server.rag.ask_question(question)
+        except RejectedError as e:
+            self._send_json(429, {"error": str(e), "reason": e.reason, "retry_after": round(e.retry_after, 1)},
+                            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+            return
+
+        log_response(response, 1000 * (time.perf_counter() - received), session=session_id)
+        result = {
+            "answer": response["answer"],
+            "sources": [doc.metadata.get("file_name", doc.metadata.get("source", "Desconocido"))
+                        for doc in response["source_documents"]],
+            "latency_ms": round(1000 * (time.perf_counter() - received), 2),
+            "queue_ms": round(1000 * queued, 2),
+        }
+        if response.get("error"):
+            self._send_json(500, {**result, "error": response["answer"]})
+        else:
+            self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.client_address[0]} {format % args}")
+
+
+class RAGServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Cola de conexiones del socket: las ráfagas esperan al control de admisión, no al kernel
+    request_queue_size = 128
+
+    def __init__(self, address, rag):
+        super().__init__(address, RAGRequestHandler)
+        self.rag = rag
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Endpoint HTTP del sistema RAG")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--persist-directory", default=rag_config.persist_directory,
+                        help="Directorio de la base de datos vectorial")
+    parser.add_argument("--offline", action="store_true",
+                        help="Usar proveedores offline (sin API de Google) con latencia simulada")
+    parser.add_argument("--documents", default=None, help="Con --offline: directorio a ingerir si el índice está vacío")
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0, help="Con --offline: latencia de embeddings")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0, help="Con --offline: latencia media del LLM")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="Con --offline: dispersión lognormal del LLM")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Con --offline: fracción de fallos del LLM")
+    parser.add_argument("--metrics-port", type=int, default=rag_config.metrics_port,
+                        help="Puerto del listener /metrics de Prometheus (0 lo desactiva)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=get_environment_config()["log_level"],
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.offline:
+        from offline_providers import build_offline_rag
+
+        rag = build_offline_rag(args.persist_directory, args.documents, args.embed_latency_ms,
+                                args.llm_latency_ms, args.llm_jitter, args.llm_error_rate)
+    else:
+        from rag_system import RAGSystem
+
+        rag = RAGSystem(persist_directory=args.persist_directory)
+        rag.warm_up(embed_probe=rag_config.warmup_embed_probe)
+    if rag.readiness != "ready":
+        print("Error: no se pudo cargar la base de datos o configurar la cadena QA", file=sys.stderr)
+        return 2
+
+    if args.metrics_port:
+        from metrics_server import start_metrics_server
+
+        start_metrics_server(rag_config.metrics_host, args.metrics_port)
+
+    server = RAGServer((args.host, args.port), rag)
+    logger.info(f"Escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,20 @@
 import streamlit as st
-import os
 import json
 import time
 from datetime import datetime
+import uuid
 from typing import List, Dict
 from rag_system import RAGSystem
-import pandas as pd
-from config import validate_environment, get_environment_config
+from config import validate_environment, get_environment_config, rag_config
+from admission import get_admission_controller, RejectedError, QUERY, INGEST
+from blob_store import get_blob_store
+from metrics import get_metrics_registry
+from memory_report import ChatHistory, track_session_history
+from metrics_server import start_metrics_server
+from profiling import profile_request
+from query_log import log_response
+from session_recorder import get_session_recorder, set_current_session
+from utils import format_file_size, format_timestamp
 
 # Configuración de la página
 st.set_page_config(
@@ -245,17 +253,28 @@ st.markdown("""
 
 # Inicializar variables de sesión PRIMERO
 if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = ChatHistory()
 if 'processed_documents' not in st.session_state:
     st.session_state.processed_documents = []
+if 'document_blobs' not in st.session_state:
+    # Hash del blob -> nombre mostrado: dos subidas distintas pueden llamarse igual
+    st.session_state.document_blobs = {}
 if 'total_questions' not in st.session_state:
     st.session_state.total_questions = 0
+
 if 'total_docs' not in st.session_state:
     st.session_state.total_docs = 0
 if 'theme' not in st.session_state:
     st.session_state.theme = 'light'
 if 'rag_system_ready' not in st.session_state:
     st.session_state.rag_system_ready = False
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# Las interacciones de esta ejecución se graban (si está activado) bajo esta sesión
+set_current_session(st.session_state.session_id)
+# El informe de memoria cuenta el historial mientras la sesión siga viva
+track_session_history(st.session_state.session_id, st.session_state.chat_history)
 
 # Validar configuración del entorno
 env_valid, env_errors = validate_environment()
@@ -266,12 +285,23 @@ if not env_valid:
     st.info("💡 **Solución:** Configura tu API key de Google en el archivo .env")
     st.code("GOOGLE_API_KEY=tu_api_key_aqui", language="bash")
     st.stop()
+# Listener /metrics (una vez por proceso, compartido por todas las sesiones)
+@st.cache_resource
+def start_metrics_listener():
+    if rag_config.metrics_port:
+        return start_metrics_server(rag_config.metrics_host, rag_config.metrics_port)
+    return None
+
+start_metrics_listener()
+
 # Inicializar RAGSystem con manejo de errores mejorado
 @st.cache_resource
 def create_rag_system():
-    """Crea una instancia del sistema RAG (sin modificar session_state)"""
+    """Crea una instancia del sistema RAG ya precalentada (sin modificar session_state)"""
     try:
-        return RAGSystem()
+        rag = RAGSystem()
+        rag.warm_up(embed_probe=rag_config.warmup_embed_probe)
+        return rag
     except Exception as e:
         st.error(f"❌ Error inicializando el sistema RAG: {str(e)}")
         return None
@@ -281,6 +311,7 @@ def get_rag_system():
     rag = create_rag_system()
     if rag:
         st.session_state.rag_system_ready = True
+        st.session_state.rag_system = rag
         return rag
     else:
         st.session_state.rag_system_ready = False
@@ -292,6 +323,7 @@ try:
         test_rag = create_rag_system()
         if test_rag:
             st.session_state.rag_system_ready = True
+            st.session_state.rag_system = test_rag
         else:
             st.session_state.rag_system_ready = False
 except Exception as e:
@@ -316,12 +348,21 @@ st.markdown(f"""
 with st.sidebar:
     st.header("📊 Panel de Control")
     
+    # Estadísticas reales del índice (del catálogo; la sesión solo cuenta sus subidas)
+    index_stats = {}
+    rag_in_session = st.session_state.get('rag_system')
+    if rag_in_session is not None and rag_in_session.vectorstore is not None:
+        try:
+            index_stats = rag_in_session.get_index_stats()
+        except Exception as e:
+            st.caption(f"⚠️ Estadísticas no disponibles: {str(e)}")
+    
     # Métricas
     col1, col2 = st.columns(2)
     with col1:
         st.markdown(f"""
         <div class="metric-card">
-            <h3>📁 {st.session_state.total_docs}</h3>
+            <h3>📁 {index_stats.get("files", st.session_state.total_docs)}</h3>
             <p>Documentos</p>
         </div>
         """, unsafe_allow_html=True)
@@ -342,6 +383,18 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
     
+    if index_stats:
+        last_ingest = format_timestamp(index_stats["last_ingest"]) if index_stats["last_ingest"] else "—"
+        st.caption(
+            f"🧩 {index_stats['chunks']} chunks · 💾 {format_file_size(index_stats['disk_bytes'])} en disco · "
+            f"🔢 generación {index_stats['index_generation']} · 🕒 última ingesta {last_ingest}"
+        )
+    
+    if st.session_state.rag_system_ready:
+        readiness = create_rag_system().get_readiness()
+        with st.expander(f"🔥 Preparación: {readiness['state']}"):
+            st.json(readiness)
+    
     st.divider()
     
     # Gestión de documentos
@@ -373,59 +426,96 @@ with st.sidebar:
                         if not rag:
                             st.error("❌ Error: No se pudo inicializar el sistema RAG")
                         else:
-                            temp_dir = "./temp_docs"
-                            os.makedirs(temp_dir, exist_ok=True)
-                            file_paths = []
+                            admission = get_admission_controller()
+                            with admission.admit(st.session_state.session_id, INGEST):
+                                store = get_blob_store()
+                                blobs = {}
+                                already_indexed = []
+                            
+                                # Guardar archivos (por contenido: los duplicados se reutilizan)
+                                status_text.text("📋 Guardando archivos...")
+                                progress_bar.progress(20)
                             
-                            # Guardar archivos
-                            status_text.text("📋 Guardando archivos...")
-                            progress_bar.progress(20)
+                                for uploaded_file in uploaded_files:
+                                    blob = store.put(uploaded_file, uploaded_file.name)
+                                    if store.refcount(blob.digest) > 0:
+                                        already_indexed.append(uploaded_file.name)
+                                        # Indexado por otra sesión (o antes): esta sesión también lo usa
+                                        if blob.digest not in st.session_state.document_blobs:
+                                            store.acquire(blob.digest)
+                                            st.session_state.document_blobs[blob.digest] = blob.name
+                                    else:
+                                        blobs.setdefault(blob.digest, blob)
+                                st.session_state.processed_documents = list(st.session_state.document_blobs.values())
+                                st.session_state.total_docs = len(st.session_state.processed_documents)
+                                upload_cache = get_metrics_registry().counter(
+                                    "rag_cache_requests_total", "Consultas a cachés por caché y resultado",
+                                    ("cache", "result"))
+                                upload_cache.labels("upload", "hit").inc(len(already_indexed))
+                                upload_cache.labels("upload", "miss").inc(len(uploaded_files) - len(already_indexed))
                             
-                            for uploaded_file in uploaded_files:
-                                file_path = os.path.join(temp_dir, uploaded_file.name)
-                                with open(file_path, "wb") as f:
-                                    f.write(uploaded_file.getbuffer())
-                                file_paths.append(file_path)
+                                if already_indexed:
+                                    st.info(f"ℹ️ Ya indexados, se omiten: {', '.join(already_indexed)}")
+                                    recorder = get_session_recorder()
+                                    if recorder is not None:
+                                        recorder.record("reupload", files=already_indexed)
                             
-                            # Cargar documentos
-                            status_text.text("📄 Cargando documentos...")
-                            progress_bar.progress(50)
+                                # Cargar documentos
+                                status_text.text("📄 Cargando documentos...")
+                                progress_bar.progress(50)
                             
-                            documents = rag.load_documents(file_paths)
-                            if documents:
-                                # Procesar documentos
-                                status_text.text("⚙️ Procesando y creando embeddings...")
-                                progress_bar.progress(80)
-                                
-                                if rag.process_documents(documents):
-                                    st.session_state.processed_documents.extend([f.name for f in uploaded_files])
-                                    st.session_state.total_docs = len(st.session_state.processed_documents)
+                                # Con el modo debug, carga y procesado se perfilan como una sola ingesta
+                                with profile_request("ingest", ", ".join(blob.name for blob in blobs.values())):
+                                    documents = rag.load_documents(
+                                        [blob.path for blob in blobs.values()],
+                                        display_names=[blob.name for blob in blobs.values()]
+                                    )
+                                    if documents:
+                                        # Procesar documentos
+                                        status_text.text("⚙️ Procesando y creando embeddings...")
+                                        progress_bar.progress(80)
+                                        processed = rag.process_documents(documents)
+                                if documents:
+                                    if processed:
+                                        for blob in blobs.values():
+                                            store.acquire(blob.digest)
+                                            st.session_state.document_blobs[blob.digest] = blob.name
+                                        st.session_state.processed_documents = list(st.session_state.document_blobs.values())
+                                        st.session_state.total_docs = len(st.session_state.processed_documents)
                                     
-                                    progress_bar.progress(100)
-                                    status_text.text("✅ ¡Completado!")
+                                        progress_bar.progress(100)
+                                        status_text.text("✅ ¡Completado!")
                                     
-                                    st.markdown("""
-                                    <div class="success-card status-card">
-                                        <strong>✅ ¡Documentos procesados exitosamente!</strong><br>
-                                        Ya puedes hacer preguntas sobre el contenido.
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                    time.sleep(1)
-                                    st.rerun()
+                                        st.markdown("""
+                                        <div class="success-card status-card">
+                                            <strong>✅ ¡Documentos procesados exitosamente!</strong><br>
+                                            Ya puedes hacer preguntas sobre el contenido.
+                                        </div>
+                                        """, unsafe_allow_html=True)
+                                        time.sleep(1)
+                                        st.rerun()
+                                    else:
+                                        st.markdown("""
+                                        <div class="error-card status-card">
+                                            <strong>❌ Error procesando documentos</strong><br>
+                                            Verifica que los archivos sean válidos.
+                                        </div>
+                                        """, unsafe_allow_html=True)
                                 else:
                                     st.markdown("""
-                                    <div class="error-card status-card">
-                                        <strong>❌ Error procesando documentos</strong><br>
-                                        Verifica que los archivos sean válidos.
+                                    <div class="warning-card status-card">
+                                        <strong>⚠️ No se pudieron cargar los documentos</strong><br>
+                                        Verifica el formato de los archivos.
                                     </div>
                                     """, unsafe_allow_html=True)
-                            else:
-                                st.markdown("""
-                                <div class="warning-card status-card">
-                                    <strong>⚠️ No se pudieron cargar los documentos</strong><br>
-                                    Verifica el formato de los archivos.
-                                </div>
-                                """, unsafe_allow_html=True)
+                    
+                    except RejectedError as e:
+                        st.markdown(f"""
+                        <div class="warning-card status-card">
+                            <strong>⏳ {str(e)}</strong><br>
+                            Vuelve a intentarlo en {e.retry_after:.0f} segundos.
+                        </div>
+                        """, unsafe_allow_html=True)
                     
                     except Exception as e:
                         st.markdown(f"""
@@ -479,16 +569,25 @@ with st.sidebar:
     st.divider()
     
     # Documentos procesados
-    if st.session_state.processed_documents:
+    if st.session_state.document_blobs:
         st.subheader("📚 Documentos Cargados")
-        for i, doc in enumerate(st.session_state.processed_documents):
+        for digest, doc in list(st.session_state.document_blobs.items()):
             with st.container():
                 col1, col2 = st.columns([3, 1])
                 with col1:
                     st.write(f"📄 {doc}")
                 with col2:
-                    if st.button("🗑️", key=f"del_{i}", help="Eliminar"):
-                        st.session_state.processed_documents.pop(i)
+                    if st.button("🗑️", key=f"del_{digest}", help="Eliminar"):
+                        del st.session_state.document_blobs[digest]
+                        store = get_blob_store()
+                        store.release(digest)
+                        # Se borra por la ruta del blob (no por el nombre, que otras subidas
+                        # pueden compartir) y solo cuando ninguna sesión lo usa ya
+                        rag = get_rag_system()
+                        path = store.path_of(digest)
+                        if rag and path and store.refcount(digest) == 0:
+                            rag.remove_documents([path])
+                        st.session_state.processed_documents = list(st.session_state.document_blobs.values())
                         st.session_state.total_docs = len(st.session_state.processed_documents)
                         st.rerun()
     
@@ -510,7 +609,7 @@ with st.sidebar:
     
     # Limpiar historial
     if st.button("🗑️ Limpiar Historial", use_container_width=True):
-        st.session_state.chat_history = []
+        st.session_state.chat_history = ChatHistory()
         st.session_state.total_questions = 0
         st.rerun()
 
@@ -577,59 +676,73 @@ if ask_button and question:
                 </div>
                 """, unsafe_allow_html=True)
             else:
-                with st.spinner("🤔 Analizando tu pregunta..."):
-                    # Configurar cadena QA
-                    if rag.setup_qa_chain():
-                        # Mostrar indicador de procesamiento
-                        processing_container = st.empty()
-                        processing_container.markdown("""
-                        <div class="info-card status-card">
-                            <div class="loading-spinner"></div>
-                            <strong>🔍 Buscando en tus documentos...</strong>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        response = rag.ask_question(question)
-                        processing_container.empty()
-                        
-                        if response.get('error'):
-                            st.markdown(f"""
-                            <div class="error-card status-card">
-                                <strong>❌ Error procesando pregunta:</strong><br>
-                                {response['answer']}
+                admission = get_admission_controller()
+                with admission.admit(st.session_state.session_id, QUERY):
+                    with st.spinner("🤔 Analizando tu pregunta..."):
+                        # Configurar cadena QA
+                        if rag.qa_chain is not None or rag.setup_qa_chain():
+                            # Mostrar indicador de procesamiento
+                            processing_container = st.empty()
+                            processing_container.markdown("""
+                            <div class="info-card status-card">
+                                <div class="loading-spinner"></div>
+                                <strong>🔍 Buscando en tus documentos...</strong>
                             </div>
                             """, unsafe_allow_html=True)
-                        else:
-                            # Agregar al historial
-                            chat_entry = {
-                                'question': question,
-                                'answer': response["answer"],
-                                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                'sources': [doc.metadata.get('source', 'Desconocido') for doc in response["source_documents"]],
-                                'confidence': len(response["source_documents"])
-                            }
+                        
+                            started = time.perf_counter()
+                            response = rag.ask_question(question)
+                            log_response(response, 1000 * (time.perf_counter() - started),
+                                         session=st.session_state.session_id)
+                            processing_container.empty()
+                        
+                            if response.get('error'):
+                                st.markdown(f"""
+                                <div class="error-card status-card">
+                                    <strong>❌ Error procesando pregunta:</strong><br>
+                                    {response['answer']}
+                                </div>
+                                """, unsafe_allow_html=True)
+                            else:
+                                # Agregar al historial
+                                chat_entry = {
+                                    'question': question,
+                                    'answer': response["answer"],
+                                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                    'sources': [doc.metadata.get('file_name', doc.metadata.get('source', 'Desconocido'))
+                                                for doc in response["source_documents"]],
+                                    'confidence': len(response["source_documents"])
+                                }
                             
-                            st.session_state.chat_history.append(chat_entry)
-                            st.session_state.total_questions += 1
+                                st.session_state.chat_history.append(chat_entry)
+                                st.session_state.total_questions += 1
+                            
+                                # Mostrar respuesta inmediata
+                                st.markdown("""
+                                <div class="success-card status-card">
+                                    <strong>✅ Respuesta generada exitosamente</strong>
+                                </div>
+                                """, unsafe_allow_html=True)
                             
-                            # Mostrar respuesta inmediata
+                                # Limpiar input y actualizar
+                                time.sleep(0.5)
+                                st.rerun()
+                        else:
                             st.markdown("""
-                            <div class="success-card status-card">
-                                <strong>✅ Respuesta generada exitosamente</strong>
+                            <div class="error-card status-card">
+                                <strong>❌ Error configurando el sistema</strong><br>
+                                Intenta recargar la aplicación.
                             </div>
                             """, unsafe_allow_html=True)
-                            
-                            # Limpiar input y actualizar
-                            time.sleep(0.5)
-                            st.rerun()
-                    else:
-                        st.markdown("""
-                        <div class="error-card status-card">
-                            <strong>❌ Error configurando el sistema</strong><br>
-                            Intenta recargar la aplicación.
-                        </div>
-                        """, unsafe_allow_html=True)
                         
+        except RejectedError as e:
+            st.markdown(f"""
+            <div class="warning-card status-card">
+                <strong>⏳ {str(e)}</strong><br>
+                Vuelve a intentarlo en {e.retry_after:.0f} segundos.
+            </div>
+            """, unsafe_allow_html=True)
+            
         except Exception as e:
             st.markdown(f"""
             <div class="error-card status-card">
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Respuesta de preguntas por lotes sobre un archivo JSONL
+
+Lee preguntas línea a línea, las responde con concurrencia acotada usando
+RAGSystem y escribe los resultados en otro JSONL, en el mismo orden que la
+entrada. Si el proceso se interrumpe, vuelve a ejecutarlo con los mismos
+argumentos y continuará desde la última línea completada.
+
+Uso:
+    python batch_qa.py preguntas.jsonl resultados.jsonl --concurrency 4
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from config import rag_config
+from metrics import LatencyHistogram
+
+logger = logging.getLogger("batch_qa")
+
+
+def last_completed_line(output_path: str) -> int:
+    """
+    Obtiene el número de la última línea de entrada ya respondida
+    Lee solo el final del archivo de salida y descarta una última línea truncada.
+    Returns:
+        Número de línea (desde 0) o -1 si no hay resultados previos
+    """
+    if not os.path.exists(output_path):
+        return -1
+
+    with open(output_path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        block = 4096
+        tail = b""
+        position = size
+        # Retroceder hasta tener al menos una línea completa
+        while position > 0 and tail.count(b"\n") < 2:
+            step = min(block, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+
+        if tail and not tail.endswith(b"\n"):
+            # Línea a medio escribir: se trunca para reescribirla
+            cut = tail.rfind(b"\n") + 1
+            f.truncate(position + cut)
+            tail = tail[:cut]
+
+        for line in reversed(tail.splitlines()):
+            try:
+                return int(json.loads(line)["line"])
+            except (ValueError, KeyError):
+                continue
+    return -1
+
+
+def iter_questions(input_path: str, start_line: int, question_field: str,
+                   id_field: str) -> Iterator[Tuple[int, Optional[str], Optional[str], Optional[str]]]:
+    """Itera las preguntas del archivo de entrada sin cargarlo completo en memoria"""
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            if line_number < start_line or not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                yield line_number, record.get(id_field), record.get(question_field), None
+            except (json.JSONDecodeError, AttributeError) as e:
+                yield line_number, None, None, f"JSON inválido: {str(e)}"
+
+
+def answer_one(rag, line_number: int, record_id, question: Optional[str],
+               parse_error: Optional[str]) -> Dict[str, Any]:
+    """Responde una pregunta y construye el registro de salida"""
+    result = {"line": line_number, "id": record_id, "question": question}
+    if parse_error or not question:
+        result.update({"answer": None, "sources": [], "latency_ms": 0.0,
+                       "error": parse_error or "Pregunta vacía"})
+        return result
+
+    start = time.perf_counter()
+    response = rag.ask_question(question)
+    latency = time.perf_counter() - start
+
+    result.update({
+        "answer": response["answer"],
+        "sources": [doc.metadata.get("file_name", doc.metadata.get("source", "Desconocido"))
+                    for doc in response["source_documents"]],
+        "latency_ms": round(1000 * latency, 2),
+        "error": response["answer"] if response.get("error") else None,
+    })
+    return result
+
+
+def run_batch(rag, input_path: str, output_path: str, concurrency: int = 4,
+              question_field: str = "question", id_field: str = "id") -> Dict[str, Any]:
+    """
+    Responde todas las preguntas pendientes del archivo de entrada
+    Args:
+        rag: Instancia de RAGSystem con la cadena QA configurada
+        input_path: JSONL de entrada
+        output_path: JSONL de resultados (se añade al final)
+        concurrency: Preguntas en paralelo
+        question_field: Campo con el texto de la pregunta
+        id_field: Campo con el identificador de la pregunta
+    Returns:
+        Estadísticas de latencia y throughput de esta ejecución
+    """
+    start_line = last_completed_line(output_path) + 1
+    if start_line > 0:
+        logger.info(f"Reanudando desde la línea {start_line}")
+
+    histogram = LatencyHistogram()
+    answered = errors = 0
+    start = time.perf_counter()
+
+    # Ventana acotada de futuros en orden de entrada: memoria constante y salida ordenada
+    window = deque()
+    max_in_flight = concurrency * 2
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool, \
+            open(output_path, "a", encoding="utf-8") as out:
+
+        def drain_one():
+            nonlocal answered, errors
+            result = window.popleft().result()
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            if result["error"]:
+                errors += 1
+            else:
+                answered += 1
+                histogram.record(result["latency_ms"] / 1000)
+
+        for item in iter_questions(input_path, start_line, question_field, id_field):
+            if len(window) >= max_in_flight:
+                drain_one()
+            window.append(pool.submit(answer_one, rag, *item))
+
+        while window:
+            drain_one()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "start_line": start_line,
+        "answered": answered,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 2),
+        "questions_per_second": round((answered + errors) / elapsed, 2) if elapsed > 0 else 0.0,
+        **histogram.summary(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Responde preguntas por lotes desde un JSONL")
+    parser.add_argument("input", help="JSONL con una pregunta por línea")
+    parser.add_argument("output", help="JSONL donde se escriben los resultados")
+    parser.add_argument("--concurrency", type=int, default=4, help="Preguntas en paralelo")
+    parser.add_argument("--question-field", default="question", help="Campo con la pregunta")
+    parser.add_argument("--id-field", default="id", help="Campo con el identificador")
+    parser.add_argument("--persist-directory", default=rag_config.persist_directory,
+                        help="Directorio de la base de datos vectorial")
+    args = parser.parse_args(argv)
+
+    from rag_system import RAGSystem
+
+    rag = RAGSystem(persist_directory=args.persist_directory)
+    rag.warm_up(embed_probe=rag_config.warmup_embed_probe)
+    if rag.readiness != "ready":
+        print("Error: no se pudo cargar la base de datos o configurar la cadena QA", file=sys.stderr)
+        return 2
+
+    stats = run_batch(rag, args.input, args.output, max(1, args.concurrency),
+                      args.question_field, args.id_field)
+
+    print("\n=== Resumen del lote ===")
+    print(f"Desde la línea:  {stats['start_line']}")
+    print(f"Respondidas:     {stats['answered']}")
+    print(f"Errores:         {stats['errors']}")
+    print(f"Tiempo total:    {stats['elapsed_seconds']} s")
+    print(f"Preguntas/s:     {stats['questions_per_second']}")
+    print(f"Latencia p50:    {stats['p50_ms']} ms")
+    print(f"Latencia p95:    {stats['p95_ms']} ms")
+    print(f"Latencia p99:    {stats['p99_ms']} ms")
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
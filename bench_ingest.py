@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Benchmark de throughput de ingesta por parámetros de chunking y batching
+
+Genera corpus sintéticos (PDF, TXT y MD) de varios tamaños y ejecuta sobre
+cada uno el camino real de ingesta de `ingest.py` (load_documents -> split ->
+embed por lotes -> add_chunks) con embeddings offline (`HashEmbeddings`), una
+vez por combinación de chunk_size, chunk_overlap y tamaño de lote. Cada
+ejecución corre en un proceso nuevo para que el pico de RSS sea el suyo.
+
+Informa páginas/s, chunks/s, llamadas de embedding, pico de RSS y tamaño del
+índice en disco, y guarda los resultados en JSON. Con `--compare` contrasta
+con una ejecución anterior y sale con código 1 si hay regresiones.
+
+Uso:
+    python bench_ingest.py --output bench_ingest.json
+    python bench_ingest.py --docs 50 --formats pdf txt --chunk-sizes 500 1000 --batch-sizes 32 128
+    python bench_ingest.py --output nuevo.json --compare bench_ingest.json --tolerance 0.15
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import numpy as np
+
+FORMATS = ("pdf", "txt", "md")
+LINES_PER_PAGE = 50
+CHARS_PER_LINE = 90
+
+# Métricas comparadas con --compare: (clave, True si más es mejor)
+COMPARED_METRICS = (
+    ("pages_per_second", True),
+    ("chunks_per_second", True),
+    ("peak_rss_mb", False),
+    ("index_bytes", False),
+)
+
+
+# --- Corpus sintético ---------------------------------------------------------
+
+def make_vocabulary(size: int = 3000, seed: int = 0) -> List[str]:
+    """Palabras pseudoaleatorias pronunciables (ASCII, para que el PDF no necesite fuentes)"""
+    rng = np.random.default_rng(seed)
+    consonants, vowels = list("bcdfglmnprstv"), list("aeiou")
+    words = set()
+    while len(words) < size:
+        syllables = rng.integers(1, 4)
+        words.add("".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(syllables)))
+    return sorted(words)
+
+
+def make_lines(rng: np.random.Generator, vocabulary: List[str], n_lines: int) -> List[str]:
+    """Líneas de texto de ~CHARS_PER_LINE caracteres con frecuencias tipo Zipf"""
+    ranks = np.minimum(rng.zipf(1.3, size=n_lines * 20) - 1, len(vocabulary) - 1)
+    words = iter(vocabulary[r] for r in ranks)
+    lines = []
+    for _ in range(n_lines):
+        line = ""
+        for word in words:
+            if len(line) + len(word) + 1 > CHARS_PER_LINE:
+                break
+            line = f"{line} {word}" if line else word
+        lines.append(line.capitalize() + ".")
+    return lines
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """Escribe un PDF mínimo (Helvetica, una línea por operador Tj) con texto extraíble"""
+    objects: Dict[int, bytes] = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    kids = []
+    next_id = 4
+    for lines in pages:
+        content = ("BT /F1 10 Tf 14 TL 50 800 Td\n"
+                   + "".join(f"({_pdf_escape(line)}) Tj T*\n" for line in lines) + "ET").encode("latin-1")
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream"
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode()
+        kids.append(page_id)
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in range(1, next_id):
+        offsets[object_id] = len(out)
+        out += b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % next_id
+    out += b"".join(b"%010d 00000 n \n" % offsets[object_id] for object_id in range(1, next_id))
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (next_id, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def generate_corpus(directory: str, fmt: str, docs: int, pages_per_doc: int, seed: int = 0) -> Dict[str, Any]:
+    """Genera `docs` documentos de `pages_per_doc` páginas en el formato indicado"""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(seed=seed)
+    total_bytes = 0
+    for index in range(docs):
+        pages = [make_lines(rng, vocabulary, LINES_PER_PAGE) for _ in range(pages_per_doc)]
+        path = os.path.join(directory, f"doc{index:05d}.{fmt}")
+        if fmt == "pdf":
+            write_pdf(path, pages)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                for number, lines in enumerate(pages, 1):
+                    if fmt == "md":
+                        f.write(f"# Sección {number}\n\n")
+                        # Párrafos de cinco líneas y una lista por página
+                        for start in range(0, len(lines) - 5, 5):
+                            f.write(" ".join(lines[start:start + 5]) + "\n\n")
+                        f.write("".join(f"- {line}\n" for line in lines[-5:]) + "\n")
+                    else:
+                        f.write("\n".join(lines) + "\n\n")
+        total_bytes += os.path.getsize(path)
+    return {"format": fmt, "docs": docs, "pages_per_doc": pages_per_doc, "bytes": total_bytes}
+
+
+# --- Ejecución de una configuración ---------------------------------------------
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memoria residente del proceso en MB (None si la plataforma no lo expone)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return round(peak / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_configuration(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ingiere un corpus con una configuración en un directorio de persistencia nuevo.
+    Un fallo se devuelve como resultado con 'error' y 'traceback': una excepción del
+    proceso hijo solo llegaría al padre si se pudiera serializar.
+    """
+    import logging
+    import traceback
+
+    logging.disable(logging.INFO)
+    labels = {key: config[key] for key in ("format", "docs", "chunk_size", "chunk_overlap", "batch_size")}
+    persist_directory = tempfile.mkdtemp(prefix="rag_bench_ingest_")
+    try:
+        from index_catalog import directory_size
+        from ingest import Checkpoint, run_ingestion
+        from offline_providers import HashEmbeddings
+        from rag_system import RAGSystem
+
+        rag = RAGSystem(
+            persist_directory=persist_directory,
+            embedding_factory=lambda model: HashEmbeddings(
+                dim=config["dim"],
+                call_latency_ms=config["embed_call_ms"],
+                per_text_latency_ms=config["embed_text_ms"]
+            )
+        )
+        rag.update_config("splitter", {"chunk_size": config["chunk_size"], "chunk_overlap": config["chunk_overlap"]})
+        stats = run_ingestion(
+            rag,
+            config["corpus"],
+            Checkpoint(os.path.join(persist_directory, "ingest_checkpoint.jsonl")),
+            workers=config["workers"],
+            embed_workers=config["embed_workers"],
+            batch_size=config["batch_size"]
+        )
+        elapsed = stats["elapsed_seconds"] or 1e-9
+        return {
+            **labels,
+            "files": stats["files_ingested"],
+            "files_failed": stats["files_failed"],
+            "pages": stats["pages"],
+            "chunks": stats["chunks"],
+            "seconds": stats["elapsed_seconds"],
+            "pages_per_second": round(stats["pages"] / elapsed, 2),
+            "chunks_per_second": stats["chunks_per_second"],
+            "embed_calls": stats["embed_calls"],
+            "embedded_texts": stats["embedded_texts"],
+            "peak_rss_mb": peak_rss_mb(),
+            "index_bytes": directory_size(persist_directory),
+        }
+    except Exception as e:
+        return {**labels, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+    finally:
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+
+# --- Informe y comparación ------------------------------------------------------
+
+def result_key(result: Dict[str, Any]) -> str:
+    return (f"{result['format']}/{result['docs']}docs/cs{result['chunk_size']}"
+            f"/ov{result['chunk_overlap']}/b{result['batch_size']}")
+
+
+def print_result(result: Dict[str, Any]):
+    if "error" in result:
+        print(f"  {result_key(result):34s} FALLO {result['error']}\n{result['traceback']}")
+        return
+    rss = f"{result['peak_rss_mb']:7.1f} MB" if result["peak_rss_mb"] is not None else "      n/d"
+    print(f"  {result_key(result):34s} {result['pages_per_second']:8.1f} pág/s "
+          f"{result['chunks_per_second']:9.1f} chunks/s {result['embed_calls']:6d} llamadas "
+          f"RSS {rss}  índice {result['index_bytes'] / 1024 ** 2:7.1f} MB"
+          + (f"  ({result['files_failed']} fallidos)" if result["files_failed"] else ""))
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Devuelve las regresiones de `current` respecto a `baseline` mayores que `tolerance`"""
+    previous = {result_key(r): r for r in baseline["results"]}
+    regressions = []
+    print(f"\nComparación con {baseline.get('created_at', 'la ejecución anterior')} "
+          f"(tolerancia {tolerance:.0%}):")
+    for result in current["results"]:
+        key = result_key(result)
+        if key not in previous:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = previous[key].get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            changes.append(f"{metric} {change:+.1%}")
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(f"{key}: {metric} {old} -> {new} ({change:+.1%})")
+        print(f"  {key:34s} " + ", ".join(changes))
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Throughput de ingesta por chunking y batching")
+    parser.add_argument("--docs", type=int, nargs="+", default=[20, 100], help="Documentos por corpus")
+    parser.add_argument("--pages-per-doc", type=int, default=4, help="Páginas por documento")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[500, 1000])
+    parser.add_argument("--chunk-overlaps", type=int, nargs="+", default=[200])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 128])
+    parser.add_argument("--workers", type=int, default=4, help="Hilos de carga y división")
+    parser.add_argument("--embed-workers", type=int, default=2, help="Hilos de embeddings")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensión de los embeddings offline")
+    parser.add_argument("--embed-call-ms", type=float, default=0.0, help="Latencia simulada por llamada")
+    parser.add_argument("--embed-text-ms", type=float, default=0.0, help="Latencia simulada por texto")
+    parser.add_argument("--vector-backend", default=None, help="Backend del índice (por defecto el configurado)")
+    parser.add_argument("--output", default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--compare", default=None, help="JSON de una ejecución anterior")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Cambio relativo tolerado al comparar")
+    args = parser.parse_args(argv)
+
+    if args.vector_backend:
+        # Los procesos hijos leen la configuración al importarla
+        os.environ["RAG_VECTOR_BACKEND"] = args.vector_backend
+
+    corpus_root = tempfile.mkdtemp(prefix="rag_bench_corpus_")
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "corpora": [],
+        "results": [],
+    }
+    try:
+        # Un proceso por configuración: el pico de RSS no arrastra ejecuciones anteriores
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(processes=1, maxtasksperchild=1) as pool:
+            for fmt, docs in itertools.product(args.formats, args.docs):
+                corpus = os.path.join(corpus_root, f"{fmt}_{docs}")
+                info = generate_corpus(corpus, fmt, docs, args.pages_per_doc)
+                report["corpora"].append(info)
+                print(f"Corpus {fmt}: {docs} documentos, {info['bytes'] / 1024 ** 2:.1f} MB")
+                for chunk_size, chunk_overlap, batch_size in itertools.product(
+                        args.chunk_sizes, args.chunk_overlaps, args.batch_sizes):
+                    if chunk_overlap >= chunk_size:
+                        continue
+                    result = pool.apply(run_configuration, ({
+                        "corpus": corpus, "format": fmt, "docs": docs,
+                        "chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "batch_size": batch_size,
+                        "workers": args.workers, "embed_workers": args.embed_workers, "dim": args.dim,
+                        "embed_call_ms": args.embed_call_ms, "embed_text_ms": args.embed_text_ms,
+                    },))
+                    report["results"].append(result)
+                    print_result(result)
+    finally:
+        shutil.rmtree(corpus_root, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.output}")
+
+    failed = [result_key(r) for r in report["results"] if "error" in r]
+    if failed:
+        print(f"\nConfiguraciones fallidas: {', '.join(failed)}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        if regressions:
+            print("\nRegresiones:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark de lecturas concurrentes sobre el índice persistido
+
+Crea una colección sintética y lanza búsquedas top-k desde 1, 2, 4... hilos
+durante unos segundos por escenario, midiendo consultas/s y latencia p95. Con
+`sqlite_numpy` compara el pool de conexiones de solo lectura (`--readers`)
+con una sola conexión de lectura, que serializa los accesos a SQLite como antes.
+
+Uso:
+    python bench_read_concurrency.py
+    python bench_read_concurrency.py --backend chroma --n 50000 --threads 1 2 4 8 16
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import numpy as np
+
+from vector_backends import VECTOR_BACKENDS, create_backend
+
+
+def build_collection(kind: str, directory: str, n: int, dim: int, readers: int):
+    """Crea e indexa una colección sintética; devuelve el backend y vectores de consulta"""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    backend = create_backend(kind, directory, "bench_reads", read_connections=readers)
+    for i in range(0, n, 2000):
+        rows = range(i, min(i + 2000, n))
+        backend.upsert([f"chunk-{j}" for j in rows], vectors[i:i + 2000].tolist(),
+                       [f"texto del chunk {j} " * 20 for j in rows],
+                       [{"fid": j % 50, "page": j % 12} for j in rows])
+    probes = vectors[rng.integers(0, n, 256)] + rng.normal(scale=0.01, size=(256, dim)).astype(np.float32)
+    return backend, [p.tolist() for p in probes]
+
+
+def run_scenario(backend, probes: List[List[float]], threads: int, seconds: float, k: int) -> dict:
+    """Lanza `threads` hilos consultando durante `seconds` segundos"""
+    stop = threading.Event()
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+
+    def worker(index: int):
+        position = index
+        while not stop.is_set():
+            start = time.perf_counter()
+            backend.query(probes[position % len(probes)], k)
+            latencies[index].append(time.perf_counter() - start)
+            position += threads
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    all_latencies = np.array([value for values in latencies for value in values]) * 1000
+    return {
+        "threads": threads,
+        "queries": len(all_latencies),
+        "qps": len(all_latencies) / elapsed,
+        "p50_ms": float(np.percentile(all_latencies, 50)) if len(all_latencies) else 0.0,
+        "p95_ms": float(np.percentile(all_latencies, 95)) if len(all_latencies) else 0.0,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Escalado de búsquedas concurrentes por hilos lectores")
+    parser.add_argument("--backend", choices=sorted(VECTOR_BACKENDS), default="sqlite_numpy")
+    parser.add_argument("--n", type=int, default=20000, help="Chunks de la colección")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensión de los vectores")
+    parser.add_argument("--k", type=int, default=4, help="Resultados por consulta")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8], help="Hilos por escenario")
+    parser.add_argument("--readers", type=int, default=8, help="Conexiones de solo lectura del pool")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Duración de cada escenario")
+    args = parser.parse_args(argv)
+
+    # Con sqlite_numpy se compara el pool con una sola conexión de lectura
+    pools = [args.readers, 1] if args.backend == "sqlite_numpy" and args.readers > 1 else [args.readers]
+    print(f"{args.backend}: {args.n} chunks, dim {args.dim}, top-{args.k}, {os.cpu_count()} CPU")
+    for readers in pools:
+        directory = tempfile.mkdtemp(prefix="rag_bench_reads_")
+        try:
+            backend, probes = build_collection(args.backend, directory, args.n, args.dim, readers)
+            backend.query(probes[0], args.k)  # cargar la matriz / el índice HNSW
+            if args.backend == "sqlite_numpy":
+                print(f"  pool de lectura: {readers} conexión(es)")
+            baseline = None
+            for threads in args.threads:
+                result = run_scenario(backend, probes, threads, args.seconds, args.k)
+                baseline = baseline or result["qps"]
+                print(f"    {threads:3d} hilos: {result['qps']:8.1f} consultas/s  "
+                      f"(x{result['qps'] / baseline:4.2f})  p50 {result['p50_ms']:7.2f} ms  "
+                      f"p95 {result['p95_ms']:7.2f} ms")
+            backend.drop()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
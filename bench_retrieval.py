@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia y recall de recuperación de 1k a 1M chunks
+
+Genera corpus sintéticos de embeddings agrupados en clusters (normalizados,
+como los de un modelo real) y calcula en NumPy los vecinos exactos de un
+conjunto de consultas. Para cada backend y tamaño construye el índice en un
+proceso nuevo y consulta con el mismo retriever de langchain que usa
+`setup_qa_chain` para cada tipo de búsqueda (similarity, mmr y
+similarity_score_threshold). Informa tiempo de construcción, tamaño en disco,
+pico de RSS, latencias p50/p95/p99 y recall@k.
+
+El corpus se genera por bloques con semillas deterministas, así que ni el
+cálculo exacto ni la construcción necesitan la matriz completa en memoria.
+
+Uso:
+    python bench_retrieval.py --sizes 1000 10000 --output bench_retrieval.json
+    python bench_retrieval.py --backends sqlite_numpy --sizes 1000000 --queries 100
+    python bench_retrieval.py --shards 4 --sizes 100000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from bench_ingest import git_commit, peak_rss_mb
+
+SEARCH_TYPES = ("similarity", "mmr", "similarity_score_threshold")
+BLOCK_SIZE = 10000
+CLUSTERS = 256
+
+
+# --- Corpus sintético y vecinos exactos -----------------------------------------
+
+def cluster_centers(dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng((seed, 0))
+    centers = rng.normal(size=(CLUSTERS, dim)).astype(np.float32)
+    return centers / np.linalg.norm(centers, axis=1, keepdims=True)
+
+
+def sample_vectors(centers: np.ndarray, n: int, seed: Tuple[int, ...], noise: float) -> np.ndarray:
+    """Vectores normalizados alrededor de centros aleatorios (ruido de norma ~`noise`)"""
+    rng = np.random.default_rng(seed)
+    dim = centers.shape[1]
+    vectors = centers[rng.integers(0, len(centers), n)]
+    vectors = vectors + rng.normal(scale=noise / np.sqrt(dim), size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def corpus_blocks(n: int, dim: int, seed: int, noise: float):
+    """Itera (inicio, vectores) del corpus en bloques de BLOCK_SIZE"""
+    centers = cluster_centers(dim, seed)
+    for start in range(0, n, BLOCK_SIZE):
+        yield start, sample_vectors(centers, min(BLOCK_SIZE, n - start), (seed, 1, start), noise)
+
+
+def make_queries(n_queries: int, dim: int, seed: int, noise: float) -> np.ndarray:
+    return sample_vectors(cluster_centers(dim, seed), n_queries, (seed, 2), noise)
+
+
+def exact_neighbours(queries: np.ndarray, n: int, k: int, seed: int, noise: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k exacto por producto escalar (equivale a L2 con vectores normalizados)"""
+    best_rows = np.full((len(queries), 0), -1, dtype=np.int64)
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    for start, block in corpus_blocks(n, queries.shape[1], seed, noise):
+        scores = np.concatenate([best_scores, queries @ block.T], axis=1)
+        rows = np.concatenate([best_rows, np.broadcast_to(
+            np.arange(start, start + len(block)), (len(queries), len(block)))], axis=1)
+        keep = min(k, scores.shape[1])
+        top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_rows = np.take_along_axis(rows, top, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+class ProbeEmbeddings(Embeddings):
+    """Devuelve el vector precalculado de cada consulta ('q<i>'), sin coste de modelo"""
+
+    def __init__(self, queries: np.ndarray):
+        self.queries = queries
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.queries[int(text[1:])].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+# --- Ejecución por backend y tamaño -----------------------------------------------
+
+def relevance(scores: np.ndarray) -> np.ndarray:
+    """Relevancia que calcula langchain para distancias L2 (al cuadrado) de vectores normalizados"""
+    return 1.0 - (2.0 - 2.0 * scores) / np.sqrt(2)
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    values = np.array(latencies) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(values, p)), 3) for p in (50, 95, 99)}
+
+
+def run_backend(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Construye el índice de un backend y mide cada tipo de búsqueda"""
+    import logging
+    import warnings
+
+    # langchain avisa en cada consulta del umbral que no devuelve documentos
+    # o que da relevancias fuera de [0, 1]
+    logging.disable(logging.WARNING)
+    warnings.simplefilter("ignore")
+    from index_catalog import directory_size
+    from vector_backends import BackendVectorStore, create_backend
+
+    n, dim, k = config["n"], config["dim"], config["k"]
+    queries = np.array(config["queries"], dtype=np.float32)
+    truth_rows, truth_scores = np.array(config["truth_rows"]), np.array(config["truth_scores"])
+    directory = tempfile.mkdtemp(prefix="rag_bench_retrieval_")
+    try:
+        backend = create_backend(config["backend"], directory, "bench_retrieval", shards=config["shards"])
+        start = time.perf_counter()
+        for offset, block in corpus_blocks(n, dim, config["seed"], config["noise"]):
+            rows = range(offset, offset + len(block))
+            backend.upsert([f"chunk-{row}" for row in rows], block.tolist(),
+                           [f"chunk {row}" for row in rows],
+                           [{"fid": row % 997, "page": row % 40, "offset": row} for row in rows])
+        build_seconds = time.perf_counter() - start
+        build_rss = peak_rss_mb()
+
+        store = BackendVectorStore(backend, ProbeEmbeddings(queries))
+        result = {
+            "backend": config["backend"], "shards": config["shards"], "n": n, "dim": dim, "k": k,
+            "build_seconds": round(build_seconds, 3),
+            "chunks_per_second": round(n / build_seconds, 1) if build_seconds else None,
+            "index_bytes": directory_size(directory),
+            "build_peak_rss_mb": build_rss,
+            "search": {},
+        }
+        for search_type in config["search_types"]:
+            search_kwargs: Dict[str, Any] = {"k": k}
+            if search_type == "mmr":
+                search_kwargs["fetch_k"] = config["fetch_k"]
+            elif search_type == "similarity_score_threshold":
+                search_kwargs["score_threshold"] = config["score_threshold"]
+            retriever = store.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
+            retriever.invoke("q0")  # cargar la matriz / el índice HNSW
+
+            latencies, recalls, returned = [], [], []
+            for i in range(len(queries)):
+                start = time.perf_counter()
+                documents = retriever.invoke(f"q{i}")
+                latencies.append(time.perf_counter() - start)
+                found = {doc.metadata["offset"] for doc in documents}
+                returned.append(len(documents))
+                expected = truth_rows[i]
+                if search_type == "similarity_score_threshold":
+                    # Solo cuentan los vecinos exactos que superan el umbral
+                    expected = expected[relevance(truth_scores[i]) >= config["score_threshold"]]
+                if len(expected):
+                    recalls.append(len(found & set(expected.tolist())) / len(expected))
+            result["search"][search_type] = {
+                **percentiles(latencies),
+                "mean_ms": round(float(np.mean(latencies)) * 1000, 3),
+                "recall_at_k": round(float(np.mean(recalls)), 4) if recalls else None,
+                "mean_results": round(float(np.mean(returned)), 2),
+            }
+        result["peak_rss_mb"] = peak_rss_mb()
+        backend.drop()
+        return result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def print_result(result: Dict[str, Any]):
+    rss = f"{result['peak_rss_mb']:.1f} MB" if result["peak_rss_mb"] is not None else "n/d"
+    shards = f" x{result['shards']} fragmentos" if result["shards"] > 1 else ""
+    print(f"  {result['backend']}{shards}: construcción {result['build_seconds']:.2f} s "
+          f"({result['chunks_per_second']} chunks/s), índice {result['index_bytes'] / 1024 ** 2:.1f} MB, "
+          f"RSS {rss}")
+    for search_type, stats in result["search"].items():
+        recall = f"{stats['recall_at_k']:.3f}" if stats["recall_at_k"] is not None else "  n/d"
+        print(f"    {search_type:28s} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+              f"p99 {stats['p99_ms']:8.2f} ms  recall@{result['k']} {recall}  "
+              f"resultados {stats['mean_results']:.1f}")
+
+
+def main(argv=None) -> int:
+    from vector_backends import VECTOR_BACKENDS
+
+    parser = argparse.ArgumentParser(description="Latencia y recall de recuperación por tamaño de índice")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--backends", nargs="+", choices=sorted(VECTOR_BACKENDS), default=sorted(VECTOR_BACKENDS))
+    parser.add_argument("--search-types", nargs="+", choices=SEARCH_TYPES, default=list(SEARCH_TYPES))
+    parser.add_argument("--dim", type=int, default=768, help="Dimensión de los vectores")
+    parser.add_argument("--k", type=int, default=4, help="Documentos por consulta (retrieval k)")
+    parser.add_argument("--fetch-k", type=int, default=20, help="Candidatos de MMR")
+    parser.add_argument("--score-threshold", type=float, default=0.5, help="Umbral de relevancia")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas por tipo de búsqueda")
+    parser.add_argument("--shards", type=int, default=1, help="Fragmentos del índice")
+    parser.add_argument("--noise", type=float, default=0.8, help="Dispersión de los clusters")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args(argv)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": [],
+    }
+    queries = make_queries(args.queries, args.dim, args.seed, args.noise)
+    # Un proceso por índice: el pico de RSS es el de ese backend y tamaño
+    context = multiprocessing.get_context("spawn")
+    for n in args.sizes:
+        start = time.perf_counter()
+        truth_rows, truth_scores = exact_neighbours(queries, n, args.k, args.seed, args.noise)
+        print(f"{n} chunks (dim {args.dim}): vecinos exactos en {time.perf_counter() - start:.1f} s")
+        for backend in args.backends:
+            with context.Pool(processes=1, maxtasksperchild=1) as pool:
+                result = pool.apply(run_backend, ({
+                    "backend": backend, "shards": args.shards, "n": n, "dim": args.dim, "k": args.k,
+                    "fetch_k": args.fetch_k, "score_threshold": args.score_threshold,
+                    "search_types": args.search_types, "seed": args.seed, "noise": args.noise,
+                    "queries": queries.tolist(), "truth_rows": truth_rows.tolist(),
+                    "truth_scores": truth_scores.tolist(),
+                },))
+            report["results"].append(result)
+            print_result(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
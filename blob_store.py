@@ -0,0 +1,188 @@
+"""
+Almacén de archivos subidos direccionado por contenido
+
+Cada archivo se guarda una sola vez bajo su hash SHA-256
+(`<raíz>/blobs/ab/abcdef....pdf`), calculado mientras se copia por bloques.
+Dos subidas idénticas comparten el mismo blob aunque tengan nombres distintos,
+y dos archivos distintos con el mismo nombre ya no se pisan.
+
+Un índice SQLite lleva el contador de referencias de cada blob: la aplicación
+lo incrementa cuando el documento queda indexado y lo decrementa al eliminarlo,
+de modo que la limpieza solo borra blobs que nada usa.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import BinaryIO, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobRef(NamedTuple):
+    """Blob almacenado para una subida"""
+    digest: str
+    path: str
+    size: int
+    name: str
+    is_new: bool
+
+
+class BlobStore:
+    """Almacén de blobs con deduplicación y contador de referencias"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "blobs.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " digest TEXT PRIMARY KEY, ext TEXT NOT NULL, size INTEGER NOT NULL,"
+            " refcount INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def blob_path(self, digest: str, ext: str) -> str:
+        # La extensión se conserva porque los loaders eligen el parser por ella
+        return os.path.join(self.blob_dir, digest[:2], digest + ext.lower())
+
+    def put(self, stream: BinaryIO, name: str) -> BlobRef:
+        """
+        Guarda el contenido de un stream calculando su hash por bloques
+        Args:
+            stream: Objeto tipo archivo (p. ej. UploadedFile de Streamlit)
+            name: Nombre original, solo para la extensión y el BlobRef
+        Returns:
+            BlobRef con el hash y la ruta del blob (existente si el contenido ya estaba)
+        """
+        ext = os.path.splitext(name)[1].lower()
+        if hasattr(stream, "seek"):
+            stream.seek(0)
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for block in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    digest.update(block)
+                    out.write(block)
+                    size += len(block)
+
+            hex_digest = digest.hexdigest()
+            path = self.blob_path(hex_digest, ext)
+            now = time.time()
+            with self._lock:
+                is_new = not os.path.exists(path)
+                if is_new:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+                else:
+                    # Contenido ya almacenado: se refresca la fecha para que la limpieza no lo borre
+                    os.remove(tmp_path)
+                    os.utime(path)
+                self._conn.execute(
+                    "INSERT INTO blobs (digest, ext, size, created_at, last_used) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(digest) DO UPDATE SET last_used = excluded.last_used",
+                    (hex_digest, ext, size, now, now)
+                )
+                self._conn.commit()
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return BlobRef(hex_digest, path, size, name, is_new)
+
+    def acquire(self, digest: str):
+        """Suma una referencia (el blob pasa a estar en uso)"""
+        self._add_refs(digest, 1)
+
+    def release(self, digest: str):
+        """Resta una referencia; con cero referencias el blob queda para la limpieza"""
+        self._add_refs(digest, -1)
+
+    def _add_refs(self, digest: str, delta: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE blobs SET refcount = MAX(0, refcount + ?), last_used = ? WHERE digest = ?",
+                (delta, time.time(), digest)
+            )
+            self._conn.commit()
+
+    def refcount(self, digest: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT refcount FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else 0
+
+    def path_of(self, digest: str) -> Optional[str]:
+        """Ruta del blob con ese hash (None si no está registrado)"""
+        with self._lock:
+            row = self._conn.execute("SELECT ext FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        return self.blob_path(digest, row[0]) if row else None
+
+    def collect_garbage(self, max_age_seconds: float = 0.0,
+                        keep_paths: Optional[Set[str]] = None) -> List[str]:
+        """
+        Borra los blobs sin referencias que no se usan desde hace más de `max_age_seconds`
+        Args:
+            max_age_seconds: Antigüedad mínima desde el último uso
+            keep_paths: Rutas absolutas que se conservan aunque no tengan referencias
+                (p. ej. blobs que un índice aún necesita para reindexar)
+        Returns:
+            Lista de hashes eliminados
+        """
+        cutoff = time.time() - max_age_seconds
+        keep = keep_paths or set()
+        removed = []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT digest, ext FROM blobs WHERE refcount = 0 AND last_used <= ?", (cutoff,)
+            ).fetchall()
+            for digest, ext in rows:
+                path = self.blob_path(digest, ext)
+                if os.path.abspath(path) in keep:
+                    continue
+                try:
+                    if os.path.exists(path):
+                        os.remove(path)
+                        if not os.listdir(os.path.dirname(path)):
+                            os.rmdir(os.path.dirname(path))
+                    self._conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                    removed.append(digest)
+                except OSError as e:
+                    logger.warning(f"No se pudo eliminar el blob {digest}: {str(e)}")
+            self._conn.commit()
+        return removed
+
+    def get_stats(self) -> dict:
+        """Número de blobs, bytes almacenados y blobs sin referencias"""
+        with self._lock:
+            count, size, unreferenced = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refcount = 0), 0) FROM blobs"
+            ).fetchone()
+        return {"blobs": count, "blob_bytes": size, "unreferenced_blobs": unreferenced}
+
+
+_blob_stores = {}
+_blob_stores_lock = threading.Lock()
+
+
+def get_blob_store(root: Optional[str] = None) -> BlobStore:
+    """Almacén compartido por proceso para un directorio (por defecto `temp_directory`)"""
+    if root is None:
+        from config import rag_config
+        root = rag_config.temp_directory
+    key = os.path.abspath(root)
+    with _blob_stores_lock:
+        if key not in _blob_stores:
+            _blob_stores[key] = BlobStore(root)
+        return _blob_stores[key]
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Pruebas de conformidad y rendimiento de los backends vectoriales
+
+Ejecuta la misma batería de comprobaciones sobre cada backend registrado en
+`vector_backends.VECTOR_BACKENDS` (inserción idempotente, orden exacto del
+top-k, filtros, borrado, snapshot, persistencia y eliminación) y mide el
+throughput de inserción y consulta. Sale con código 1 si algún backend falla.
+
+Uso:
+    python check_backend_conformance.py                    # todos los backends
+    python check_backend_conformance.py --backend sqlite_numpy --n 20000
+    python check_backend_conformance.py --shards 4         # índice fragmentado
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import numpy as np
+
+from vector_backends import VECTOR_BACKENDS, create_backend
+
+DIM = 32
+
+
+def make_dataset(n: int, seed: int = 0) -> Tuple[List[str], np.ndarray, List[str], List[dict]]:
+    """Genera n chunks sintéticos repartidos entre tres archivos; solo los pares tienen `lang`"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, DIM)).astype(np.float32)
+    ids = [f"chunk-{i}" for i in range(n)]
+    texts = [f"texto {i}" for i in range(n)]
+    metadatas = [{"file_path": f"/docs/doc{i % 3}.txt", "page": i % 7, **({"lang": "es"} if i % 2 == 0 else {})}
+                 for i in range(n)]
+    return ids, vectors, texts, metadatas
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        raise AssertionError(message)
+
+
+def conformance(kind: str, directory: str, shards: int = 1):
+    """Comprueba la semántica común que RAGSystem espera de un backend"""
+    ids, vectors, texts, metadatas = make_dataset(300)
+    backend = create_backend(kind, directory, "conformance", shards=shards)
+
+    backend.upsert(ids, vectors.tolist(), texts, metadatas)
+    check(backend.count() == 300, f"count tras upsert: {backend.count()}")
+
+    # Upsert idempotente: mismas ids actualizan en lugar de duplicar
+    backend.upsert(ids[:10], vectors[:10].tolist(), [t + " v2" for t in texts[:10]], metadatas[:10])
+    check(backend.count() == 300, "el upsert repetido duplica filas")
+    check(backend.get(ids=["chunk-3"])["texts"] == ["texto 3 v2"], "el upsert no actualiza el texto")
+
+    # Top-k exacto: mismo orden que la fuerza bruta y distancias ascendentes
+    query = vectors[42] + 0.01
+    expected = np.argsort(((vectors - query) ** 2).sum(axis=1))[:5]
+    results = backend.query(query.tolist(), 5)
+    check([r.id for r in results] == [ids[i] for i in expected],
+          f"top-k distinto de la fuerza bruta: {[r.id for r in results]}")
+    distances = [r.distance for r in results]
+    check(distances == sorted(distances), "distancias no ordenadas")
+    check(abs(distances[0] - float(((vectors[42] - query) ** 2).sum())) < 1e-3,
+          "la distancia no es L2 al cuadrado")
+
+    # Filtros con sintaxis where
+    filters: List[Tuple[dict, Callable[[dict], bool]]] = [
+        ({"file_path": "/docs/doc1.txt"}, lambda m: m["file_path"] == "/docs/doc1.txt"),
+        ({"file_path": {"$ne": "/docs/doc0.txt"}}, lambda m: m["file_path"] != "/docs/doc0.txt"),
+        ({"$and": [{"file_path": {"$ne": "/docs/doc0.txt"}}, {"page": {"$gte": 3}}]},
+         lambda m: m["file_path"] != "/docs/doc0.txt" and m["page"] >= 3),
+        ({"$or": [{"page": 0}, {"page": 6}]}, lambda m: m["page"] in (0, 6)),
+        # Como en Chroma, una condición sobre una clave excluye los chunks que no la tienen
+        ({"lang": {"$ne": "en"}}, lambda m: "lang" in m and m["lang"] != "en"),
+    ]
+    for where, predicate in filters:
+        results = backend.query(query.tolist(), 10, where=where)
+        check(len(results) == 10 and all(predicate(r.metadata) for r in results),
+              f"filtro {where} devuelve resultados que no cumple")
+        matching = sum(1 for m in metadatas if predicate(m))
+        check(len(backend.get(where=where)["ids"]) == matching, f"get con filtro {where} incompleto")
+
+    # Filtro con menos coincidencias que k
+    check(len(backend.query(query.tolist(), 10, where={"page": 99})) == 0, "filtro vacío devuelve filas")
+
+    # Borrado por ids y por filtro
+    backend.delete(ids=ids[:5])
+    check(backend.count() == 295, "delete por ids")
+    check(not backend.get(ids=ids[:5])["ids"], "los ids borrados siguen visibles")
+    backend.delete(where={"file_path": "/docs/doc2.txt"})
+    remaining = 295 - sum(1 for i, m in enumerate(metadatas[5:], 5) if m["file_path"] == "/docs/doc2.txt")
+    check(backend.count() == remaining, f"delete por filtro: {backend.count()} != {remaining}")
+    check(all(r.metadata["file_path"] != "/docs/doc2.txt" for r in backend.query(query.tolist(), 50)),
+          "los chunks borrados siguen apareciendo en el top-k")
+
+    # Snapshot completo y con embeddings
+    seen = {}
+    for batch in backend.snapshot(batch_size=64):
+        check(len(batch["ids"]) <= 64, "lote de snapshot mayor que batch_size")
+        for i, chunk_id in enumerate(batch["ids"]):
+            seen[chunk_id] = batch["embeddings"][i]
+    check(len(seen) == remaining, f"snapshot incompleto: {len(seen)} != {remaining}")
+    check(np.allclose(seen["chunk-42"], vectors[42], atol=1e-5), "snapshot altera los embeddings")
+
+    # Persistencia: otra instancia sobre el mismo directorio ve los mismos datos
+    backend.vacuum()
+    reopened = create_backend(kind, directory, "conformance", shards=shards)
+    check(reopened.count() == remaining, "los datos no persisten al reabrir")
+    check(reopened.query(query.tolist(), 1)[0].id == "chunk-42", "top-1 distinto tras reabrir")
+
+    reopened.drop()
+    check(create_backend(kind, directory, "conformance", shards=shards).count() == 0,
+          "drop no elimina la colección")
+
+
+def throughput(kind: str, directory: str, n: int, shards: int = 1, queries: int = 200):
+    """Mide inserción por lotes y latencia de consulta top-10"""
+    ids, vectors, texts, metadatas = make_dataset(n, seed=1)
+    backend = create_backend(kind, directory, "throughput", shards=shards)
+
+    start = time.perf_counter()
+    for i in range(0, n, 1000):
+        backend.upsert(ids[i:i + 1000], vectors[i:i + 1000].tolist(), texts[i:i + 1000], metadatas[i:i + 1000])
+    insert_seconds = time.perf_counter() - start
+
+    probes = vectors[np.random.default_rng(2).integers(0, n, queries)]
+    backend.query(probes[0].tolist(), 10)  # calentar cachés
+    latencies = []
+    for probe in probes:
+        start = time.perf_counter()
+        backend.query(probe.tolist(), 10)
+        latencies.append(time.perf_counter() - start)
+    backend.drop()
+
+    latencies_ms = 1000 * np.array(latencies)
+    print(f"      inserción: {n / insert_seconds:10.0f} chunks/s")
+    print(f"      consulta:  p50 {np.percentile(latencies_ms, 50):7.2f} ms  "
+          f"p95 {np.percentile(latencies_ms, 95):7.2f} ms  ({queries / sum(latencies):.0f} consultas/s)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Conformidad y rendimiento de los backends vectoriales")
+    parser.add_argument("--backend", choices=sorted(VECTOR_BACKENDS), action="append",
+                        help="Backend a comprobar (por defecto, todos)")
+    parser.add_argument("--n", type=int, default=5000, help="Chunks para la prueba de throughput")
+    parser.add_argument("--shards", type=int, default=1, help="Fragmentos del índice")
+    args = parser.parse_args(argv)
+
+    ok = True
+    for kind in args.backend or sorted(VECTOR_BACKENDS):
+        directory = tempfile.mkdtemp(prefix=f"rag_{kind}_")
+        try:
+            conformance(kind, directory, args.shards)
+            print(f"OK    {kind}" + (f" ({args.shards} fragmentos)" if args.shards > 1 else ""))
+            throughput(kind, directory, args.n, args.shards)
+        except AssertionError as e:
+            ok = False
+            print(f"FALLO {kind}: {e}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
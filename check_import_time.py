@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Control de regresiones en el tiempo de importación
+
+Importa cada módulo en un proceso nuevo con `python -X importtime`, compara el
+tiempo acumulado con su presupuesto y comprueba que no arrastre dependencias
+pesadas (chromadb, langchain, clientes de Google...) que deben cargarse al
+primer uso. Sale con código 1 si algún módulo se pasa.
+
+Uso:
+    python check_import_time.py            # comprobar presupuestos
+    python check_import_time.py --verbose  # mostrar los imports más lentos
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Presupuesto de importación acumulada por módulo, en milisegundos
+IMPORT_BUDGETS_MS = {
+    "config": 100,
+    "metrics": 50,
+    "admission": 120,
+    "rag_system": 250,
+}
+
+# Módulos que no deben cargarse al importar el sistema RAG
+FORBIDDEN_AT_IMPORT = (
+    "chromadb",
+    "langchain",
+    "langchain_community",
+    "langchain_google_genai",
+    "google.generativeai",
+    "unstructured",
+    "pandas",
+    "plotly",
+)
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Mide la importación de un módulo en un intérprete limpio
+    Returns:
+        Tupla (ms acumulados del módulo, lista de (submódulo, ms acumulados))
+    """
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=project_dir,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module}:\n{result.stderr[-2000:]}")
+
+    imports = []
+    total_ms = 0.0
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        cumulative_ms = int(match.group(2)) / 1000
+        name = match.group(4)
+        imports.append((name, cumulative_ms))
+        if name == module:
+            total_ms = cumulative_ms
+    return total_ms, imports
+
+
+def check_budgets(budgets: Dict[str, float], verbose: bool = False) -> bool:
+    """Comprueba todos los presupuestos; devuelve True si se cumplen"""
+    ok = True
+    for module, budget in budgets.items():
+        total_ms, imports = measure(module)
+        loaded = {name for name, _ in imports}
+        forbidden = sorted(
+            name for name in loaded
+            if any(name == f or name.startswith(f + ".") for f in FORBIDDEN_AT_IMPORT)
+        )
+        status = "OK" if total_ms <= budget and not forbidden else "FALLO"
+        ok = ok and status == "OK"
+        print(f"{status:5} {module:12} {total_ms:8.1f} ms (presupuesto {budget} ms)")
+        if forbidden:
+            print(f"      importa módulos pesados: {', '.join(forbidden[:10])}")
+        if verbose or status != "OK":
+            slowest = sorted(imports, key=lambda item: item[1], reverse=True)[:8]
+            for name, ms in slowest:
+                print(f"      {ms:8.1f} ms  {name}")
+    return ok
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Comprueba el presupuesto de tiempo de importación")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar los imports más lentos")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiplicador de presupuestos para máquinas lentas (p. ej. CI)")
+    args = parser.parse_args(argv)
+
+    budgets = {module: budget * args.scale for module, budget in IMPORT_BUDGETS_MS.items()}
+    return 0 if check_budgets(budgets, args.verbose) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Pruebas de regresión de la ingesta masiva (`ingest.run_ingestion`)
+
+Ingiere corpus sintéticos de `bench_ingest.py` con embeddings offline y varios
+workers de embeddings, de modo que los lotes en vuelo se solapan con las
+cargas, y comprueba que la ingesta termina, que todos los archivos quedan en
+el checkpoint y que el índice contiene exactamente los chunks ingeridos.
+Después reduce un archivo y lo vuelve a ingerir: no deben quedar chunks de la
+versión anterior. Sale con código 1 si algo falla.
+
+Uso:
+    python check_ingest.py
+    python check_ingest.py --rounds 10 --embed-workers 4
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+from bench_ingest import generate_corpus
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        raise AssertionError(message)
+
+
+def make_rag(persist_directory: str):
+    from offline_providers import HashEmbeddings
+    from rag_system import RAGSystem
+
+    return RAGSystem(
+        persist_directory=persist_directory,
+        embedding_factory=lambda model: HashEmbeddings(dim=64, call_latency_ms=5.0)
+    )
+
+
+def ingest_concurrently(corpus: str, docs: int, embed_workers: int, batch_size: int):
+    """Una ingesta completa con lotes de embeddings solapados"""
+    from ingest import Checkpoint, run_ingestion
+
+    persist_directory = tempfile.mkdtemp(prefix="rag_check_ingest_")
+    try:
+        rag = make_rag(persist_directory)
+        checkpoint_path = os.path.join(persist_directory, "ingest_checkpoint.jsonl")
+        stats = run_ingestion(rag, corpus, Checkpoint(checkpoint_path), workers=4,
+                              embed_workers=embed_workers, batch_size=batch_size)
+        check(stats["files_failed"] == 0, f"{stats['files_failed']} archivos fallidos")
+        check(stats["files_ingested"] == docs, f"ingeridos {stats['files_ingested']} de {docs}")
+        check(len(Checkpoint(checkpoint_path).done) == docs, "hay archivos ingeridos fuera del checkpoint")
+        check(rag.vectorstore.backend.count() == stats["chunks"],
+              f"el índice tiene {rag.vectorstore.backend.count()} chunks, se ingirieron {stats['chunks']}")
+    finally:
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+
+def reingest_shrunk_file(corpus: str):
+    """Reingerir un archivo que ahora tiene menos chunks no deja restos de la versión anterior"""
+    from ingest import Checkpoint, run_ingestion
+
+    persist_directory = tempfile.mkdtemp(prefix="rag_check_ingest_")
+    try:
+        rag = make_rag(persist_directory)
+        checkpoint_path = os.path.join(persist_directory, "ingest_checkpoint.jsonl")
+        first = run_ingestion(rag, corpus, Checkpoint(checkpoint_path), embed_workers=2, batch_size=16)
+
+        path = sorted(os.path.join(corpus, name) for name in os.listdir(corpus))[0]
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text[:len(text) // 4])
+
+        second = run_ingestion(rag, corpus, Checkpoint(checkpoint_path), embed_workers=2, batch_size=16)
+        check(second["files_ingested"] == 1, f"se reingirieron {second['files_ingested']} archivos, no 1")
+        where = rag._file_condition(path)
+        remaining = len(rag.vectorstore.backend.get(where=where)["ids"])
+        check(remaining == second["chunks"],
+              f"{remaining} chunks del archivo en el índice, la versión nueva tiene {second['chunks']}")
+        check(rag.vectorstore.backend.count() < first["chunks"], "el índice no se redujo al acortar el archivo")
+    finally:
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Regresiones de la ingesta masiva")
+    parser.add_argument("--docs", type=int, default=10, help="Documentos por corpus")
+    parser.add_argument("--rounds", type=int, default=6, help="Repeticiones de la ingesta concurrente")
+    parser.add_argument("--embed-workers", type=int, default=2, help="Workers de embeddings (más de 1)")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    root = tempfile.mkdtemp(prefix="rag_check_corpus_")
+    ok = True
+    try:
+        checks = []
+        for fmt in ("pdf", "txt"):
+            corpus = os.path.join(root, fmt)
+            generate_corpus(corpus, fmt, args.docs, pages_per_doc=2)
+            checks.append((f"ingesta concurrente {fmt}", lambda corpus=corpus: [
+                ingest_concurrently(corpus, args.docs, max(2, args.embed_workers), batch_size=8)
+                for _ in range(args.rounds)
+            ]))
+        checks.append(("reingesta de un archivo más corto", lambda: reingest_shrunk_file(os.path.join(root, "txt"))))
+
+        for name, run in checks:
+            try:
+                run()
+                print(f"OK    {name}")
+            except Exception as e:
+                ok = False
+                print(f"FALLO {name}: {type(e).__name__}: {e}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
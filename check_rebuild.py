@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Pruebas de regresión del reindexado blue/green (`RAGSystem.rebuild_index`)
+
+Con embeddings offline comprueba que un archivo reingerido mientras se
+construye la nueva generación no queda duplicado en ella, y que el
+`file_name` de las subidas (blobs nombrados por su hash) sobrevive a un
+reindexado y a un rollback. Sale con código 1 si algo falla.
+
+Uso:
+    python check_rebuild.py
+    python check_rebuild.py --backend sqlite_numpy
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+# Vocabulario distinto por párrafo: chunks casi idénticos empatarían en la validación del reindexado
+TEXT = "\n\n".join(f"Párrafo {i}: " + " ".join(f"término{i * 60 + j}" for j in range(60)) for i in range(20))
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        raise AssertionError(message)
+
+
+def make_rag(persist_directory: str):
+    from offline_providers import HashEmbeddings
+    from rag_system import RAGSystem
+
+    return RAGSystem(
+        persist_directory=persist_directory,
+        embedding_factory=lambda model: HashEmbeddings(dim=64)
+    )
+
+
+def write_file(directory: str, name: str, text: str = TEXT) -> str:
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def chunks_of(rag, path: str) -> int:
+    return len(rag.vectorstore.backend.get(where=rag._file_condition(path))["ids"])
+
+
+def readd_during_rebuild(workdir: str):
+    """Un archivo reingerido durante la construcción aparece una sola vez en la nueva generación"""
+    persist_directory = os.path.join(workdir, "readd")
+    rag = make_rag(persist_directory)
+    path = write_file(workdir, "a.txt")
+    check(rag.add_documents([path]), "no se pudo indexar a.txt")
+    before = chunks_of(rag, path)
+
+    # Reingerir justo después de la primera pasada, que ya ha indexado a.txt en la colección nueva
+    index_sources = rag._index_sources
+    state = {"first": True}
+
+    def index_and_readd(store, splitter, sources):
+        total = index_sources(store, splitter, sources)
+        if state["first"]:
+            state["first"] = False
+            check(rag.add_documents([path]), "no se pudo reingerir a.txt durante el reindexado")
+        return total
+
+    rag._index_sources = index_and_readd
+    check(rag.rebuild_index(chunk_size=900, chunk_overlap=100, background=False),
+          f"el reindexado falló: {rag.rebuild_status.get('error')}")
+    rag._index_sources = index_sources
+
+    after = chunks_of(rag, path)
+    expected = len(rag.split_documents(rag.load_documents([path])))
+    check(after == expected, f"a.txt tiene {after} chunks en la nueva generación, se esperaban {expected}")
+    check(rag.vectorstore.backend.count() == expected,
+          f"la nueva generación tiene {rag.vectorstore.backend.count()} chunks, se esperaban {expected}")
+    check(before > 0, "a.txt no tenía chunks antes del reindexado")
+    catalog = rag._get_catalog().get_stats(rag.collection_name)
+    check(catalog["chunks"] == expected, f"el catálogo cuenta {catalog['chunks']} chunks, se esperaban {expected}")
+
+
+def names_survive_rebuild(workdir: str):
+    """El `file_name` de una subida se conserva tras reindexar y tras volver atrás"""
+    from blob_store import BlobStore
+
+    persist_directory = os.path.join(workdir, "names")
+    rag = make_rag(persist_directory)
+    store = BlobStore(os.path.join(workdir, "blobs"))
+    with open(write_file(workdir, "upload.tmp"), "rb") as f:
+        blob = store.put(f, "manual.txt")
+    check(rag.process_documents(rag.load_documents([blob.path], display_names=["manual.txt"])),
+          "no se pudo indexar la subida")
+
+    def file_names():
+        metadatas = rag.vectorstore.decode_metadatas(rag.vectorstore.backend.get()["metadatas"])
+        return {m.get("file_name") for m in metadatas}
+
+    check(file_names() == {"manual.txt"}, f"antes de reindexar: {file_names()}")
+    check(rag.rebuild_index(chunk_size=900, chunk_overlap=100, background=False),
+          f"el reindexado falló: {rag.rebuild_status.get('error')}")
+    check(file_names() == {"manual.txt"}, f"tras reindexar: {file_names()}")
+    check(rag.rollback_index(), "el rollback falló")
+    check(file_names() == {"manual.txt"}, f"tras el rollback: {file_names()}")
+    check(rag.remove_documents(["manual.txt"], compact=False) > 0, "remove_documents no encuentra 'manual.txt'")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Regresiones del reindexado blue/green")
+    parser.add_argument("--backend", default=None, help="Backend del índice (por defecto el configurado)")
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        # config.py lee el backend al importarse
+        os.environ["RAG_VECTOR_BACKEND"] = args.backend
+
+    logging.disable(logging.WARNING)
+    ok = True
+    for name, run in (
+        ("reingesta durante el reindexado", readd_during_rebuild),
+        ("file_name tras reindexar y rollback", names_survive_rebuild),
+    ):
+        workdir = tempfile.mkdtemp(prefix="rag_check_rebuild_")
+        try:
+            run(workdir)
+            print(f"OK    {name}")
+        except Exception as e:
+            ok = False
+            print(f"FALLO {name}: {type(e).__name__}: {e}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
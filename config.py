@@ -35,9 +35,65 @@ class RAGConfig:
     persist_directory: str = "./chroma_db"
     temp_directory: str = "./temp_docs"
     
+    # Backend de almacenamiento vectorial ('chroma' o 'sqlite_numpy')
+    vector_backend: str = os.getenv("RAG_VECTOR_BACKEND", "chroma")
+    
+    # Fragmentación del índice: número de fragmentos, enrutado ('document' o
+    # 'directory') y tiempo máximo de espera por fragmento en cada búsqueda
+    vector_shards: int = int(os.getenv("RAG_VECTOR_SHARDS", "1"))
+    shard_strategy: str = os.getenv("RAG_SHARD_STRATEGY", "document")
+    shard_timeout_seconds: float = 2.0
+    
+    # Conexiones de solo lectura por colección para búsquedas concurrentes (sqlite_numpy)
+    vector_read_connections: int = int(os.getenv("RAG_VECTOR_READ_CONNECTIONS", "4"))
+    
+    # Caché de texto extraído de PDF por página (evita volver a parsear)
+    pdf_cache_enabled: bool = True
+    
     # Formatos soportados
     supported_formats: List[str] = None
-    
+
+    # Control de admisión (slots de ejecución, colas y límites por sesión)
+    max_concurrent_requests: int = 4
+    max_concurrent_ingest: int = 1
+    query_queue_size: int = 32
+    ingest_queue_size: int = 8
+    query_rate_per_minute: float = 20.0
+    query_burst: int = 5
+    ingest_rate_per_minute: float = 4.0
+    ingest_burst: int = 2
+    max_queue_wait_seconds: float = 30.0
+
+    # Métricas por tramo (load, split, embed, upsert, retrieve, prompt, generate)
+    span_metrics_enabled: bool = os.getenv("RAG_SPAN_METRICS", "true").lower() == "true"
+
+    # Listener de métricas Prometheus (/metrics) junto a la app o la API; 0 lo desactiva
+    metrics_host: str = os.getenv("RAG_METRICS_HOST", "127.0.0.1")
+    metrics_port: int = int(os.getenv("RAG_METRICS_PORT", "0"))
+
+    # Registro persistente de consultas (todas las sesiones) que alimenta Analytics
+    query_log_enabled: bool = os.getenv("RAG_QUERY_LOG", "true").lower() == "true"
+    query_log_path: str = os.getenv("RAG_QUERY_LOG_PATH", "./query_log.sqlite3")
+
+    # Grabación de sesiones para reproducirlas con session_replay.py (opcional)
+    session_recording_enabled: bool = os.getenv("RAG_SESSION_RECORDING", "false").lower() == "true"
+    session_recording_path: str = os.getenv("RAG_SESSION_RECORDING_PATH", "./recordings/sessions.jsonl")
+
+    # Perfiles por petición del modo debug (cProfile + tracemalloc), ver profiling.py
+    profile_directory: str = os.getenv("RAG_PROFILE_DIRECTORY", "./profiles")
+    profile_keep: int = 20
+
+    # Umbral (MB de memoria residente) a partir del cual el informe de memoria avisa
+    memory_warning_mb: float = float(os.getenv("RAG_MEMORY_WARNING_MB", "2048"))
+
+    # Modo administrador: el RAGSystem es uno por proceso y lo comparten todas las
+    # sesiones, así que aplicarle configuración, reindexar o hacer rollback desde
+    # Configuración solo se permite con RAG_ADMIN_MODE=true
+    admin_mode: bool = os.getenv("RAG_ADMIN_MODE", "false").lower() == "true"
+
+    # Warm-up al arrancar (la llamada de embedding de prueba consume cuota)
+    warmup_embed_probe: bool = False
+
     def __post_init__(self):
         if self.supported_formats is None:
             self.supported_formats = ['.pdf', '.txt', '.md']
@@ -76,6 +132,9 @@ class AppConfig:
     MAX_FILE_SIZE_MB = 50
     MAX_FILES_PER_UPLOAD = 10
     
+    # Tipos de búsqueda del retriever
+    SEARCH_TYPES = ["similarity", "mmr", "similarity_score_threshold"]
+    
     # Configuración de chat
     MAX_CHAT_HISTORY = 100
     CHAT_EXPORT_FORMATS = ["json", "txt", "csv"]
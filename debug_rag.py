@@ -51,6 +51,10 @@ try:
                 stats = rag.get_database_stats()
                 st.json(stats)
                 
+                # Warm-up con tiempos por paso
+                rag.warm_up()
+                st.json(rag.get_readiness())
+                
             except Exception as e:
                 st.error(f"❌ Error creando RAGSystem: {e}")
                 st.exception(e)
@@ -82,4 +86,64 @@ try:
                 
 except Exception as e:
     st.error(f"Error en test de función cacheada: {e}")
-    st.exception(e)
\ No newline at end of file
+    st.exception(e)
+# Perfiles de rendimiento (modo debug)
+st.subheader("5. Perfiles de rendimiento")
+try:
+    from profiling import list_profiles, profile_request, profiling_enabled
+    from config import rag_config
+
+    st.write(f"- Perfilado automático: {'✅ activo' if profiling_enabled() else '❌ inactivo (DEBUG_MODE o Modo Debug en Configuración)'}")
+    st.write(f"- Directorio de perfiles: `{rag_config.profile_directory}`")
+
+    question = st.text_input("Perfilar una pregunta ahora", placeholder="¿De qué trata el documento?")
+    if st.button("Perfilar pregunta") and question:
+        with st.spinner("Ejecutando pregunta bajo cProfile y tracemalloc..."):
+            try:
+                rag = test_create_rag_system()
+                if rag and (rag.qa_chain or (rag.load_existing_vectorstore() and rag.setup_qa_chain())):
+                    with profile_request("question", question, force=True) as profile:
+                        response = rag.ask_question(question)
+                    st.write(response["answer"])
+                    if profile:
+                        st.success(f"✅ Perfil guardado: {profile['id']}")
+                    else:
+                        st.warning("Ya hay otro perfil en curso; inténtalo de nuevo")
+                else:
+                    st.error("❌ No hay base de datos vectorial o no se pudo configurar la cadena QA")
+            except Exception as e:
+                st.error(f"❌ Error perfilando la pregunta: {e}")
+                st.exception(e)
+
+    profiles = list_profiles()
+    if not profiles:
+        st.info("No hay perfiles guardados todavía")
+    else:
+        selected = st.selectbox(
+            "Perfil",
+            profiles,
+            format_func=lambda p: f"{p['id']} · {p['duration_ms']:.0f} ms · {p['label'][:60]}"
+        )
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Duración", f"{selected['duration_ms']:.0f} ms")
+        col2.metric("Pico de memoria", f"{selected['memory_peak_kb'] / 1024:.1f} MB")
+        col3.metric("Memoria retenida", f"{selected['memory_retained_kb'] / 1024:.1f} MB")
+
+        st.write("**Funciones por tiempo acumulado**")
+        st.dataframe(selected["top_functions"], use_container_width=True)
+        st.write("**Puntos de asignación de memoria**")
+        st.dataframe(selected["top_allocations"], use_container_width=True)
+
+        if os.path.exists(selected["pstats_path"]):
+            with open(selected["pstats_path"], "rb") as f:
+                st.download_button(
+                    "📥 Descargar .pstats",
+                    data=f.read(),
+                    file_name=f"{selected['id']}.pstats",
+                    mime="application/octet-stream",
+                    help="Abrir con `python -m pstats` o snakeviz"
+                )
+
+except Exception as e:
+    st.error(f"Error en perfiles de rendimiento: {e}")
+    st.exception(e)
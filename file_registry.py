@@ -0,0 +1,163 @@
+"""
+Registro normalizado de archivos fuente
+
+Cada chunk repetía la ruta, el nombre, el tipo y la fecha de carga de su
+archivo. Con el registro, esos datos se guardan una sola vez por archivo en
+`files.sqlite3` (directorio de persistencia) y el chunk lleva solo un id entero
+(`fid`), la página y el desplazamiento del chunk dentro de ella. La metadata
+completa se reconstruye solo para los chunks que devuelve una búsqueda.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Claves por archivo que salen de la metadata de cada chunk
+FILE_KEYS = ("file_path", "file_name", "file_type", "load_time")
+
+
+class FileRecord(NamedTuple):
+    """Fila de la tabla de archivos"""
+    fid: int
+    path: str
+    name: str
+    type: str
+    hash: Optional[str]
+    load_time: Optional[float]
+
+
+class FileRegistry:
+    """Tabla de archivos fuente y conversión entre metadata compacta y completa"""
+
+    def __init__(self, persist_directory: str):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.path = os.path.join(persist_directory, "files.sqlite3")
+        self._lock = threading.Lock()
+        self._by_fid: Dict[int, FileRecord] = {}
+        self._by_path: Dict[str, FileRecord] = {}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " fid INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, name TEXT NOT NULL,"
+            " type TEXT NOT NULL, hash TEXT, load_time REAL)"
+        )
+        self._conn.commit()
+        self._reload()
+
+    def _reload(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT fid, path, name, type, hash, load_time FROM files").fetchall()
+            for row in rows:
+                record = FileRecord(*row)
+                self._by_fid[record.fid] = record
+                self._by_path[record.path] = record
+
+    def register(self, path: str, name: str, file_type: str, load_time: Optional[float] = None) -> int:
+        """Da de alta (o actualiza) un archivo y devuelve su id"""
+        record = self._by_path.get(path)
+        if record is not None and (record.name, record.type, record.load_time) == (name, file_type, load_time):
+            return record.fid
+
+        file_hash = None
+        if os.path.exists(path):
+            from pdf_cache import file_sha256
+
+            file_hash = file_sha256(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO files (path, name, type, hash, load_time) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET name = excluded.name, type = excluded.type, "
+                "hash = excluded.hash, load_time = excluded.load_time",
+                (path, name, file_type, file_hash, load_time)
+            )
+            fid = self._conn.execute("SELECT fid FROM files WHERE path = ?", (path,)).fetchone()[0]
+            self._conn.commit()
+            record = FileRecord(fid, path, name, file_type, file_hash, load_time)
+            self._by_fid[fid] = record
+            self._by_path[path] = record
+        return fid
+
+    def get(self, fid: int) -> Optional[FileRecord]:
+        """Archivo por id; relee la tabla si lo registró otro proceso"""
+        record = self._by_fid.get(fid)
+        if record is None:
+            self._reload()
+            record = self._by_fid.get(fid)
+        return record
+
+    def fid_of(self, path: str) -> Optional[int]:
+        """Id de un archivo por ruta, o None si no está registrado"""
+        record = self._by_path.get(path)
+        if record is None:
+            self._reload()
+            record = self._by_path.get(path)
+        return record.fid if record else None
+
+    def find(self, name_or_path: str) -> List[FileRecord]:
+        """Archivos cuyo nombre o ruta coincide"""
+        self._reload()
+        with self._lock:
+            return [r for r in self._by_fid.values() if name_or_path in (r.name, r.path)]
+
+    def path_of(self, metadata: Dict[str, Any]) -> Optional[str]:
+        """Ruta del archivo de un chunk, con metadata compacta o completa"""
+        if metadata.get("fid") is not None:
+            record = self.get(metadata["fid"])
+            return record.path if record else None
+        return metadata.get("file_path")
+
+    def encode(self, metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Metadata completa -> compacta: {fid, page, offset} más las claves propias del loader.
+        No modifica los diccionarios recibidos.
+        """
+        fids: Dict[str, int] = {}
+        compact = []
+        for metadata in metadatas:
+            metadata = metadata or {}
+            path = metadata.get("file_path")
+            if path is None:
+                # Sin archivo de origen o ya compacta
+                compact.append(dict(metadata))
+                continue
+            if path not in fids:
+                fids[path] = self.register(
+                    path,
+                    metadata.get("file_name") or os.path.basename(path),
+                    metadata.get("file_type") or os.path.splitext(path)[1].lower(),
+                    metadata.get("load_time")
+                )
+            row = {key: value for key, value in metadata.items() if key not in FILE_KEYS}
+            if row.get("source") == path:
+                del row["source"]
+            if "start_index" in row:
+                row["offset"] = row.pop("start_index")
+            row["fid"] = fids[path]
+            compact.append(row)
+        return compact
+
+    def decode(self, metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Metadata compacta -> completa; la que no tiene `fid` se devuelve tal cual"""
+        full = []
+        for metadata in metadatas:
+            metadata = metadata or {}
+            record = self.get(metadata["fid"]) if metadata.get("fid") is not None else None
+            if record is None:
+                full.append(dict(metadata))
+                continue
+            row = {"source": record.path}
+            row.update((key, value) for key, value in metadata.items() if key not in ("fid", "offset"))
+            if "offset" in metadata:
+                row["start_index"] = metadata["offset"]
+            row.update({"file_path": record.path, "file_name": record.name, "file_type": record.type})
+            if record.load_time is not None:
+                row["load_time"] = record.load_time
+            full.append(row)
+        return full
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Archivos registrados"""
+        with self._lock:
+            return {"registered_files": len(self._by_fid)}
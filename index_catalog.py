@@ -0,0 +1,159 @@
+"""
+Catálogo de estadísticas del índice vectorial
+
+Lleva en una tabla SQLite pequeña (`catalog.sqlite3` en el directorio de
+persistencia) los contadores de cada colección: chunks, chunks por archivo,
+dimensión de los vectores y fecha de la última ingesta. Se actualiza de forma
+incremental en cada inserción o borrado, de modo que leer las estadísticas es
+una consulta por clave y no un recorrido de la colección.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+# Bytes por componente de los vectores almacenados (float32)
+BYTES_PER_COMPONENT = 4
+
+
+class IndexCatalog:
+    """Contadores por colección y por archivo del índice vectorial"""
+
+    def __init__(self, persist_directory: str):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.path = os.path.join(persist_directory, "catalog.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS collections ("
+            " name TEXT PRIMARY KEY, chunks INTEGER NOT NULL DEFAULT 0, files INTEGER NOT NULL DEFAULT 0,"
+            " dim INTEGER NOT NULL DEFAULT 0, last_ingest REAL);"
+            "CREATE TABLE IF NOT EXISTS files ("
+            " collection TEXT NOT NULL, file_path TEXT NOT NULL, file_name TEXT,"
+            " chunks INTEGER NOT NULL DEFAULT 0, last_ingest REAL,"
+            " PRIMARY KEY (collection, file_path));"
+        )
+        self._conn.commit()
+
+    def record_chunks(self, collection: str, metadatas: Iterable[Dict[str, Any]], dim: int = 0,
+                      timestamp: Optional[float] = None):
+        """Suma chunks recién insertados a los contadores de la colección y de sus archivos"""
+        per_file: Dict[str, Tuple[str, int]] = {}
+        total = 0
+        for metadata in metadatas:
+            metadata = metadata or {}
+            path = metadata.get("file_path") or metadata.get("source") or ""
+            name, count = per_file.get(path, (metadata.get("file_name") or os.path.basename(path), 0))
+            per_file[path] = (name, count + 1)
+            total += 1
+        if total == 0:
+            return
+
+        now = timestamp or time.time()
+        with self._lock:
+            new_files = 0
+            for path, (name, count) in per_file.items():
+                cursor = self._conn.execute(
+                    "UPDATE files SET chunks = chunks + ?, file_name = ?, last_ingest = ? "
+                    "WHERE collection = ? AND file_path = ?",
+                    (count, name, now, collection, path)
+                )
+                if cursor.rowcount == 0:
+                    self._conn.execute(
+                        "INSERT INTO files (collection, file_path, file_name, chunks, last_ingest) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (collection, path, name, count, now)
+                    )
+                    new_files += 1
+            self._conn.execute(
+                "INSERT INTO collections (name, chunks, files, dim, last_ingest) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET chunks = chunks + excluded.chunks, "
+                "files = files + excluded.files, dim = MAX(dim, excluded.dim), last_ingest = excluded.last_ingest",
+                (collection, total, new_files, dim, now)
+            )
+            self._conn.commit()
+
+    def set_dim(self, collection: str, dim: int):
+        """Fija la dimensión de los vectores si no se conocía al insertar"""
+        with self._lock:
+            self._conn.execute("UPDATE collections SET dim = ? WHERE name = ?", (dim, collection))
+            self._conn.commit()
+
+    def remove_files(self, collection: str, file_paths: Iterable[str]) -> int:
+        """Descuenta archivos eliminados; devuelve los chunks descontados"""
+        removed_chunks = removed_files = 0
+        with self._lock:
+            for path in file_paths:
+                row = self._conn.execute(
+                    "SELECT chunks FROM files WHERE collection = ? AND file_path = ?", (collection, path)
+                ).fetchone()
+                if row:
+                    removed_chunks += row[0]
+                    removed_files += 1
+                    self._conn.execute(
+                        "DELETE FROM files WHERE collection = ? AND file_path = ?", (collection, path)
+                    )
+            self._conn.execute(
+                "UPDATE collections SET chunks = MAX(0, chunks - ?), files = MAX(0, files - ?) WHERE name = ?",
+                (removed_chunks, removed_files, collection)
+            )
+            self._conn.commit()
+        return removed_chunks
+
+    def reset_collection(self, collection: str):
+        """Olvida los contadores de una colección (al eliminarla o antes de recalcularlos)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM collections WHERE name = ?", (collection,))
+            self._conn.commit()
+
+    def has_collection(self, collection: str) -> bool:
+        """Indica si el catálogo tiene contadores para la colección"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM collections WHERE name = ?", (collection,)
+            ).fetchone() is not None
+
+    def file_paths(self) -> Set[str]:
+        """Rutas de los archivos con chunks en alguna colección (activa o conservada para rollback)"""
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT DISTINCT file_path FROM files")}
+
+    def get_stats(self, collection: str, top_files: int = 10) -> Dict[str, Any]:
+        """
+        Contadores de una colección y los archivos con más chunks. `chunks_per_file`
+        va por ruta (dos archivos pueden llamarse igual) con el nombre para mostrar.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunks, files, dim, last_ingest FROM collections WHERE name = ?", (collection,)
+            ).fetchone()
+            files = self._conn.execute(
+                "SELECT file_path, file_name, chunks FROM files WHERE collection = ? ORDER BY chunks DESC LIMIT ?",
+                (collection, top_files)
+            ).fetchall()
+        chunks, file_count, dim, last_ingest = row or (0, 0, 0, None)
+        return {
+            "chunks": chunks,
+            "files": file_count,
+            "vector_dim": dim,
+            "vector_bytes": chunks * dim * BYTES_PER_COMPONENT,
+            "last_ingest": last_ingest,
+            "chunks_per_file": {path: {"name": name, "chunks": count} for path, name, count in files},
+        }
+
+
+def directory_size(path: str) -> int:
+    """Tamaño total en disco de un directorio"""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                # Archivo borrado mientras se recorría (p. ej. un WAL)
+                continue
+    return total
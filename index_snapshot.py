@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Snapshots portables del índice vectorial
+
+Un snapshot es un directorio autocontenido que se puede copiar entre nodos:
+
+    manifest.json      formato, modelo de embeddings, configuración, dimensiones y checksums
+    vectors.f32|f16    matriz contigua (filas x dim) en little-endian, lista para np.memmap
+    chunks.jsonl.gz    ids, textos y metadatos en columnas, un grupo de filas por línea
+
+La importación carga los vectores tal cual, sin volver a calcular embeddings.
+
+Uso:
+    python index_snapshot.py export snapshots/base --dtype float16
+    python index_snapshot.py import snapshots/base
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import rag_config
+
+logger = logging.getLogger("index_snapshot")
+
+SNAPSHOT_FORMAT = 1
+MANIFEST_FILE = "manifest.json"
+CHUNKS_FILE = "chunks.jsonl.gz"
+VECTOR_DTYPES = {"float32": "<f4", "float16": "<f2"}
+
+
+def _vectors_file(dtype: str) -> str:
+    return "vectors.f32" if dtype == "float32" else "vectors.f16"
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _to_columns(ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convierte un lote de filas en columnas; una clave ausente se guarda como null"""
+    keys = sorted({key for metadata in metadatas for key in (metadata or {})})
+    return {
+        "ids": ids,
+        "texts": texts,
+        "metadata": {key: [(metadata or {}).get(key) for metadata in metadatas] for key in keys},
+    }
+
+
+def _from_columns(group: Dict[str, Any]) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+    columns = group["metadata"]
+    metadatas = [
+        {key: values[i] for key, values in columns.items() if values[i] is not None}
+        for i in range(len(group["ids"]))
+    ]
+    return group["ids"], group["texts"], metadatas
+
+
+def write_snapshot(batches: Iterator[Dict[str, list]], output_dir: str, info: Dict[str, Any],
+                   dtype: str = "float32",
+                   keep: Optional[Callable[[str, Dict[str, Any]], bool]] = None) -> Dict[str, Any]:
+    """
+    Escribe un snapshot a partir de lotes como los de `VectorBackend.snapshot()`
+    Args:
+        batches: Lotes con ids, texts, metadatas y embeddings
+        output_dir: Directorio de destino (no debe existir o estar vacío)
+        info: Datos del índice para el manifiesto (modelo de embeddings, configuración...)
+        dtype: 'float32' o 'float16' para los vectores
+        keep: Filtro opcional (id, metadata) -> bool para excluir chunks
+    Returns:
+        Manifiesto escrito
+    """
+    import numpy as np
+
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"dtype no soportado: {dtype}")
+    if os.path.isdir(output_dir) and os.listdir(output_dir):
+        raise ValueError(f"El directorio de destino no está vacío: {output_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    vectors_path = os.path.join(output_dir, _vectors_file(dtype))
+    chunks_path = os.path.join(output_dir, CHUNKS_FILE)
+    count, dim, row_groups = 0, None, 0
+
+    # Los vectores se escriben por lotes: memoria acotada al tamaño del lote
+    with open(vectors_path, "wb") as vectors_out, gzip.open(chunks_path, "wt", encoding="utf-8") as chunks_out:
+        for batch in batches:
+            rows = range(len(batch["ids"]))
+            if keep is not None:
+                rows = [i for i in rows if keep(batch["ids"][i], batch["metadatas"][i] or {})]
+            if not rows:
+                continue
+
+            matrix = np.asarray([batch["embeddings"][i] for i in rows], dtype=VECTOR_DTYPES[dtype])
+            if dim is None:
+                dim = matrix.shape[1]
+            elif matrix.shape[1] != dim:
+                raise ValueError(f"Dimensión inconsistente: {matrix.shape[1]} != {dim}")
+            vectors_out.write(matrix.tobytes())
+
+            group = _to_columns([batch["ids"][i] for i in rows], [batch["texts"][i] for i in rows],
+                                [batch["metadatas"][i] for i in rows])
+            chunks_out.write(json.dumps(group, ensure_ascii=False) + "\n")
+            count += len(rows)
+            row_groups += 1
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "count": count,
+        "dim": dim or 0,
+        "dtype": dtype,
+        "row_groups": row_groups,
+        **info,
+        "files": {
+            name: {"bytes": os.path.getsize(os.path.join(output_dir, name)),
+                   "sha256": _file_digest(os.path.join(output_dir, name))}
+            for name in (_vectors_file(dtype), CHUNKS_FILE)
+        },
+    }
+    # El manifiesto se escribe al final: su presencia marca el snapshot como completo
+    tmp_path = os.path.join(output_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_FILE))
+    return manifest
+
+
+def read_manifest(snapshot_dir: str, verify: bool = True) -> Dict[str, Any]:
+    """
+    Lee y valida el manifiesto de un snapshot
+    Args:
+        snapshot_dir: Directorio del snapshot
+        verify: Si True, comprueba tamaños y checksums de los archivos
+    """
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"No hay un snapshot completo en {snapshot_dir} (falta {MANIFEST_FILE})")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Formato de snapshot no soportado: {manifest.get('format')}")
+
+    for name, expected in manifest["files"].items():
+        path = os.path.join(snapshot_dir, name)
+        if not os.path.exists(path) or os.path.getsize(path) != expected["bytes"]:
+            raise ValueError(f"Archivo del snapshot ausente o incompleto: {name}")
+        if verify and _file_digest(path) != expected["sha256"]:
+            raise ValueError(f"Checksum incorrecto en {name}")
+    return manifest
+
+
+def iter_snapshot(snapshot_dir: str, manifest: Dict[str, Any]) -> Iterator[Dict[str, list]]:
+    """
+    Itera un snapshot por grupos de filas, con el mismo formato de lote que
+    `VectorBackend.snapshot()`. Los vectores se leen con memmap sin cargar la matriz entera.
+    """
+    import numpy as np
+
+    count, dim = manifest["count"], manifest["dim"]
+    if count == 0:
+        return
+    vectors = np.memmap(os.path.join(snapshot_dir, _vectors_file(manifest["dtype"])),
+                        dtype=VECTOR_DTYPES[manifest["dtype"]], mode="r", shape=(count, dim))
+    offset = 0
+    with gzip.open(os.path.join(snapshot_dir, CHUNKS_FILE), "rt", encoding="utf-8") as f:
+        for line in f:
+            ids, texts, metadatas = _from_columns(json.loads(line))
+            block = np.asarray(vectors[offset:offset + len(ids)], dtype=np.float32)
+            offset += len(ids)
+            yield {"ids": ids, "texts": texts, "metadatas": metadatas, "embeddings": block.tolist()}
+    if offset != count:
+        raise ValueError(f"El snapshot tiene {offset} chunks, el manifiesto indica {count}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Exporta o importa snapshots del índice vectorial")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("path", help="Directorio del snapshot")
+    parser.add_argument("--persist-directory", default=rag_config.persist_directory,
+                        help="Directorio de la base de datos vectorial")
+    parser.add_argument("--dtype", choices=sorted(VECTOR_DTYPES), default="float32",
+                        help="Precisión de los vectores exportados")
+    parser.add_argument("--vector-backend", default=None,
+                        help="Backend de la colección importada (por defecto el actual)")
+    parser.add_argument("--force", action="store_true", help="Sobrescribir un snapshot existente")
+    args = parser.parse_args(argv)
+
+    from rag_system import RAGSystem
+
+    rag = RAGSystem(persist_directory=args.persist_directory)
+    start = time.perf_counter()
+
+    if args.action == "export":
+        if not rag.load_existing_vectorstore():
+            print("Error: no hay base de datos que exportar", file=sys.stderr)
+            return 2
+        if args.force and os.path.isdir(args.path):
+            shutil.rmtree(args.path)
+        result = rag.export_snapshot(args.path, dtype=args.dtype)
+        if "error" in result:
+            print(f"Error: {result['error']}", file=sys.stderr)
+            return 1
+        size_mb = sum(f["bytes"] for f in result["files"].values()) / 1024 ** 2
+        print(f"Exportados {result['count']} chunks (dim {result['dim']}, {result['dtype']}, "
+              f"{size_mb:.1f} MB) en {time.perf_counter() - start:.1f} s")
+        return 0
+
+    rag.load_existing_vectorstore()
+    if not rag.import_snapshot(args.path, vector_backend=args.vector_backend):
+        print("Error: no se pudo importar el snapshot", file=sys.stderr)
+        return 1
+    print(f"Importados {rag.vectorstore.backend.count()} chunks en la colección {rag.collection_name} "
+          f"en {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Ingesta masiva de documentos desde la línea de comandos
+
+Recorre un directorio, filtra por los formatos soportados y carga los documentos
+en la base de datos vectorial usando RAGSystem. Guarda un checkpoint por archivo
+para que una ejecución interrumpida continúe donde se quedó.
+
+Uso:
+    python ingest.py documents/ --workers 4 --embed-workers 2 --batch-size 64
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterator, List, Set, Tuple
+
+from config import rag_config
+
+logger = logging.getLogger("ingest")
+
+
+def iter_files(root: str, supported_formats: List[str]) -> Iterator[str]:
+    """Recorre el árbol de directorios en orden estable, filtrando por extensión"""
+    formats = {ext.lower() for ext in supported_formats}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in formats:
+                yield os.path.join(dirpath, filename)
+
+
+def file_fingerprint(path: str) -> str:
+    """Huella barata de un archivo: si cambia, el archivo se vuelve a ingerir"""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def chunk_ids(path: str, count: int) -> List[str]:
+    """Ids deterministas por archivo, para que reintentar un lote no duplique chunks"""
+    prefix = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+    return [f"{prefix}-{i}" for i in range(count)]
+
+
+class Checkpoint:
+    """Registro append-only (JSONL) de los archivos ya ingeridos"""
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.done: Dict[str, str] = {}
+        # Archivos ingeridos alguna vez: sus chunks anteriores se borran antes de reingerirlos
+        self.ingested: Set[str] = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.done[entry["path"]] = entry["fingerprint"]
+                    except (json.JSONDecodeError, KeyError):
+                        # Una línea truncada por una caída se ignora
+                        continue
+            self.ingested.update(self.done)
+            if restart:
+                self.done = {}
+                open(path, "w", encoding="utf-8").close()
+
+    def is_done(self, path: str, fingerprint: str) -> bool:
+        return self.done.get(path) == fingerprint
+
+    def mark(self, entries: List[Tuple[str, str, int]]):
+        """Marca archivos como ingeridos (ruta, huella, número de chunks)"""
+        if not entries:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for path, fingerprint, chunks in entries:
+                f.write(json.dumps({"path": path, "fingerprint": fingerprint, "chunks": chunks}) + "\n")
+                self.done[path] = fingerprint
+                self.ingested.add(path)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def load_and_split(rag, path: str):
+    """Carga un archivo y lo divide en chunks (se ejecuta en el pool de workers)"""
+    documents = rag.load_documents([path])
+    if not documents:
+        return path, None, 0
+    return path, rag.split_documents(documents), len(documents)
+
+
+def run_ingestion(rag, root: str, checkpoint: Checkpoint, workers: int = 4,
+                  embed_workers: int = 2, batch_size: int = 64) -> Dict[str, float]:
+    """
+    Ingiere todos los archivos soportados bajo `root`
+    Args:
+        rag: Instancia de RAGSystem
+        root: Directorio raíz a recorrer
+        checkpoint: Checkpoint de archivos ya ingeridos
+        workers: Hilos para cargar y dividir documentos
+        embed_workers: Hilos para calcular embeddings en paralelo
+        batch_size: Chunks por lote de embeddings/inserción
+    Returns:
+        Diccionario con estadísticas de la ejecución
+    """
+    stats = {"files_seen": 0, "files_skipped": 0, "files_ingested": 0, "files_failed": 0,
+             "pages": 0, "chunks": 0}
+    start = time.perf_counter()
+
+    files = iter_files(root, rag_config.supported_formats)
+    exhausted = False
+    load_futures = {}
+    embed_futures = {}
+    pending: List[Tuple[str, str, list]] = []
+    pending_chunks = 0
+
+    def next_file():
+        nonlocal exhausted
+        for path in files:
+            stats["files_seen"] += 1
+            fingerprint = file_fingerprint(path)
+            if checkpoint.is_done(path, fingerprint):
+                stats["files_skipped"] += 1
+                continue
+            return path, fingerprint
+        exhausted = True
+        return None
+
+    def embed_batch(batch):
+        chunks = [chunk for _, _, file_chunks in batch for chunk in file_chunks]
+        ids = [i for path, _, file_chunks in batch for i in chunk_ids(path, len(file_chunks))]
+        vectors = rag.embeddings.embed_documents([chunk.page_content for chunk in chunks]) if chunks else []
+        return batch, chunks, ids, vectors
+
+    def handle_embedded(future):
+        batch = embed_futures.pop(future)
+        try:
+            batch, chunks, ids, vectors = future.result()
+        except Exception as e:
+            logger.error(f"Error calculando embeddings: {str(e)}")
+            stats["files_failed"] += len(batch)
+            return
+        # Una versión anterior con más chunks dejaría ids `prefijo-N` huérfanos en el índice
+        changed = [path for path, _, _ in batch if path in checkpoint.ingested]
+        if changed:
+            rag.delete_file_chunks(changed)
+        if rag.add_chunks(chunks, ids=ids, embeddings=vectors):
+            checkpoint.mark([(path, fingerprint, len(file_chunks)) for path, fingerprint, file_chunks in batch])
+            stats["files_ingested"] += len(batch)
+            stats["chunks"] += len(chunks)
+        else:
+            stats["files_failed"] += len(batch)
+
+    with ThreadPoolExecutor(max_workers=workers) as load_pool, \
+            ThreadPoolExecutor(max_workers=embed_workers) as embed_pool:
+
+        def flush():
+            nonlocal pending, pending_chunks
+            if not pending:
+                return
+            # Contrapresión: no acumular más lotes en vuelo que workers de embeddings
+            while len(embed_futures) >= embed_workers:
+                done, _ = wait(list(embed_futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle_embedded(future)
+            batch = pending
+            embed_futures[embed_pool.submit(embed_batch, batch)] = batch
+            pending, pending_chunks = [], 0
+
+        while True:
+            while not exhausted and len(load_futures) < workers * 2:
+                item = next_file()
+                if item is None:
+                    break
+                path, fingerprint = item
+                load_futures[load_pool.submit(load_and_split, rag, path)] = fingerprint
+
+            if not load_futures:
+                flush()
+                if not embed_futures:
+                    break
+
+            done, _ = wait(list(load_futures) + list(embed_futures), return_when=FIRST_COMPLETED)
+            for future in done:
+                # flush() puede haber atendido ya un lote de embeddings de este mismo `done`
+                if future in embed_futures:
+                    handle_embedded(future)
+                    continue
+                if future not in load_futures:
+                    continue
+                fingerprint = load_futures.pop(future)
+                try:
+                    path, chunks, pages = future.result()
+                except Exception as e:
+                    logger.error(f"Error cargando archivo: {str(e)}")
+                    stats["files_failed"] += 1
+                    continue
+                if chunks is None:
+                    stats["files_failed"] += 1
+                    continue
+                stats["pages"] += pages
+                pending.append((path, fingerprint, chunks))
+                pending_chunks += len(chunks)
+                if pending_chunks >= batch_size:
+                    flush()
+
+    elapsed = time.perf_counter() - start
+    stats["elapsed_seconds"] = round(elapsed, 2)
+    stats["docs_per_second"] = round(stats["files_ingested"] / elapsed, 2) if elapsed > 0 else 0.0
+    stats["chunks_per_second"] = round(stats["chunks"] / elapsed, 2) if elapsed > 0 else 0.0
+    stats.update(rag.embeddings.get_stats())
+    return stats
+
+
+def print_report(stats: Dict[str, float]):
+    """Imprime el resumen de rendimiento de la ingesta"""
+    print("\n=== Resumen de ingesta ===")
+    print(f"Archivos encontrados:  {stats['files_seen']}")
+    print(f"Ya ingeridos (skip):   {stats['files_skipped']}")
+    print(f"Ingeridos:             {stats['files_ingested']}")
+    print(f"Fallidos:              {stats['files_failed']}")
+    print(f"Páginas:               {stats['pages']}")
+    print(f"Chunks:                {stats['chunks']}")
+    print(f"Tiempo total:          {stats['elapsed_seconds']} s")
+    print(f"Documentos/s:          {stats['docs_per_second']}")
+    print(f"Chunks/s:              {stats['chunks_per_second']}")
+    print(f"Llamadas de embedding: {stats['embed_calls']} ({stats['embedded_texts']} textos, "
+          f"{stats['avg_call_ms']} ms/llamada)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ingesta masiva de documentos en el sistema RAG")
+    parser.add_argument("directory", help="Directorio raíz con los documentos")
+    parser.add_argument("--persist-directory", default=rag_config.persist_directory,
+                        help="Directorio de la base de datos vectorial")
+    parser.add_argument("--workers", type=int, default=4, help="Hilos de carga y división")
+    parser.add_argument("--embed-workers", type=int, default=2, help="Hilos de cálculo de embeddings")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks por lote de embeddings")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Debe coincidir con la generación activa del índice (por defecto, el suyo)")
+    parser.add_argument("--chunk-overlap", type=int, default=None,
+                        help="Debe coincidir con la generación activa del índice (por defecto, el suyo)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Archivo de checkpoint (por defecto dentro del directorio de persistencia)")
+    parser.add_argument("--restart", action="store_true", help="Ignorar el checkpoint existente")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: no existe el directorio {args.directory}", file=sys.stderr)
+        return 2
+
+    from rag_system import RAGSystem
+
+    checkpoint_path = args.checkpoint or os.path.join(args.persist_directory, "ingest_checkpoint.jsonl")
+
+    rag = RAGSystem(persist_directory=args.persist_directory)
+    # Una colección solo admite el chunking con el que se creó su generación
+    active = rag.index_state["config"]
+    for option, key in (("--chunk-size", "chunk_size"), ("--chunk-overlap", "chunk_overlap")):
+        requested = getattr(args, key)
+        if requested is not None and requested != active[key]:
+            print(f"Error: {option} {requested} no coincide con la generación activa del índice "
+                  f"({key}={active[key]}). Para cambiarlo, reindexa con RAGSystem.rebuild_index "
+                  f"(o \"Reindexar\" en Configuración) y vuelve a lanzar la ingesta.", file=sys.stderr)
+            return 2
+    rag.load_existing_vectorstore()
+
+    stats = run_ingestion(
+        rag,
+        args.directory,
+        Checkpoint(checkpoint_path, restart=args.restart),
+        workers=max(1, args.workers),
+        embed_workers=max(1, args.embed_workers),
+        batch_size=max(1, args.batch_size)
+    )
+    print_report(stats)
+    return 1 if stats["files_failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Generador de carga extremo a extremo para ask_question con informe de SLO
+
+Simula N usuarios concurrentes que eligen preguntas de una mezcla ponderada,
+esperan la respuesta y "piensan" un tiempo exponencial antes de la siguiente.
+El objetivo es `RAGSystem` en proceso (con el mismo control de admisión que el
+chat y proveedores offline con latencia simulada) o un endpoint HTTP como el de
+`api_server.py`.
+
+Informa throughput, percentiles de latencia, tasa de errores y rechazos, y la
+espera en cola del control de admisión, en total y por intervalos de tiempo.
+Con `--slo-*` sale con código 1 si la ejecución incumple algún objetivo.
+
+Uso:
+    python load_test.py --users 8 --duration 60 --slo-p95-ms 3000 --slo-error-rate 0.01
+    python load_test.py --url http://127.0.0.1:8000/ask --users 16 --think-time 5
+    python load_test.py --questions preguntas.jsonl --llm-latency-ms 1200 --output carga.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+from metrics import LatencyHistogram
+
+DEFAULT_QUESTIONS = [
+    ("¿De qué tratan los documentos?", 3.0),
+    ("Resume los puntos principales", 2.0),
+    ("¿Qué conclusiones se presentan?", 1.0),
+    ("Explica los conceptos más importantes con ejemplos", 1.0),
+    ("¿Qué datos o cifras se mencionan?", 1.0),
+]
+
+# Resultado de una petición: 'ok', 'error' (fallo de la cadena o del servidor),
+# 'rejected' (control de admisión) o 'timeout'
+STATUSES = ("ok", "error", "rejected", "timeout")
+
+
+class Outcome:
+    __slots__ = ("status", "latency", "queue", "detail")
+
+    def __init__(self, status: str, latency: float, queue: Optional[float] = None, detail: str = ""):
+        self.status = status
+        self.latency = latency
+        self.queue = queue
+        self.detail = detail
+
+
+class DirectTarget:
+    """Pregunta a un RAGSystem en proceso pasando por el control de admisión, como el chat"""
+
+    def __init__(self, rag, admission=None):
+        self.rag = rag
+        self.admission = admission
+
+    def ask(self, question: str, session_id: str) -> Outcome:
+        from admission import QUERY, RejectedError
+
+        start = time.perf_counter()
+        queued = None
+        try:
+            if self.admission is not None:
+                with self.admission.admit(session_id, QUERY):
+                    queued = time.perf_counter() - start
+                    response = self.rag.ask_question(question)
+            else:
+                response = self.rag.ask_question(question)
+        except RejectedError as e:
+            return Outcome("rejected", time.perf_counter() - start, detail=e.reason)
+        latency = time.perf_counter() - start
+        if response.get("error"):
+            return Outcome("error", latency, queued, response["answer"][:200])
+        return Outcome("ok", latency, queued)
+
+
+class HttpTarget:
+    """Pregunta a un endpoint HTTP compatible con `api_server.py` (POST JSON)"""
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+
+    def ask(self, question: str, session_id: str) -> Outcome:
+        payload = json.dumps({"question": question, "session_id": session_id}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=payload, headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read() or b"{}")
+            queue_ms = body.get("queue_ms")
+            return Outcome("ok", time.perf_counter() - start, queue_ms / 1000 if queue_ms is not None else None)
+        except urllib.error.HTTPError as e:
+            status = "rejected" if e.code in (429, 503) else "error"
+            return Outcome(status, time.perf_counter() - start, detail=f"HTTP {e.code}")
+        except (TimeoutError, OSError) as e:
+            # urllib envuelve los timeouts de lectura en URLError/socket.timeout
+            timed_out = isinstance(e, TimeoutError) or "timed out" in str(e)
+            return Outcome("timeout" if timed_out else "error", time.perf_counter() - start, detail=str(e)[:200])
+
+
+class _Window:
+    """Estadísticas de un intervalo de la ejecución"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.queue = LatencyHistogram()
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self.active_users = 0
+
+
+class LoadRecorder:
+    """Acumula resultados en total y por intervalos de `interval` segundos, en memoria constante"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.total = _Window()
+        self.windows: Dict[int, _Window] = {}
+        self.errors: Dict[str, int] = {}
+        self.active_users = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def user_started(self):
+        with self._lock:
+            self.active_users += 1
+
+    def record(self, finished: float, outcome: Outcome):
+        with self._lock:
+            index = int((finished - self.start) / self.interval)
+            window = self.windows.get(index)
+            if window is None:
+                window = self.windows[index] = _Window()
+            window.active_users = self.active_users
+            for target in (self.total, window):
+                target.counts[outcome.status] += 1
+                if outcome.status == "ok":
+                    target.latency.record(outcome.latency)
+                if outcome.queue is not None:
+                    target.queue.record(outcome.queue)
+            if outcome.status != "ok":
+                key = f"{outcome.status}: {outcome.detail}" if outcome.detail else outcome.status
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+
+def run_load(target, users: int, duration: float, questions: List[Tuple[str, float]], think_time: float,
+             ramp_up: float, interval: float, seed: int = 0) -> LoadRecorder:
+    """
+    Lanza `users` usuarios durante `duration` segundos
+    Cada usuario arranca escalonado dentro de `ramp_up`, elige una pregunta según
+    los pesos de `questions` y espera un tiempo exponencial de media `think_time`.
+    """
+    recorder = LoadRecorder(interval)
+    deadline = recorder.start + duration
+    texts = [question for question, _ in questions]
+    weights = [weight for _, weight in questions]
+
+    def user(index: int):
+        rng = random.Random(seed * 100003 + index)
+        time.sleep(ramp_up * index / max(1, users))
+        recorder.user_started()
+        session_id = f"load-user-{index}"
+        while time.perf_counter() < deadline:
+            outcome = target.ask(rng.choices(texts, weights)[0], session_id)
+            recorder.record(time.perf_counter(), outcome)
+            if think_time > 0:
+                time.sleep(min(rng.expovariate(1.0 / think_time), max(0.0, deadline - time.perf_counter())))
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.elapsed = time.perf_counter() - recorder.start
+    return recorder
+
+
+def window_summary(window: _Window, seconds: float) -> Dict[str, Any]:
+    requests = sum(window.counts.values())
+    latency, queue = window.latency.summary(), window.queue.summary()
+    return {
+        "requests": requests,
+        **window.counts,
+        "throughput_rps": round(window.counts["ok"] / seconds, 2) if seconds > 0 else 0.0,
+        "error_rate": round((requests - window.counts["ok"]) / requests, 4) if requests else 0.0,
+        "latency": latency,
+        "queue_p50_ms": queue["p50_ms"],
+        "queue_p95_ms": queue["p95_ms"],
+        "queue_max_ms": queue["max_ms"],
+    }
+
+
+def build_report(recorder: LoadRecorder) -> Dict[str, Any]:
+    timeline = []
+    for index in sorted(recorder.windows):
+        seconds = min(recorder.interval, recorder.elapsed - index * recorder.interval)
+        timeline.append({
+            "t_start": round(index * recorder.interval, 1),
+            "active_users": recorder.windows[index].active_users,
+            **window_summary(recorder.windows[index], seconds),
+        })
+    return {
+        "elapsed_seconds": round(recorder.elapsed, 2),
+        "summary": window_summary(recorder.total, recorder.elapsed),
+        "errors": dict(sorted(recorder.errors.items(), key=lambda item: -item[1])),
+        "timeline": timeline,
+    }
+
+
+def check_slos(summary: Dict[str, Any], args) -> List[str]:
+    """Objetivos incumplidos por la ejecución"""
+    violations = []
+    checks = (
+        ("p95_ms", args.slo_p95_ms, summary["latency"]["p95_ms"], "latencia p95", "ms"),
+        ("p99_ms", args.slo_p99_ms, summary["latency"]["p99_ms"], "latencia p99", "ms"),
+        ("queue_p95_ms", args.slo_queue_p95_ms, summary["queue_p95_ms"], "espera en cola p95", "ms"),
+    )
+    for _, limit, value, label, unit in checks:
+        if limit is not None and value > limit:
+            violations.append(f"{label} {value} {unit} > {limit} {unit}")
+    if args.slo_error_rate is not None and summary["error_rate"] > args.slo_error_rate:
+        violations.append(f"tasa de errores {summary['error_rate']:.2%} > {args.slo_error_rate:.2%}")
+    if args.slo_min_rps is not None and summary["throughput_rps"] < args.slo_min_rps:
+        violations.append(f"throughput {summary['throughput_rps']} resp/s < {args.slo_min_rps} resp/s")
+    return violations
+
+
+def load_questions(path: Optional[str]) -> List[Tuple[str, float]]:
+    """Mezcla de preguntas de un JSONL (`question` y `weight` opcional) o la mezcla por defecto"""
+    if not path:
+        return DEFAULT_QUESTIONS
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                questions.append((record["question"], float(record.get("weight", 1.0))))
+    if not questions:
+        raise ValueError(f"No hay preguntas en {path}")
+    return questions
+
+
+def print_report(report: Dict[str, Any], users: int):
+    summary = report["summary"]
+    latency = summary["latency"]
+    print(f"\n=== Carga: {users} usuarios durante {report['elapsed_seconds']} s ===")
+    print(f"Peticiones:      {summary['requests']} (ok {summary['ok']}, errores {summary['error']}, "
+          f"rechazadas {summary['rejected']}, timeouts {summary['timeout']})")
+    print(f"Throughput:      {summary['throughput_rps']} resp/s")
+    print(f"Tasa de errores: {summary['error_rate']:.2%}")
+    print(f"Latencia:        p50 {latency['p50_ms']} ms  p95 {latency['p95_ms']} ms  "
+          f"p99 {latency['p99_ms']} ms  máx {latency['max_ms']} ms")
+    print(f"Espera en cola:  p50 {summary['queue_p50_ms']} ms  p95 {summary['queue_p95_ms']} ms  "
+          f"máx {summary['queue_max_ms']} ms")
+    if report["errors"]:
+        print("Errores más frecuentes:")
+        for error, count in list(report["errors"].items())[:5]:
+            print(f"  {count:5d}  {error}")
+
+    print(f"\n{'t (s)':>7} {'usuarios':>8} {'resp/s':>7} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'errores':>8} {'cola p95':>9}")
+    for row in report["timeline"]:
+        print(f"{row['t_start']:7.1f} {row['active_users']:8d} {row['throughput_rps']:7.2f} "
+              f"{row['latency']['p50_ms']:9.1f} {row['latency']['p95_ms']:9.1f} "
+              f"{row['requests'] - row['ok']:8d} {row['queue_p95_ms']:9.1f}")
+
+
+def build_direct_target(args) -> Tuple[DirectTarget, Optional[str]]:
+    """RAGSystem offline sobre `--documents` o un corpus sintético; devuelve el directorio temporal"""
+    import logging
+
+    # Los fallos quedan agregados en el informe
+    logging.disable(logging.ERROR)
+    from admission import AdmissionController
+    from config import rag_config
+    from offline_providers import build_offline_rag
+
+    workdir = tempfile.mkdtemp(prefix="rag_load_test_")
+    documents = args.documents
+    if not documents:
+        from bench_ingest import generate_corpus
+
+        documents = os.path.join(workdir, "corpus")
+        generate_corpus(documents, "txt", args.corpus_docs, pages_per_doc=4)
+    rag = build_offline_rag(os.path.join(workdir, "index"), documents, args.embed_latency_ms,
+                            args.llm_latency_ms, args.llm_jitter, args.llm_error_rate)
+    if rag.readiness != "ready":
+        raise RuntimeError("No se pudo preparar el sistema RAG offline")
+    admission = None if args.no_admission else AdmissionController.from_config(rag_config)
+    return DirectTarget(rag, admission), workdir
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga de ask_question con informe de SLO")
+    parser.add_argument("--users", type=int, default=8, help="Usuarios concurrentes")
+    parser.add_argument("--duration", type=float, default=60.0, help="Duración en segundos")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Segundos para arrancar todos los usuarios")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Pausa media entre preguntas (s)")
+    parser.add_argument("--interval", type=float, default=5.0, help="Segundos por intervalo del informe")
+    parser.add_argument("--questions", default=None, help="JSONL con `question` y `weight` opcional")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Archivo JSON con el informe")
+
+    target = parser.add_argument_group("objetivo")
+    target.add_argument("--url", default=None, help="Endpoint HTTP (p. ej. http://127.0.0.1:8000/ask)")
+    target.add_argument("--timeout", type=float, default=60.0, help="Timeout por petición HTTP (s)")
+    target.add_argument("--documents", default=None, help="En proceso: directorio a ingerir (por defecto sintético)")
+    target.add_argument("--corpus-docs", type=int, default=20, help="En proceso: documentos del corpus sintético")
+    target.add_argument("--embed-latency-ms", type=float, default=50.0, help="En proceso: latencia de embeddings")
+    target.add_argument("--llm-latency-ms", type=float, default=800.0, help="En proceso: latencia media del LLM")
+    target.add_argument("--llm-jitter", type=float, default=0.3, help="En proceso: dispersión lognormal del LLM")
+    target.add_argument("--llm-error-rate", type=float, default=0.0, help="En proceso: fracción de fallos del LLM")
+    target.add_argument("--no-admission", action="store_true", help="En proceso: sin control de admisión")
+
+    slo = parser.add_argument_group("SLO (código de salida 1 si se incumplen)")
+    slo.add_argument("--slo-p95-ms", type=float, default=None)
+    slo.add_argument("--slo-p99-ms", type=float, default=None)
+    slo.add_argument("--slo-error-rate", type=float, default=None, help="Fracción máxima de peticiones fallidas")
+    slo.add_argument("--slo-min-rps", type=float, default=None, help="Respuestas correctas por segundo mínimas")
+    slo.add_argument("--slo-queue-p95-ms", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    questions = load_questions(args.questions)
+    workdir = None
+    try:
+        if args.url:
+            target_impl = HttpTarget(args.url, args.timeout)
+        else:
+            print("Preparando RAGSystem offline...")
+            target_impl, workdir = build_direct_target(args)
+        print(f"Objetivo: {args.url or 'RAGSystem en proceso'}; {args.users} usuarios, "
+              f"{args.duration:.0f} s, pausa media {args.think_time} s, {len(questions)} preguntas")
+        recorder = run_load(target_impl, max(1, args.users), args.duration, questions,
+                            args.think_time, args.ramp_up, args.interval, args.seed)
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = build_report(recorder)
+    report["params"] = vars(args)
+    violations = check_slos(report["summary"], args)
+    report["slo_violations"] = violations
+    print_report(report, args.users)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nInforme guardado en {args.output}")
+
+    if violations:
+        print("\nSLO incumplidos:")
+        for violation in violations:
+            print(f"  {violation}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Contabilidad aproximada de memoria por componente
+
+`deep_sizeof` recorre un grafo de objetos sumando `sys.getsizeof` (con un
+tope de objetos visitados, así que en grafos enormes el resultado es una cota
+inferior). `RAGSystem.get_memory_report()` lo combina con lo que cada
+componente sabe de sí mismo (la matriz del backend, las cachés) y con el RSS
+del proceso, que aparece en `get_database_stats` y en el panel de Monitoreo.
+
+Los historiales de chat viven en el `session_state` de cada sesión de
+Streamlit, fuera del alcance de RAGSystem: la app los registra aquí con
+`track_session_history` mediante referencias débiles, de modo que una sesión
+cerrada desaparece del informe (y una que no desaparece delata una fuga).
+"""
+
+import os
+import sys
+import threading
+import types
+import weakref
+from typing import Any, Dict, Iterable, List, Optional
+
+# Objetos que no se recorren: código, tipos y recursos del sistema
+_OPAQUE_TYPES = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+    types.CodeType, types.FrameType, weakref.ReferenceType, type(threading.Lock()), type(threading.RLock()),
+    threading.Thread, threading.Condition, threading.Event,
+)
+_LEAF_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None), memoryview, range)
+
+
+def deep_sizeof(obj: Any, exclude: Iterable[Any] = (), max_objects: int = 200000) -> int:
+    """
+    Bytes aproximados de `obj` y de todo lo que alcanza (contenedores,
+    `__dict__` y `__slots__`). Los objetos de `exclude` y lo que solo se alcanza
+    a través de ellos no se cuentan; los arrays de NumPy cuentan su buffer.
+    """
+    seen = {id(item) for item in exclude}
+    stack = [obj]
+    total = 0
+    visited = 0
+    while stack and visited < max_objects:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _OPAQUE_TYPES):
+            continue
+        seen.add(id(current))
+        visited += 1
+        try:
+            total += sys.getsizeof(current)
+        except TypeError:
+            continue
+        if isinstance(current, _LEAF_TYPES) or type(current).__module__ == "numpy":
+            # getsizeof de un ndarray ya incluye su buffer si es el propietario
+            continue
+        try:
+            if isinstance(current, dict):
+                stack.extend([item for pair in list(current.items()) for item in pair])
+                continue
+            if isinstance(current, (list, tuple, set, frozenset)) or type(current).__name__ == "deque":
+                stack.extend(list(current))
+                continue
+        except RuntimeError:
+            # Otro hilo modificó el contenedor mientras se copiaba: se cuenta solo su cabecera
+            continue
+        attributes = getattr(current, "__dict__", None)
+        if attributes is not None:
+            stack.append(attributes)
+        for slot in getattr(type(current), "__slots__", ()):
+            if isinstance(slot, str) and hasattr(current, slot):
+                stack.append(getattr(current, slot))
+    return total
+
+
+def sampled_sizeof(items: List[Any], sample: int = 200) -> int:
+    """Bytes de una lista grande extrapolando el tamaño medio de una muestra"""
+    if not items:
+        return sys.getsizeof(items)
+    step = max(1, len(items) // sample)
+    picked = items[::step][:sample]
+    return sys.getsizeof(items) + int(sum(deep_sizeof(item) for item in picked) / len(picked) * len(items))
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Memoria residente actual del proceso (None si no se puede medir)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+
+        # Sin /proc (macOS): el pico, en bytes en macOS y en KB en el resto
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+class ChatHistory(list):
+    """Historial de chat de una sesión; admite referencias débiles para contarlo sin retenerlo"""
+
+
+_session_histories: "weakref.WeakValueDictionary[str, ChatHistory]" = weakref.WeakValueDictionary()
+_session_lock = threading.Lock()
+
+
+def track_session_history(session_id: str, history: ChatHistory):
+    """Registra (o actualiza) el historial de una sesión para el informe de memoria"""
+    with _session_lock:
+        _session_histories[session_id] = history
+
+
+def session_history_sizes() -> Dict[str, Dict[str, int]]:
+    """Mensajes y bytes aproximados de cada historial de sesión vivo"""
+    with _session_lock:
+        histories = dict(_session_histories)
+    return {
+        session_id: {"messages": len(history), "bytes": deep_sizeof(list(history))}
+        for session_id, history in histories.items()
+    }
+
+
+def module_cache_sizes() -> Dict[str, int]:
+    """
+    Bytes de las cachés globales del proceso. Solo se miran los módulos ya
+    importados: uno que no se ha cargado no retiene nada.
+    """
+    sizes: Dict[str, int] = {}
+    pdf_cache = sys.modules.get("pdf_cache")
+    if pdf_cache is not None:
+        sizes["pdf_digest_memo"] = deep_sizeof(dict(pdf_cache._digest_memo))
+    metrics = sys.modules.get("metrics")
+    if metrics is not None:
+        if metrics._span_recorder is not None:
+            sizes["span_recorder"] = deep_sizeof(metrics._span_recorder)
+        if metrics._metrics_registry is not None:
+            sizes["metrics_registry"] = deep_sizeof(metrics._metrics_registry)
+    query_log = sys.modules.get("query_log")
+    if query_log is not None and query_log._query_log is not None:
+        sizes["query_log_pending"] = deep_sizeof(list(query_log._query_log._pending))
+    admission = sys.modules.get("admission")
+    if admission is not None and admission._controller is not None:
+        sizes["admission"] = deep_sizeof(admission._controller)
+    return sizes
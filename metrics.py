@@ -0,0 +1,384 @@
+"""
+Métricas de rendimiento en proceso para el sistema RAG
+
+`LatencyHistogram` resume latencias en memoria constante; `SpanRecorder`
+agrupa un histograma por tramo instrumentado (`with span("retrieve"): ...`)
+y alimenta la página de Analytics. `MetricsRegistry` reúne contadores de
+operaciones y los expone, junto con los tramos, en formato de texto de
+Prometheus (ver `metrics_server.py`).
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+
+class LatencyHistogram:
+    """
+    Histograma de latencias con buckets logarítmicos fijos.
+
+    Ocupa memoria constante sin importar cuántas muestras se registren; los
+    percentiles tienen un error relativo acotado por el factor de crecimiento
+    de los buckets (~5% por defecto).
+    """
+
+    def __init__(self, min_value: float = 1e-4, max_value: float = 3600.0, growth: float = 1.05):
+        self.min_value = min_value
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.n_buckets = int(math.log(max_value / min_value) / self._log_growth) + 2
+        self.counts: List[int] = [0] * self.n_buckets
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def _bucket(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        index = int(math.log(value / self.min_value) / self._log_growth) + 1
+        return min(index, self.n_buckets - 1)
+
+    def _bucket_value(self, index: int) -> float:
+        # Punto medio geométrico del bucket
+        if index == 0:
+            return self.min_value
+        return self.min_value * self.growth ** (index - 0.5)
+
+    def record(self, value: float):
+        """Registra una muestra (en segundos)"""
+        with self._lock:
+            self.counts[self._bucket(value)] += 1
+            self.count += 1
+            self.total += value
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> float:
+        """Percentil aproximado (p entre 0 y 100)"""
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            target = max(1, math.ceil(self.count * p / 100.0))
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= target:
+                    return min(max(self._bucket_value(index), self.min), self.max)
+            return self.max
+
+    def cumulative_counts(self, bounds: Sequence[float]) -> Tuple[List[int], int, float]:
+        """
+        Cuentas acumuladas por límite superior (buckets `le` de Prometheus),
+        total de muestras y suma. Un bucket propio cuenta en el primer límite
+        que cubre su extremo superior, así que el error es el de los buckets.
+        """
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.total
+        cumulative, seen, index = [], 0, 0
+        for bound in bounds:
+            while index < len(counts) and self.min_value * self.growth ** index <= bound * (1 + 1e-9):
+                seen += counts[index]
+                index += 1
+            cumulative.append(seen)
+        return cumulative, count, total
+
+    def summary(self) -> Dict[str, Any]:
+        """Resumen en milisegundos: count, media, p50, p95, p99 y máximo"""
+        count = self.count
+        return {
+            "count": count,
+            "mean_ms": round(1000 * self.total / count, 2) if count else 0.0,
+            "p50_ms": round(1000 * self.percentile(50), 2),
+            "p95_ms": round(1000 * self.percentile(95), 2),
+            "p99_ms": round(1000 * self.percentile(99), 2),
+            "max_ms": round(1000 * self.max, 2),
+        }
+
+
+class _Span:
+    """Tramo medido: registra su duración (y si terminó con excepción) al salir"""
+
+    __slots__ = ("_recorder", "_name", "_start")
+
+    def __init__(self, recorder: "SpanRecorder", name: str):
+        self._recorder = recorder
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._recorder.record(self._name, time.perf_counter() - self._start, error=exc_type is not None)
+        return False
+
+
+class _NoopSpan:
+    """Tramo vacío que se devuelve con las métricas desactivadas"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class SpanRecorder:
+    """
+    Histogramas de latencia por tramo del camino crítico (carga, split,
+    embedding, inserción, recuperación, prompt, generación) con contadores de
+    errores. Desactivado, `span()` devuelve un objeto compartido sin estado y
+    el coste se reduce a una comprobación de atributo.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str):
+        """Context manager que mide el bloque como tramo `name`"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name)
+
+    def record(self, name: str, seconds: float, error: bool = False):
+        """Registra una duración (en segundos) medida por otros medios"""
+        if not self.enabled:
+            return
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, LatencyHistogram())
+        histogram.record(seconds)
+        if error:
+            with self._lock:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Resumen por tramo: count, errores, tasa de error y latencias (ms)"""
+        with self._lock:
+            histograms = dict(self._histograms)
+            errors = dict(self._errors)
+        result = {}
+        for name, histogram in sorted(histograms.items()):
+            stats = histogram.summary()
+            stats["errors"] = errors.get(name, 0)
+            stats["error_rate"] = round(stats["errors"] / stats["count"], 4) if stats["count"] else 0.0
+            result[name] = stats
+        return result
+
+    def histograms(self) -> Tuple[Dict[str, LatencyHistogram], Dict[str, int]]:
+        """Copia de los histogramas y errores por tramo (para exportarlos)"""
+        with self._lock:
+            return dict(self._histograms), dict(self._errors)
+
+    def reset(self):
+        """Descarta todas las muestras"""
+        with self._lock:
+            self._histograms = {}
+            self._errors = {}
+
+
+_span_recorder: Optional[SpanRecorder] = None
+_span_recorder_lock = threading.Lock()
+
+
+def get_span_recorder() -> SpanRecorder:
+    """Registro de tramos compartido por el proceso (lo usan RAGSystem y la página de Analytics)"""
+    global _span_recorder
+    if _span_recorder is None:
+        with _span_recorder_lock:
+            if _span_recorder is None:
+                from config import rag_config
+
+                _span_recorder = SpanRecorder(enabled=rag_config.span_metrics_enabled)
+    return _span_recorder
+
+
+def span(name: str):
+    """Mide un bloque en el registro de tramos del proceso: `with span("embed"): ...`"""
+    recorder = _span_recorder or get_span_recorder()
+    return recorder.span(name)
+
+
+# --- Registro de métricas con exportación Prometheus ------------------------------
+
+# Límites (segundos) de los histogramas exportados
+EXPORT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Familia exportada: (nombre, tipo, ayuda, muestras); cada muestra es
+# (sufijo, etiquetas, valor), p. ej. ("_bucket", {"le": "0.5"}, 3)
+MetricFamily = Tuple[str, str, str, List[Tuple[str, Dict[str, str], float]]]
+
+
+class ShardedCounter:
+    """
+    Contador monótono con una celda por hilo: incrementar no toma ningún lock
+    (cada celda tiene un único escritor) y leer suma todas las celdas. Las
+    celdas de hilos terminados se pliegan en un acumulado al crear celdas
+    nuevas, así que la memoria no crece con servidores de un hilo por petición.
+    """
+
+    _FOLD_THRESHOLD = 32
+
+    def __init__(self):
+        self._local = threading.local()
+        self._cells: List[Tuple[threading.Thread, List[float]]] = []
+        self._retired = 0.0
+        self._lock = threading.Lock()
+
+    def _new_cell(self) -> List[float]:
+        cell = [0.0]
+        self._local.cell = cell
+        with self._lock:
+            if len(self._cells) >= self._FOLD_THRESHOLD:
+                alive = []
+                for owner, other in self._cells:
+                    if owner.is_alive():
+                        alive.append((owner, other))
+                    else:
+                        self._retired += other[0]
+                self._cells = alive
+            self._cells.append((threading.current_thread(), cell))
+        return cell
+
+    def inc(self, amount: float = 1):
+        cell = getattr(self._local, "cell", None) or self._new_cell()
+        cell[0] += amount
+
+    def value(self) -> float:
+        with self._lock:
+            return self._retired + sum(cell[0] for _, cell in self._cells)
+
+
+class CounterFamily:
+    """Contadores con el mismo nombre, uno por combinación de etiquetas"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], ShardedCounter] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = ShardedCounter()
+
+    def labels(self, *values: str) -> ShardedCounter:
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, ShardedCounter())
+        return child
+
+    def inc(self, amount: float = 1):
+        """Incrementa el contador sin etiquetas"""
+        self._children[()].inc(amount)
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            children = list(self._children.items())
+        samples = [("", dict(zip(self.labelnames, values)), child.value()) for values, child in children]
+        return self.name, "counter", self.help, samples
+
+
+def _span_families(recorder: SpanRecorder) -> List[MetricFamily]:
+    """Histogramas por tramo del SpanRecorder en formato Prometheus"""
+    histograms, errors = recorder.histograms()
+    samples, error_samples = [], []
+    for stage, histogram in sorted(histograms.items()):
+        cumulative, count, total = histogram.cumulative_counts(EXPORT_BUCKETS)
+        for bound, seen in zip(EXPORT_BUCKETS, cumulative):
+            samples.append(("_bucket", {"stage": stage, "le": repr(bound)}, seen))
+        samples.append(("_bucket", {"stage": stage, "le": "+Inf"}, count))
+        samples.append(("_sum", {"stage": stage}, total))
+        samples.append(("_count", {"stage": stage}, count))
+        error_samples.append(("", {"stage": stage}, errors.get(stage, 0)))
+    return [
+        ("rag_stage_duration_seconds", "histogram", "Duración por tramo del camino crítico", samples),
+        ("rag_stage_errors_total", "counter", "Tramos terminados con excepción", error_samples),
+    ]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Contadores de operaciones del proceso más recolectores que se evalúan al
+    exportar (profundidad de colas, tramos). `render()` produce el formato de
+    texto 0.0.4 de Prometheus.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, CounterFamily] = {}
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> CounterFamily:
+        """Obtiene (o crea) la familia de contadores `name`"""
+        with self._lock:
+            family = self._counters.get(name)
+            if family is None:
+                family = self._counters[name] = CounterFamily(name, help_text, labelnames)
+            return family
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        """Añade una función que devuelve familias calculadas en cada exportación"""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def collect(self) -> List[MetricFamily]:
+        with self._lock:
+            counters = list(self._counters.values())
+            collectors = list(self._collectors)
+        families = [family.collect() for family in counters]
+        families.extend(_span_families(get_span_recorder()))
+        for collector in collectors:
+            families.extend(collector())
+        return families
+
+    def render(self) -> str:
+        lines = []
+        for name, kind, help_text, samples in self.collect():
+            lines.append(f"# HELP {name} {_escape(help_text)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                             else f"{name}{suffix} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics_registry: Optional[MetricsRegistry] = None
+_metrics_registry_lock = threading.Lock()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Registro de métricas compartido por el proceso"""
+    global _metrics_registry
+    if _metrics_registry is None:
+        with _metrics_registry_lock:
+            if _metrics_registry is None:
+                _metrics_registry = MetricsRegistry()
+    return _metrics_registry
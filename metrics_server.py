@@ -0,0 +1,91 @@
+"""
+Listener HTTP local que expone `/metrics` en formato de texto de Prometheus
+
+Lo arrancan la app de Streamlit y `api_server.py` cuando `RAG_METRICS_PORT`
+(o `--metrics-port`) es distinto de 0. Sirve el registro del proceso
+(`metrics.get_metrics_registry()`): contadores de preguntas, errores, cachés,
+embeddings e ingesta, histogramas por tramo y el estado del control de
+admisión, que se lee en cada exportación.
+"""
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+from metrics import MetricFamily, get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def _admission_families() -> List[MetricFamily]:
+    """Colas, ejecuciones activas y rechazos del control de admisión"""
+    from admission import REQUEST_KINDS, get_admission_controller
+
+    metrics = get_admission_controller().get_metrics()
+    depth, active, admitted, rejected = [], [], [], []
+    for kind in REQUEST_KINDS:
+        stats = metrics[kind]
+        depth.append(("", {"kind": kind}, stats["queue_depth"]))
+        active.append(("", {"kind": kind}, stats["active"]))
+        admitted.append(("", {"kind": kind}, stats["admitted"]))
+        for reason in ("rate_limited", "queue_full"):
+            rejected.append(("", {"kind": kind, "reason": reason}, stats[f"rejected_{reason}"]))
+        rejected.append(("", {"kind": kind, "reason": "timeout"}, stats["timed_out"]))
+    return [
+        ("rag_queue_depth", "gauge", "Solicitudes esperando un slot de ejecución", depth),
+        ("rag_active_requests", "gauge", "Solicitudes en ejecución", active),
+        ("rag_admitted_total", "counter", "Solicitudes admitidas por el control de admisión", admitted),
+        ("rag_rejected_total", "counter", "Solicitudes rechazadas por el control de admisión", rejected),
+    ]
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    server_version = "RAGMetrics/1.0"
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            payload = get_metrics_registry().render().encode("utf-8")
+        except Exception as e:
+            logger.error(f"Error generando métricas: {str(e)}")
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.client_address[0]} {format % args}")
+
+
+def start_metrics_server(host: str = "127.0.0.1", port: int = 9464) -> Optional[ThreadingHTTPServer]:
+    """
+    Arranca el listener en un hilo de fondo (una vez por proceso)
+    Returns:
+        El servidor, o None si el puerto no está disponible
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        except OSError as e:
+            logger.warning(f"No se pudo abrir el listener de métricas en {host}:{port}: {str(e)}")
+            return None
+        server.daemon_threads = True
+        get_metrics_registry().register_collector(_admission_families)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        _server = server
+        logger.info(f"Métricas Prometheus en http://{host}:{server.server_address[1]}/metrics")
+        return server
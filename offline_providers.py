@@ -0,0 +1,116 @@
+"""
+Proveedores offline para benchmarks y pruebas de carga
+
+Sustitutos de los servicios de Google que no usan red ni cuota. Se inyectan
+en RAGSystem con `RAGSystem(embedding_factory=..., llm_factory=...)`. La
+latencia del proveedor real se puede simular (por llamada y por texto en los
+embeddings, con colas lognormales y fallos en el LLM) para que las mediciones
+de concurrencia, batching y carga sean representativas.
+"""
+
+import os
+import random
+import re
+import time
+import zlib
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import BaseMessage
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Embeddings por hashing de palabras (feature hashing) normalizados.
+    Textos que comparten palabras quedan cerca, así que la recuperación se
+    comporta de forma plausible sin un modelo real.
+    """
+
+    def __init__(self, dim: int = 768, call_latency_ms: float = 0.0, per_text_latency_ms: float = 0.0):
+        self.dim = dim
+        self.call_latency_ms = call_latency_ms
+        self.per_text_latency_ms = per_text_latency_ms
+
+    def _simulate_latency(self, n_texts: int):
+        delay = (self.call_latency_ms + self.per_text_latency_ms * n_texts) / 1000
+        if delay > 0:
+            time.sleep(delay)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _TOKEN_RE.findall(text.lower()):
+            digest = zlib.crc32(token.encode("utf-8"))
+            # El bit alto decide el signo para que las colisiones se compensen
+            vector[digest % self.dim] += -1.0 if digest & 0x80000000 else 1.0
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._simulate_latency(len(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._simulate_latency(1)
+        return self._embed(text)
+
+
+class SimulatedChatModel(SimpleChatModel):
+    """
+    Modelo de chat que tarda lo que tardaría el real y responde con frases del contexto.
+    La latencia es `latency_ms` multiplicada por un factor lognormal de desviación
+    `jitter` (colas largas como las de una API), y `error_rate` es la fracción de
+    llamadas que fallan como lo haría un proveedor saturado.
+    """
+
+    latency_ms: float = 800.0
+    jitter: float = 0.3
+    error_rate: float = 0.0
+    answer_words: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "simulated-chat-model"
+
+    def _call(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+              run_manager: Any = None, **kwargs: Any) -> str:
+        delay = self.latency_ms / 1000 * (random.lognormvariate(0.0, self.jitter) if self.jitter > 0 else 1.0)
+        time.sleep(delay)
+        if self.error_rate > 0 and random.random() < self.error_rate:
+            raise RuntimeError("Error simulado del proveedor (503 Service Unavailable)")
+
+        prompt = "\n".join(str(message.content) for message in messages)
+        # El contexto va entre la cabecera y la pregunta en el prompt de setup_qa_chain
+        context = prompt.split("Contexto de los documentos:", 1)[-1].split("Pregunta del usuario:", 1)[0]
+        words = context.split()[:self.answer_words]
+        return "Según los documentos: " + (" ".join(words) if words else "no tengo esa información.")
+
+
+def build_offline_rag(persist_directory: str, documents: Optional[str] = None, embed_latency_ms: float = 0.0,
+                      llm_latency_ms: float = 800.0, llm_jitter: float = 0.3, llm_error_rate: float = 0.0,
+                      dim: int = 768):
+    """
+    Crea un RAGSystem con proveedores offline listo para responder.
+    Si el índice de `persist_directory` está vacío y se indica `documents`, ingiere
+    ese directorio con los mismos embeddings offline.
+    """
+    from ingest import Checkpoint, run_ingestion
+    from rag_system import RAGSystem
+
+    rag = RAGSystem(
+        persist_directory=persist_directory,
+        embedding_factory=lambda model: HashEmbeddings(dim=dim, call_latency_ms=embed_latency_ms),
+        llm_factory=lambda config: SimulatedChatModel(
+            latency_ms=llm_latency_ms, jitter=llm_jitter, error_rate=llm_error_rate
+        )
+    )
+    rag.load_existing_vectorstore()
+    if documents and (rag.vectorstore is None or rag.vectorstore.backend.count() == 0):
+        run_ingestion(rag, documents, Checkpoint(os.path.join(persist_directory, "ingest_checkpoint.jsonl")))
+    rag.warm_up()
+    return rag
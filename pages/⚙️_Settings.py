@@ -1,8 +1,10 @@
 import streamlit as st
 import json
 import os
-from config import RAGConfig, AppConfig, get_environment_config, validate_environment
-from rag_system import RAGSystem
+from config import RAGConfig, AppConfig, get_environment_config, validate_environment, rag_config
+from admission import get_admission_controller
+from profiling import profiling_enabled, set_profiling_enabled
+from utils import clean_temp_files, format_file_size, format_timestamp
 
 st.set_page_config(
     page_title="Configuración - Sistema RAG",
@@ -71,9 +73,11 @@ with tab1:
         # Tipo de búsqueda
         search_type = st.selectbox(
             "Tipo de Búsqueda",
-            ["similarity", "mmr"],
-            index=0,
-            help="Algoritmo de búsqueda de similitud"
+            AppConfig.SEARCH_TYPES,
+            index=AppConfig.SEARCH_TYPES.index(st.session_state.rag_config.search_type)
+            if st.session_state.rag_config.search_type in AppConfig.SEARCH_TYPES else 0,
+            help="Algoritmo de búsqueda de similitud; 'similarity_score_threshold' descarta "
+                 "los documentos por debajo del umbral de puntuación"
         )
         
         # Umbral de puntuación
@@ -140,8 +144,11 @@ with tab1:
             
             st.success("✅ Configuración guardada exitosamente")
             
-            # Actualizar sistema RAG si existe
-            if 'rag_system' in st.session_state and st.session_state.rag_system:
+            # El sistema RAG es compartido por todas las sesiones: solo se toca en modo administrador
+            if not rag_config.admin_mode:
+                st.info("ℹ️ Guardada para esta sesión. Aplicarla al sistema RAG, que comparten todas "
+                        "las sesiones, requiere el modo administrador (RAG_ADMIN_MODE=true)")
+            elif 'rag_system' in st.session_state and st.session_state.rag_system:
                 rag = st.session_state.rag_system
                 
                 # Actualizar configuraciones
@@ -164,6 +171,52 @@ with tab1:
                 
         except Exception as e:
             st.error(f"❌ Error guardando configuración: {str(e)}")
+    
+    # Reindexado blue/green: chunking y embeddings solo afectan a datos nuevos
+    st.divider()
+    st.subheader("🔁 Reindexado")
+    rag = st.session_state.get('rag_system')
+    if rag and not rag_config.admin_mode:
+        st.info("ℹ️ Reindexar y volver atrás afectan a todas las sesiones: requieren el modo "
+                "administrador (RAG_ADMIN_MODE=true)")
+    elif rag:
+        current = rag.index_state["config"]
+        st.info(
+            f"**Colección activa:** {rag.collection_name} (generación {rag.index_state['generation']}) · "
+            f"chunk {current['chunk_size']}/{current['chunk_overlap']} · {current['embedding_model']}"
+        )
+        
+        status = rag.rebuild_status
+        if status["state"] in ("building", "validating"):
+            st.warning(f"⏳ Reindexado en curso ({status['state']}, {status.get('progress', '0/?')})")
+        elif status["state"] == "failed":
+            st.error(f"❌ Último reindexado fallido: {status.get('error')}")
+        elif status["state"] == "done":
+            st.success(f"✅ Reindexado completado: {status.get('chunks')} chunks")
+        
+        pending_changes = (
+            chunk_size != current["chunk_size"]
+            or chunk_overlap != current["chunk_overlap"]
+            or embedding_model != current["embedding_model"]
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("🔁 Reindexar con esta configuración", disabled=not pending_changes,
+                         help="Construye una nueva colección en segundo plano; la actual sigue respondiendo"):
+                if rag.rebuild_index(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                     embedding_model=embedding_model):
+                    st.success("✅ Reindexado iniciado")
+                else:
+                    st.error("❌ No se pudo iniciar el reindexado")
+        with col2:
+            if st.button("↩️ Volver a la generación anterior",
+                         disabled=not rag.index_state.get("previous")):
+                if rag.rollback_index():
+                    st.success("✅ Generación anterior activada")
+                else:
+                    st.error("❌ No se pudo volver a la generación anterior")
+    else:
+        st.info("ℹ️ Inicia el sistema RAG en la página principal para reindexar")
 
 # Tab 2: Configuración de Interfaz
 with tab2:
@@ -273,13 +326,16 @@ with tab3:
         if st.button("🗑️ Limpiar Archivos Temporales Ahora"):
             try:
                 temp_dir = st.session_state.rag_config.temp_directory
-                if os.path.exists(temp_dir):
-                    import shutil
-                    shutil.rmtree(temp_dir)
-                    os.makedirs(temp_dir, exist_ok=True)
-                    st.success("✅ Limpieza de archivos temporales completada")
-                else:
+                rag = st.session_state.get('rag_system')
+                if not os.path.exists(temp_dir):
                     st.info("ℹ️ No hay archivos temporales para limpiar")
+                elif not rag:
+                    # Sin el sistema RAG no se sabe qué documentos siguen indexados
+                    st.warning("⚠️ Inicia el sistema RAG en la página principal antes de limpiar")
+                else:
+                    # Los documentos indexados se conservan: el reindexado los necesita
+                    clean_temp_files(temp_dir, max_age_hours=0, keep_paths=rag.indexed_file_paths())
+                    st.success("✅ Limpieza de archivos temporales completada")
             except Exception as e:
                 st.error(f"❌ Error en limpieza: {str(e)}")
 
@@ -304,9 +360,13 @@ with tab4:
         # Debug mode
         debug_mode = st.checkbox(
             "Modo Debug",
-            value=False,
-            help="Mostrar información detallada de debug"
+            value=profiling_enabled(),
+            help="Mostrar información detallada de debug y perfilar cada pregunta e ingesta "
+                 "(cProfile + tracemalloc); los perfiles se consultan en debug_rag.py"
         )
+        set_profiling_enabled(debug_mode)
+        if debug_mode:
+            st.caption(f"🔬 Perfilado activo: perfiles en `{rag_config.profile_directory}`")
         
         # Logging level
         log_level = st.selectbox(
@@ -331,7 +391,77 @@ with tab4:
                     st.warning("Sistema RAG no inicializado")
             except Exception as e:
                 st.error(f"❌ Error obteniendo estadísticas: {str(e)}")
-    
+        
+        # Contenido real del índice, leído del catálogo
+        if st.button("📦 Mostrar Estadísticas del Índice"):
+            try:
+                if 'rag_system' in st.session_state and st.session_state.rag_system:
+                    index_stats = st.session_state.rag_system.get_index_stats()
+                    if index_stats:
+                        c_col, d_col = st.columns(2)
+                        with c_col:
+                            st.metric("Chunks", index_stats["chunks"])
+                            st.metric("Archivos", index_stats["files"])
+                            st.metric("Generación", index_stats["index_generation"])
+                        with d_col:
+                            st.metric("Vectores", format_file_size(index_stats["vector_bytes"]))
+                            st.metric("En disco", format_file_size(index_stats["disk_bytes"]))
+                            st.metric("Última ingesta", format_timestamp(index_stats["last_ingest"])
+                                      if index_stats["last_ingest"] else "—")
+                        if index_stats["chunks_per_file"]:
+                            st.caption("Chunks por archivo (los 10 mayores)")
+                            # Archivos distintos con el mismo nombre se numeran para no sumarse
+                            chart, seen = {}, {}
+                            for entry in index_stats["chunks_per_file"].values():
+                                name = entry["name"]
+                                seen[name] = seen.get(name, 0) + 1
+                                chart[name if seen[name] == 1 else f"{name} ({seen[name]})"] = entry["chunks"]
+                            st.bar_chart(chart)
+                    else:
+                        st.info("ℹ️ No hay base de datos cargada")
+                else:
+                    st.warning("Sistema RAG no inicializado")
+            except Exception as e:
+                st.error(f"❌ Error obteniendo estadísticas del índice: {str(e)}")
+        
+        # Colas de admisión y tiempos de espera
+        if st.button("🚦 Mostrar Colas de Admisión"):
+            metrics = get_admission_controller().get_metrics()
+            q_col, i_col = st.columns(2)
+            with q_col:
+                st.metric("Consultas en cola", metrics["query"]["queue_depth"])
+                st.metric("Espera p95 consultas", f"{metrics['query']['wait_p95_ms']} ms")
+            with i_col:
+                st.metric("Ingestas en cola", metrics["ingest"]["queue_depth"])
+                st.metric("Espera p95 ingestas", f"{metrics['ingest']['wait_p95_ms']} ms")
+            st.json(metrics)
+
+        # Bytes retenidos por componente frente a la memoria residente
+        if st.button("🧠 Mostrar Uso de Memoria"):
+            try:
+                if 'rag_system' in st.session_state and st.session_state.rag_system:
+                    memory = st.session_state.rag_system.get_memory_report()
+                    r_col, t_col = st.columns(2)
+                    with r_col:
+                        st.metric("Memoria residente",
+                                  format_file_size(memory["rss_bytes"]) if memory["rss_bytes"] is not None else "—")
+                        st.metric("Umbral de aviso", format_file_size(memory["warning_bytes"]))
+                    with t_col:
+                        st.metric("Contabilizada por componentes", format_file_size(memory["tracked_bytes"]))
+                        st.metric("Sesiones activas", len(memory["sessions"]))
+                    if memory["warning"]:
+                        st.warning("⚠️ La memoria residente supera el umbral (RAG_MEMORY_WARNING_MB)")
+                    st.table({
+                        "Componente": list(memory["components"]),
+                        "Tamaño": [format_file_size(size) for size in memory["components"].values()]
+                    })
+                    st.caption("Estimaciones aproximadas; la diferencia con la memoria residente "
+                               "corresponde al intérprete, las librerías y los clientes de los modelos.")
+                else:
+                    st.warning("Sistema RAG no inicializado")
+            except Exception as e:
+                st.error(f"❌ Error obteniendo el uso de memoria: {str(e)}")
+
     st.divider()
     
     # Configuración de respaldo
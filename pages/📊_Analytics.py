@@ -1,11 +1,6 @@
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
-# from utils import get_chat_statistics, format_timestamp
-from rag_system import RAGSystem
 
 st.set_page_config(
     page_title="Analytics - Sistema RAG",
@@ -15,47 +10,38 @@ st.set_page_config(
 
 st.title("📊 Análisis y Estadísticas")
 
-# Verificar si hay datos
-if 'chat_history' not in st.session_state or not st.session_state.chat_history:
+# Historial persistente de todas las sesiones (query_log.py)
+from query_log import get_query_log
+
+query_log = get_query_log()
+if query_log is None:
+    st.warning("El registro de consultas está desactivado (RAG_QUERY_LOG=false).")
+    st.stop()
+
+# Las consultas de este proceso que aún esperan al volcado periódico
+query_log.flush()
+totals = query_log.totals()
+if not totals["queries"]:
     st.warning("No hay datos de conversaciones para analizar. Primero usa el sistema de chat.")
     st.stop()
 
-# Función para obtener estadísticas
-def get_chat_statistics(chat_history):
-    if not chat_history:
-        return {}
-    
-    total_conversations = len(chat_history)
-    total_response_length = sum(len(chat['answer']) for chat in chat_history)
-    avg_response_length = int(total_response_length / total_conversations) if total_conversations > 0 else 0
-    
-    # Calcular hora más común
-    hours = []
-    for chat in chat_history:
-        if 'timestamp' in chat:
-            try:
-                dt = datetime.fromisoformat(chat['timestamp'].replace('Z', '+00:00'))
-                hours.append(dt.hour)
-            except:
-                hours.append(datetime.now().hour)
-    
-    most_common_hour = max(set(hours), key=hours.count) if hours else 0
-    
-    # Contar fuentes únicas
-    all_sources = set()
-    for chat in chat_history:
-        if 'sources' in chat:
-            all_sources.update(chat['sources'])
-    
-    return {
-        'total_conversations': total_conversations,
-        'avg_response_length': avg_response_length,
-        'most_common_hour': f'{most_common_hour:02d}:00',
-        'total_sources_used': len(all_sources)
-    }
+# pandas y plotly solo se importan cuando hay datos que graficar
+import pandas as pd
+import plotly.express as px
 
-# Obtener estadísticas
-stats = get_chat_statistics(st.session_state.chat_history)
+# Estadísticas a partir de los agregados (filas acotadas sin importar la historia)
+hour_rows = query_log.hour_of_day()
+busiest_hour = max(hour_rows, key=lambda row: row["queries"])["bucket"] if hour_rows else "00"
+stats = {
+    'total_conversations': totals["queries"],
+    'avg_response_length': totals["avg_answer_chars"],
+    'most_common_hour': f'{busiest_hour}:00',
+    'total_sources_used': query_log.source_count(),
+    'avg_latency_ms': totals["avg_latency_ms"],
+    'error_rate': totals["error_rate"],
+    'prompt_tokens': totals["prompt_tokens"],
+    'answer_tokens': totals["answer_tokens"],
+}
 
 # Métricas principales
 col1, col2, col3, col4 = st.columns(4)
@@ -63,7 +49,8 @@ col1, col2, col3, col4 = st.columns(4)
 with col1:
     st.metric(
         label="Total Conversaciones",
-        value=stats["total_conversations"]
+        value=stats["total_conversations"],
+        help=f"{totals['errors']} con error"
     )
 
 with col2:
@@ -92,59 +79,55 @@ col1, col2 = st.columns(2)
 with col1:
     st.subheader("📅 Actividad por Día")
     
-    # Preparar datos temporales
-    if st.session_state.chat_history:
-        dates = []
-        for chat in st.session_state.chat_history:
-            if 'timestamp' in chat:
-                try:
-                    dt = datetime.fromisoformat(chat['timestamp'].replace('Z', '+00:00'))
-                    dates.append(dt.date())
-                except:
-                    dates.append(datetime.now().date())
-            else:
-                dates.append(datetime.now().date())
-        
-        # Contar conversaciones por día
-        date_counts = pd.Series(dates).value_counts().sort_index()
-        
-        if not date_counts.empty:
-            fig = px.line(
-                x=date_counts.index,
-                y=date_counts.values,
-                title="Conversaciones por Día",
-                labels={'x': 'Fecha', 'y': 'Número de Conversaciones'}
-            )
-            fig.update_traces(mode='lines+markers')
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("No hay datos temporales suficientes")
+    daily = pd.DataFrame(query_log.rollups("day", limit=90))
+    fig = px.line(
+        daily,
+        x="bucket",
+        y="queries",
+        title="Conversaciones por Día (últimos 90 días)",
+        labels={'bucket': 'Fecha', 'queries': 'Número de Conversaciones'}
+    )
+    fig.update_traces(mode='lines+markers')
+    st.plotly_chart(fig, use_container_width=True)
 
 with col2:
     st.subheader("🕐 Distribución por Hora")
     
-    # Análisis por horas
-    hours = []
-    for chat in st.session_state.chat_history:
-        if 'timestamp' in chat:
-            try:
-                dt = datetime.fromisoformat(chat['timestamp'].replace('Z', '+00:00'))
-                hours.append(dt.hour)
-            except:
-                hours.append(datetime.now().hour)
-        else:
-            hours.append(datetime.now().hour)
+    fig = px.bar(
+        pd.DataFrame(hour_rows),
+        x="bucket",
+        y="queries",
+        title="Actividad por Hora del Día",
+        labels={'bucket': 'Hora', 'queries': 'Número de Conversaciones'}
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+col1, col2 = st.columns(2)
+
+with col1:
+    st.subheader("⏱️ Latencia por Hora")
+    
+    hourly = pd.DataFrame(query_log.rollups("hour", limit=48))
+    fig = px.line(
+        hourly,
+        x="bucket",
+        y=["avg_latency_ms", "latency_ms_max"],
+        title="Latencia Media y Máxima (últimas 48 horas con actividad)",
+        labels={'bucket': 'Hora', 'value': 'Latencia (ms)', 'variable': 'Serie'}
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+with col2:
+    st.subheader("🔢 Tokens por Día")
     
-    if hours:
-        hour_counts = pd.Series(hours).value_counts().sort_index()
-        
-        fig = px.bar(
-            x=hour_counts.index,
-            y=hour_counts.values,
-            title="Actividad por Hora del Día",
-            labels={'x': 'Hora', 'y': 'Número de Conversaciones'}
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    fig = px.bar(
+        daily,
+        x="bucket",
+        y=["prompt_tokens", "answer_tokens"],
+        title="Tokens Estimados por Día (prompt / respuesta)",
+        labels={'bucket': 'Fecha', 'value': 'Tokens', 'variable': 'Tipo'}
+    )
+    st.plotly_chart(fig, use_container_width=True)
 
 st.divider()
 
@@ -154,36 +137,27 @@ col1, col2 = st.columns(2)
 with col1:
     st.subheader("📝 Longitud de Respuestas")
     
-    response_lengths = [len(chat['answer']) for chat in st.session_state.chat_history]
-    
-    fig = px.histogram(
-        x=response_lengths,
-        nbins=20,
+    fig = px.bar(
+        pd.DataFrame(query_log.answer_lengths()),
+        x="chars",
+        y="queries",
         title="Distribución de Longitud de Respuestas",
-        labels={'x': 'Longitud (caracteres)', 'y': 'Frecuencia'}
+        labels={'chars': 'Longitud (caracteres)', 'queries': 'Frecuencia'}
     )
     st.plotly_chart(fig, use_container_width=True)
 
 with col2:
     st.subheader("🔍 Fuentes Más Utilizadas")
     
-    # Contar fuentes
-    source_counts = {}
-    for chat in st.session_state.chat_history:
-        if 'sources' in chat:
-            for source in chat['sources']:
-                source_counts[source] = source_counts.get(source, 0) + 1
-    
-    if source_counts:
-        # Tomar top 10
-        top_sources = dict(sorted(source_counts.items(), key=lambda x: x[1], reverse=True)[:10])
-        
+    top_sources = query_log.top_sources(limit=10)
+    if top_sources:
         fig = px.bar(
-            x=list(top_sources.values()),
-            y=list(top_sources.keys()),
+            pd.DataFrame(top_sources),
+            x="uses",
+            y="source",
             orientation='h',
             title="Top 10 Fuentes Más Utilizadas",
-            labels={'x': 'Número de Usos', 'y': 'Fuente'}
+            labels={'uses': 'Número de Usos', 'source': 'Fuente'}
         )
         st.plotly_chart(fig, use_container_width=True)
     else:
@@ -194,50 +168,96 @@ st.divider()
 # Análisis de rendimiento
 st.subheader("⚡ Análisis de Rendimiento del Sistema")
 
-# Simular datos de rendimiento (en una implementación real, estos datos vendrían del sistema)
+# Tramos medidos por RAGSystem en este proceso (metrics.SpanRecorder)
+from metrics import get_span_recorder
+
+SPAN_LABELS = {
+    "load": "Carga",
+    "split": "División",
+    "embed": "Embeddings (ingesta)",
+    "upsert": "Inserción",
+    "embed_query": "Embedding pregunta",
+    "retrieve": "Recuperación",
+    "prompt": "Montaje del prompt",
+    "generate": "Generación",
+    "question": "Respuesta completa",
+}
+
+span_stats = get_span_recorder().summary()
+question_stats = span_stats.get("question", {})
+avg_response_time = round(question_stats.get("mean_ms", 0.0) / 1000, 2)
+p95_response_time = round(question_stats.get("p95_ms", 0.0) / 1000, 2)
+error_rate = round(100 * question_stats.get("error_rate", 0.0), 1)
+
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    # Tiempo de respuesta promedio (simulado)
-    avg_response_time = 2.3  # segundos
     st.metric(
         label="Tiempo Promedio de Respuesta",
         value=f"{avg_response_time}s",
-        delta="-0.2s",
-        delta_color="inverse"
+        help=f"{question_stats.get('count', 0)} preguntas medidas"
     )
 
 with col2:
-    # Precisión estimada
-    accuracy = 92.5  # porcentaje
     st.metric(
-        label="Precisión Estimada",
-        value=f"{accuracy}%",
-        delta="2.1%"
+        label="Tiempo de Respuesta p95",
+        value=f"{p95_response_time}s"
     )
 
 with col3:
-    # Satisfacción del usuario (simulada)
-    satisfaction = 4.7  # de 5
     st.metric(
-        label="Satisfacción (1-5)",
-        value=f"{satisfaction}/5",
-        delta="0.3"
+        label="Tasa de Error",
+        value=f"{error_rate}%"
     )
 
+if span_stats:
+    span_order = {name: index for index, name in enumerate(SPAN_LABELS)}
+    span_rows = [
+        {
+            'Tramo': SPAN_LABELS.get(name, name),
+            'Llamadas': stats['count'],
+            'Errores': stats['errors'],
+            'Media (ms)': stats['mean_ms'],
+            'p50 (ms)': stats['p50_ms'],
+            'p95 (ms)': stats['p95_ms'],
+            'p99 (ms)': stats['p99_ms'],
+            'Máx (ms)': stats['max_ms']
+        }
+        for name, stats in sorted(span_stats.items(), key=lambda item: span_order.get(item[0], len(span_order)))
+    ]
+    span_df = pd.DataFrame(span_rows)
+    
+    fig = px.bar(
+        span_df.melt(id_vars='Tramo', value_vars=['p50 (ms)', 'p95 (ms)', 'p99 (ms)'],
+                     var_name='Percentil', value_name='Latencia (ms)'),
+        x='Tramo',
+        y='Latencia (ms)',
+        color='Percentil',
+        barmode='group',
+        log_y=True,
+        title="Latencia por Tramo (p50 / p95 / p99)"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(span_df, use_container_width=True, hide_index=True)
+else:
+    st.info("Aún no hay mediciones de rendimiento en este proceso "
+            "(se desactivan con RAG_SPAN_METRICS=false).")
+
 # Historial detallado
 st.divider()
 st.subheader("📋 Historial Detallado")
 
-# Crear DataFrame del historial
+# Últimas consultas del registro (todas las sesiones)
 chat_data = []
-for i, chat in enumerate(st.session_state.chat_history):
+for chat in query_log.recent(limit=200):
     chat_data.append({
-        'ID': i + 1,
+        'ID': chat['id'],
         'Pregunta': chat['question'][:100] + "..." if len(chat['question']) > 100 else chat['question'],
-        'Longitud Respuesta': len(chat['answer']),
-        'Fuentes': len(chat.get('sources', [])),
-        'Timestamp': chat.get('timestamp', 'N/A')
+        'Longitud Respuesta': chat['answer_chars'],
+        'Latencia (ms)': chat['latency_ms'],
+        'Fuentes': len(chat['sources']),
+        'Error': chat['error'],
+        'Timestamp': datetime.fromtimestamp(chat['ts']).strftime("%Y-%m-%d %H:%M:%S")
     })
 
 df = pd.DataFrame(chat_data)
@@ -263,16 +283,26 @@ with col1:
                 'Longitud Promedio Respuesta',
                 'Hora Más Activa',
                 'Fuentes Utilizadas',
+                'Latencia Media Histórica',
+                'Tasa de Error Histórica',
+                'Tokens Prompt (estimados)',
+                'Tokens Respuesta (estimados)',
                 'Tiempo Promedio Respuesta',
-                'Precisión Estimada'
+                'Tiempo Respuesta p95',
+                'Tasa de Error'
             ],
             'Valor': [
                 stats["total_conversations"],
                 stats["avg_response_length"],
                 stats["most_common_hour"],
                 stats["total_sources_used"],
+                f"{stats['avg_latency_ms']} ms",
+                f"{100 * stats['error_rate']:.1f}%",
+                stats["prompt_tokens"],
+                stats["answer_tokens"],
                 f"{avg_response_time}s",
-                f"{accuracy}%"
+                f"{p95_response_time}s",
+                f"{error_rate}%"
             ]
         }
         
@@ -291,12 +321,9 @@ with col2:
         export_data = {
             "timestamp": datetime.now().isoformat(),
             "statistics": stats,
-            "performance": {
-                "avg_response_time": avg_response_time,
-                "accuracy": accuracy,
-                "satisfaction": satisfaction
-            },
-            "chat_history": st.session_state.chat_history
+            "performance": span_stats,
+            "daily": query_log.rollups("day", limit=365),
+            "recent_queries": query_log.recent(limit=1000)
         }
         
         json_data = json.dumps(export_data, indent=2, ensure_ascii=False)
@@ -0,0 +1,174 @@
+"""
+Caché persistente de extracción de texto de PDF por página
+
+Guarda el texto extraído de cada página, comprimido con zlib, bajo la clave
+(SHA-256 del archivo, extractor, número de página). Volver a procesar un PDF
+ya visto (reindexar con otro tamaño de chunk, volver a subirlo, reconstruir el
+índice) no requiere parsearlo; si faltan páginas, solo se extraen esas.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+_CACHE_REQUESTS_TOTAL = get_metrics_registry().counter(
+    "rag_cache_requests_total", "Consultas a cachés por caché y resultado", ("cache", "result"))
+
+# Cambiar el modo de extracción invalida la caché: forma parte de la clave
+EXTRACTOR = "pypdf-plain"
+
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+_digest_memo_lock = threading.Lock()
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 de un archivo por bloques, memorizado por (ruta, tamaño, mtime)"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _digest_memo_lock:
+        if key in _digest_memo:
+            return _digest_memo[key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    with _digest_memo_lock:
+        _digest_memo[key] = digest.hexdigest()
+    return digest.hexdigest()
+
+
+class PdfPageCache:
+    """Texto y metadata por página de PDF, comprimidos en SQLite"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " file_hash TEXT NOT NULL, extractor TEXT NOT NULL, page_count INTEGER NOT NULL,"
+            " PRIMARY KEY (file_hash, extractor));"
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " file_hash TEXT NOT NULL, extractor TEXT NOT NULL, page INTEGER NOT NULL,"
+            " text BLOB NOT NULL, metadata TEXT NOT NULL,"
+            " PRIMARY KEY (file_hash, extractor, page));"
+        )
+        self._conn.commit()
+
+    def get(self, file_hash: str) -> Tuple[Optional[int], Dict[int, Tuple[str, Dict[str, Any]]]]:
+        """
+        Páginas en caché de un archivo
+        Returns:
+            (número de páginas o None si el archivo no se ha visto, {página: (texto, metadata)})
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_count FROM documents WHERE file_hash = ? AND extractor = ?",
+                (file_hash, EXTRACTOR)
+            ).fetchone()
+            rows = self._conn.execute(
+                "SELECT page, text, metadata FROM pages WHERE file_hash = ? AND extractor = ?",
+                (file_hash, EXTRACTOR)
+            ).fetchall()
+        pages = {page: (zlib.decompress(text).decode("utf-8"), json.loads(metadata))
+                 for page, text, metadata in rows}
+        return (row[0] if row else None), pages
+
+    def put(self, file_hash: str, page_count: int, pages: List[Tuple[int, str, Dict[str, Any]]]):
+        """Guarda páginas recién extraídas"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (file_hash, extractor, page_count) VALUES (?, ?, ?)",
+                (file_hash, EXTRACTOR, page_count)
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (file_hash, extractor, page, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                [(file_hash, EXTRACTOR, page, zlib.compress(text.encode("utf-8"), 6), json.dumps(metadata))
+                 for page, text, metadata in pages]
+            )
+            self._conn.commit()
+
+    def count_hits(self, hits: int, misses: int):
+        """Acumula páginas servidas desde la caché (hits) y extraídas del PDF (misses)"""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        _CACHE_REQUESTS_TOTAL.labels("pdf_page", "hit").inc(hits)
+        _CACHE_REQUESTS_TOTAL.labels("pdf_page", "miss").inc(misses)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Páginas servidas desde la caché y páginas extraídas en este proceso"""
+        with self._lock:
+            cached_pages, stored_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(text)), 0) FROM pages"
+            ).fetchone()
+            return {
+                "pdf_cache_hits": self.hits,
+                "pdf_cache_misses": self.misses,
+                "pdf_cache_pages": cached_pages,
+                "pdf_cache_bytes": stored_bytes,
+            }
+
+
+def _extract_page_text(page) -> str:
+    # Mismo modo de extracción que PyPDFLoader
+    import pypdf
+
+    if pypdf.__version__.startswith("3"):
+        return page.extract_text()
+    return page.extract_text(extraction_mode="plain")
+
+
+def load_pdf(file_path: str, cache: PdfPageCache) -> List[Document]:
+    """
+    Carga un PDF página a página, como PyPDFLoader, usando la caché de extracción.
+    El PDF solo se abre si falta alguna página en la caché.
+    """
+    file_hash = file_sha256(file_path)
+    page_count, cached = cache.get(file_hash)
+
+    if page_count is None or len(cached) < page_count:
+        import pypdf
+
+        reader = pypdf.PdfReader(file_path)
+        page_count = len(reader.pages)
+        try:
+            labels = reader.page_labels
+        except Exception:
+            labels = []
+
+        extracted = []
+        for page_number in range(page_count):
+            if page_number in cached:
+                continue
+            metadata = {"page_label": labels[page_number]} if page_number < len(labels) else {}
+            text = _extract_page_text(reader.pages[page_number])
+            extracted.append((page_number, text, metadata))
+            cached[page_number] = (text, metadata)
+        cache.put(file_hash, page_count, extracted)
+        cache.count_hits(page_count - len(extracted), len(extracted))
+        logger.debug(f"PDF {file_path}: {len(extracted)} de {page_count} páginas extraídas")
+    else:
+        cache.count_hits(page_count, 0)
+
+    return [
+        Document(page_content=cached[page_number][0],
+                 metadata={"source": file_path, "page": page_number, **cached[page_number][1]})
+        for page_number in range(page_count)
+    ]
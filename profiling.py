@@ -0,0 +1,172 @@
+"""
+Perfilado opcional por petición (cProfile + tracemalloc)
+
+Con el modo debug activo (`DEBUG_MODE=true` o la casilla "Modo Debug" de
+Configuración), cada `ask_question` o ingesta se ejecuta bajo cProfile y
+tracemalloc. Se guardan las funciones con más tiempo acumulado, los puntos de
+asignación de memoria con más bytes y el `.pstats` completo en
+`rag_config.profile_directory`, donde los lee `debug_rag.py` (que corre en otro
+proceso).
+
+Solo se perfila una petición a la vez por proceso: cProfile y tracemalloc son
+globales, así que las peticiones concurrentes (y las anidadas, como
+`process_documents` dentro de `add_documents`) se ejecutan sin perfilar.
+cProfile mide el hilo que hace la petición; el trabajo en otros hilos solo
+aparece como tiempo de espera.
+"""
+
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Any, Dict, List, Optional
+
+from config import get_environment_config, rag_config
+
+logger = logging.getLogger(__name__)
+
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 15
+
+_enabled_override: Optional[bool] = None
+_active = threading.Lock()
+
+
+def set_profiling_enabled(enabled: Optional[bool]):
+    """Activa o desactiva el perfilado en este proceso (None vuelve a usar DEBUG_MODE)"""
+    global _enabled_override
+    _enabled_override = enabled
+
+
+def profiling_enabled() -> bool:
+    if _enabled_override is not None:
+        return _enabled_override
+    return get_environment_config()["debug_mode"]
+
+
+def _top_functions(profiler: cProfile.Profile) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+    return [
+        {
+            "function": f"{os.path.basename(filename)}:{line}({name})" if line else name,
+            "file": filename,
+            "calls": calls,
+            "total_ms": round(1000 * total, 2),
+            "cumulative_ms": round(1000 * cumulative, 2),
+        }
+        for (filename, line, name), (_, calls, total, cumulative, _) in rows
+    ]
+
+
+def _top_allocations(snapshot: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    return [
+        {
+            "site": f"{frame.filename}:{frame.lineno}",
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        for frame in stat.traceback[:1]
+    ]
+
+
+def _prune(directory: str, keep: int):
+    summaries = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    for name in summaries[:-keep] if keep > 0 else summaries:
+        for path in (name, name[:-len(".json")] + ".pstats"):
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(directory, path))
+
+
+@contextlib.contextmanager
+def profile_request(kind: str, label: str = "", force: bool = False):
+    """
+    Perfila el bloque si el modo debug está activo (o con force=True).
+    Produce un diccionario que al salir contiene el resumen guardado, o None
+    si el bloque no se perfiló.
+    """
+    if not (force or profiling_enabled()) or not _active.acquire(blocking=False):
+        yield None
+        return
+
+    result: Dict[str, Any] = {}
+    started_tracing = not tracemalloc.is_tracing()
+    profiler = cProfile.Profile()
+    try:
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+            try:
+                result.update(_save_profile(kind, label, duration, profiler, snapshot,
+                                            current - baseline, peak - baseline))
+            except Exception as e:
+                logger.warning(f"No se pudo guardar el perfil de '{kind}': {str(e)}")
+    finally:
+        _active.release()
+
+
+def _save_profile(kind: str, label: str, duration: float, profiler: cProfile.Profile,
+                  snapshot: tracemalloc.Snapshot, retained: int, peak: int) -> Dict[str, Any]:
+    directory = rag_config.profile_directory
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{kind}-{uuid.uuid4().hex[:6]}"
+    pstats_path = os.path.join(directory, f"{profile_id}.pstats")
+    profiler.dump_stats(pstats_path)
+    summary = {
+        "id": profile_id,
+        "kind": kind,
+        "label": label[:200],
+        "created_at": time.time(),
+        "duration_ms": round(1000 * duration, 2),
+        "memory_peak_kb": round(peak / 1024, 1),
+        "memory_retained_kb": round(retained / 1024, 1),
+        "top_functions": _top_functions(profiler),
+        "top_allocations": _top_allocations(snapshot),
+        "pstats_path": pstats_path,
+    }
+    with open(os.path.join(directory, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    _prune(directory, rag_config.profile_keep)
+    logger.info(f"Perfil de '{kind}' guardado en {pstats_path} ({summary['duration_ms']} ms)")
+    return summary
+
+
+def list_profiles(directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Resúmenes guardados, del más reciente al más antiguo"""
+    directory = directory or rag_config.profile_directory
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Perfil ilegible {name}: {str(e)}")
+    return sorted(profiles, key=lambda p: p.get("created_at", 0), reverse=True)
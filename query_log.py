@@ -0,0 +1,255 @@
+"""
+Registro persistente de consultas para Analytics
+
+Cada pregunta respondida por la app o por `api_server.py` se añade (solo
+inserciones) a una base SQLite con su instante numérico, sesión, latencia,
+fuentes y tokens estimados, de modo que Analytics ve todas las sesiones y
+sobrevive a recargas. Las escrituras se agrupan en lotes que un hilo de fondo
+vuelca periódicamente; cada lote actualiza en la misma transacción los
+agregados por hora, día, hora del día, fuente y longitud de respuesta, así que
+las gráficas leen un número acotado de filas por larga que sea la historia.
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import rag_config
+
+logger = logging.getLogger(__name__)
+
+# Anchura (caracteres) de los tramos del histograma de longitud de respuesta
+ANSWER_LENGTH_BUCKET = 250
+MAX_ANSWER_LENGTH_BUCKET = 40
+
+_ROLLUP_COLUMNS = ("queries", "errors", "latency_ms_sum", "latency_ms_max",
+                   "prompt_tokens", "answer_tokens", "answer_chars")
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokens aproximados (~4 caracteres por token), como en las métricas de embeddings"""
+    return len(text) // 4
+
+
+class QueryLog:
+    """Consultas en SQLite (append-only) con agregados mantenidos por lote"""
+
+    def __init__(self, path: str, batch_size: int = 50, flush_interval: float = 2.0):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS queries ("
+            " id INTEGER PRIMARY KEY, ts REAL NOT NULL, session TEXT, question TEXT NOT NULL,"
+            " answer_chars INTEGER NOT NULL, latency_ms REAL NOT NULL, sources TEXT NOT NULL,"
+            " prompt_tokens INTEGER NOT NULL, answer_tokens INTEGER NOT NULL, error INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            " granularity TEXT NOT NULL, bucket TEXT NOT NULL,"
+            " queries INTEGER NOT NULL, errors INTEGER NOT NULL,"
+            " latency_ms_sum REAL NOT NULL, latency_ms_max REAL NOT NULL,"
+            " prompt_tokens INTEGER NOT NULL, answer_tokens INTEGER NOT NULL, answer_chars INTEGER NOT NULL,"
+            " PRIMARY KEY (granularity, bucket)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS source_uses ("
+            " source TEXT PRIMARY KEY, uses INTEGER NOT NULL) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS answer_lengths ("
+            " bucket INTEGER PRIMARY KEY, queries INTEGER NOT NULL);"
+        )
+        self._conn.commit()
+        atexit.register(self.flush)
+
+    def append(self, question: str, answer: str, latency_ms: float, sources: List[str],
+               session: Optional[str] = None, prompt_tokens: int = 0, error: bool = False,
+               timestamp: Optional[float] = None):
+        """Encola una consulta; se escribe en el siguiente volcado"""
+        entry = {
+            "ts": timestamp or time.time(),
+            "session": session,
+            "question": question,
+            "answer_chars": len(answer),
+            "latency_ms": round(latency_ms, 2),
+            "sources": sources,
+            "prompt_tokens": prompt_tokens,
+            "answer_tokens": estimate_tokens(answer),
+            "error": bool(error),
+        }
+        with self._pending_lock:
+            self._pending.append(entry)
+            full = len(self._pending) >= self.batch_size
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="query-log-flush", daemon=True)
+                self._flusher.start()
+        if full:
+            self._wakeup.set()
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Escribe las consultas pendientes y sus agregados en una transacción"""
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+
+        rollups: Dict[tuple, Dict[str, float]] = {}
+        sources: Dict[str, int] = {}
+        lengths: Dict[int, int] = {}
+        for entry in batch:
+            local = time.localtime(entry["ts"])
+            for key in (("all", ""), ("day", time.strftime("%Y-%m-%d", local)),
+                        ("hour", time.strftime("%Y-%m-%d %H:00", local)),
+                        ("hour_of_day", time.strftime("%H", local))):
+                row = rollups.setdefault(key, dict.fromkeys(_ROLLUP_COLUMNS, 0))
+                row["queries"] += 1
+                row["errors"] += int(entry["error"])
+                row["latency_ms_sum"] += entry["latency_ms"]
+                row["latency_ms_max"] = max(row["latency_ms_max"], entry["latency_ms"])
+                row["prompt_tokens"] += entry["prompt_tokens"]
+                row["answer_tokens"] += entry["answer_tokens"]
+                row["answer_chars"] += entry["answer_chars"]
+            if not entry["error"]:
+                for source in set(entry["sources"]):
+                    sources[source] = sources.get(source, 0) + 1
+                bucket = min(entry["answer_chars"] // ANSWER_LENGTH_BUCKET, MAX_ANSWER_LENGTH_BUCKET)
+                lengths[bucket] = lengths.get(bucket, 0) + 1
+
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO queries (ts, session, question, answer_chars, latency_ms, sources,"
+                    " prompt_tokens, answer_tokens, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(e["ts"], e["session"], e["question"], e["answer_chars"], e["latency_ms"],
+                      json.dumps(e["sources"], ensure_ascii=False), e["prompt_tokens"], e["answer_tokens"],
+                      int(e["error"])) for e in batch]
+                )
+                self._conn.executemany(
+                    "INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (granularity, bucket) DO UPDATE SET"
+                    " queries = queries + excluded.queries, errors = errors + excluded.errors,"
+                    " latency_ms_sum = latency_ms_sum + excluded.latency_ms_sum,"
+                    " latency_ms_max = max(latency_ms_max, excluded.latency_ms_max),"
+                    " prompt_tokens = prompt_tokens + excluded.prompt_tokens,"
+                    " answer_tokens = answer_tokens + excluded.answer_tokens,"
+                    " answer_chars = answer_chars + excluded.answer_chars",
+                    [(granularity, bucket, *(row[column] for column in _ROLLUP_COLUMNS))
+                     for (granularity, bucket), row in rollups.items()]
+                )
+                self._conn.executemany(
+                    "INSERT INTO source_uses VALUES (?, ?) "
+                    "ON CONFLICT (source) DO UPDATE SET uses = uses + excluded.uses",
+                    list(sources.items())
+                )
+                self._conn.executemany(
+                    "INSERT INTO answer_lengths VALUES (?, ?) "
+                    "ON CONFLICT (bucket) DO UPDATE SET queries = queries + excluded.queries",
+                    list(lengths.items())
+                )
+        except Exception as e:
+            # Se conservan para el siguiente volcado
+            logger.warning(f"No se pudo volcar el registro de consultas: {str(e)}")
+            with self._pending_lock:
+                self._pending[:0] = batch
+            return 0
+        return len(batch)
+
+    def _rows(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def totals(self) -> Dict[str, Any]:
+        """Agregado de toda la historia (una fila)"""
+        rows = self._rows("SELECT * FROM rollups WHERE granularity = 'all'")
+        row = rows[0] if rows else dict.fromkeys(_ROLLUP_COLUMNS, 0)
+        return self._with_averages(row)
+
+    def rollups(self, granularity: str, limit: int) -> List[Dict[str, Any]]:
+        """Los `limit` tramos más recientes de 'hour' o 'day', en orden cronológico"""
+        rows = self._rows(
+            "SELECT * FROM rollups WHERE granularity = ? ORDER BY bucket DESC LIMIT ?", (granularity, limit)
+        )
+        return [self._with_averages(row) for row in reversed(rows)]
+
+    def hour_of_day(self) -> List[Dict[str, Any]]:
+        """Actividad por hora del día (hasta 24 filas)"""
+        rows = self._rows("SELECT * FROM rollups WHERE granularity = 'hour_of_day' ORDER BY bucket")
+        return [self._with_averages(row) for row in rows]
+
+    def top_sources(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return self._rows("SELECT source, uses FROM source_uses ORDER BY uses DESC LIMIT ?", (limit,))
+
+    def source_count(self) -> int:
+        return self._rows("SELECT COUNT(*) AS n FROM source_uses")[0]["n"]
+
+    def answer_lengths(self) -> List[Dict[str, Any]]:
+        """Histograma de longitud de respuesta con el inicio de cada tramo en caracteres"""
+        rows = self._rows("SELECT bucket, queries FROM answer_lengths ORDER BY bucket")
+        return [{"chars": row["bucket"] * ANSWER_LENGTH_BUCKET, "queries": row["queries"]} for row in rows]
+
+    def recent(self, limit: int = 200) -> List[Dict[str, Any]]:
+        """Últimas consultas, de la más reciente a la más antigua"""
+        rows = self._rows("SELECT * FROM queries ORDER BY id DESC LIMIT ?", (limit,))
+        for row in rows:
+            row["sources"] = json.loads(row["sources"])
+            row["error"] = bool(row["error"])
+        return rows
+
+    @staticmethod
+    def _with_averages(row: Dict[str, Any]) -> Dict[str, Any]:
+        queries = row.get("queries") or 0
+        row["avg_latency_ms"] = round(row["latency_ms_sum"] / queries, 1) if queries else 0.0
+        row["error_rate"] = round(row["errors"] / queries, 4) if queries else 0.0
+        row["avg_answer_chars"] = int(row["answer_chars"] / queries) if queries else 0
+        return row
+
+
+def log_response(response: Dict[str, Any], latency_ms: float, session: Optional[str] = None):
+    """Registra la respuesta de `RAGSystem.ask_question` (no hace nada si el registro está desactivado)"""
+    query_log = get_query_log()
+    if query_log is None:
+        return
+    documents = response.get("source_documents") or []
+    context_chars = sum(len(doc.page_content) for doc in documents)
+    query_log.append(
+        question=response["question"],
+        answer=response["answer"],
+        latency_ms=latency_ms,
+        sources=[doc.metadata.get("file_name", doc.metadata.get("source", "Desconocido")) for doc in documents],
+        session=session,
+        prompt_tokens=estimate_tokens(response["question"]) + context_chars // 4,
+        error=bool(response.get("error")),
+    )
+
+
+_query_log: Optional[QueryLog] = None
+_query_log_lock = threading.Lock()
+
+
+def get_query_log() -> Optional[QueryLog]:
+    """Registro compartido por el proceso, o None si está desactivado"""
+    global _query_log
+    if not rag_config.query_log_enabled:
+        return None
+    if _query_log is None:
+        with _query_log_lock:
+            if _query_log is None:
+                _query_log = QueryLog(rag_config.query_log_path)
+    return _query_log
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import sys
 import os
 
@@ -9,23 +11,29 @@ except ImportError:
     pass
 
 # Configurar variables de entorno para ChromaDB
-os.environ['CHROMA_DB_IMPL'] = 'duckdb+parquet'
 os.environ['ANONYMIZED_TELEMETRY'] = 'False'
 
+import contextlib
+import importlib
+import json
 import logging
-from typing import List, Optional, Dict, Any
-import chromadb
-from chromadb.config import Settings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader, PyPDFLoader, UnstructuredMarkdownLoader
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.vectorstores import Chroma
-from langchain.chains import RetrievalQA
-from langchain.docstore.document import Document
-from langchain.prompts import PromptTemplate
+import re
+from typing import Callable, List, Optional, Dict, Any, Set, TYPE_CHECKING
 from dotenv import load_dotenv
+import threading
 import time
+import uuid
+
+from config import rag_config
+from memory_report import current_rss_bytes, deep_sizeof, module_cache_sizes, session_history_sizes
+from metrics import get_metrics_registry, get_span_recorder, span
+from profiling import profile_request
+from session_recorder import get_session_recorder
+
+# chromadb, langchain y los clientes de Google son pesados: se importan al primer uso
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import Embeddings
 
 load_dotenv()
 
@@ -33,36 +41,211 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_metrics = get_metrics_registry()
+_QUESTIONS_TOTAL = _metrics.counter("rag_questions_total", "Preguntas procesadas por resultado", ("status",))
+_ERRORS_TOTAL = _metrics.counter("rag_errors_total", "Operaciones fallidas", ("operation",))
+_EMBED_CALLS_TOTAL = _metrics.counter("rag_embedding_calls_total", "Llamadas al modelo de embeddings", ("kind",))
+_EMBED_TEXTS_TOTAL = _metrics.counter("rag_embedding_texts_total", "Textos enviados al modelo de embeddings")
+_EMBED_TOKENS_TOTAL = _metrics.counter("rag_embedding_tokens_total",
+                                       "Tokens estimados (~4 caracteres por token) enviados a embeddings")
+_INGEST_CHUNKS_TOTAL = _metrics.counter("rag_ingest_chunks_total", "Chunks escritos en el índice")
+
+# Loader por extensión: (módulo, clase, kwargs). El módulo se importa al llegar
+# el primer archivo de ese tipo (p. ej. `unstructured` solo con archivos .md)
+DOCUMENT_LOADERS = {
+    '.pdf': ('langchain_community.document_loaders', 'PyPDFLoader', {}),
+    '.txt': ('langchain_community.document_loaders', 'TextLoader', {'encoding': 'utf-8'}),
+    '.md': ('langchain_community.document_loaders', 'UnstructuredMarkdownLoader', {}),
+}
+
+
+def get_loader(file_path: str, file_extension: str):
+    """Crea el loader adecuado para la extensión, importándolo bajo demanda"""
+    module_name, class_name, kwargs = DOCUMENT_LOADERS[file_extension]
+    loader_class = getattr(importlib.import_module(module_name), class_name)
+    return loader_class(file_path, **kwargs)
+
+
+def make_text_splitter(chunk_size: int, chunk_overlap: int):
+    """Crea el text splitter con los separadores del sistema"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""],
+        # Desplazamiento del chunk en su página (`offset` en la metadata compacta)
+        add_start_index=True
+    )
+
+
+class CountingEmbeddings:
+    """
+    Envoltorio de embeddings que cuenta llamadas, textos y tiempo empleado.
+    Implementa la interfaz `Embeddings` de langchain por duck typing.
+    """
+
+    def __init__(self, embeddings: Embeddings):
+        self.inner = embeddings
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.texts = 0
+        self.seconds = 0.0
+
+    def _record(self, kind: str, texts: List[str], elapsed: float):
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+            self.seconds += elapsed
+        _EMBED_CALLS_TOTAL.labels(kind).inc()
+        _EMBED_TEXTS_TOTAL.inc(len(texts))
+        _EMBED_TOKENS_TOTAL.inc(sum(len(text) for text in texts) // 4)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        with span("embed"):
+            vectors = self.inner.embed_documents(texts)
+        self._record("documents", texts, time.perf_counter() - start)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        with span("embed_query"):
+            vector = self.inner.embed_query(text)
+        self._record("query", [text], time.perf_counter() - start)
+        return vector
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Devuelve los contadores acumulados"""
+        with self._lock:
+            return {
+                "embed_calls": self.calls,
+                "embedded_texts": self.texts,
+                "embed_seconds": round(self.seconds, 3),
+                "avg_call_ms": round(1000 * self.seconds / self.calls, 1) if self.calls else 0.0
+            }
+
+
+_span_callback_class = None
+
+
+def make_span_callbacks() -> list:
+    """
+    Callbacks de langchain que miden los tramos de la cadena QA: 'retrieve'
+    (embedding de la pregunta y búsqueda), 'prompt' (montaje del contexto hasta
+    la llamada al modelo) y 'generate'. Lista vacía si las métricas están desactivadas.
+    """
+    global _span_callback_class
+    recorder = get_span_recorder()
+    if not recorder.enabled:
+        return []
+    if _span_callback_class is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class SpanCallbackHandler(BaseCallbackHandler):
+            def __init__(self):
+                self.started: Dict[Any, float] = {}
+                self.retrieved_at: Optional[float] = None
+
+            def _finish(self, name: str, run_id, error: bool = False):
+                start = self.started.pop(run_id, None)
+                if start is not None:
+                    recorder.record(name, time.perf_counter() - start, error=error)
+
+            def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+                self.started[run_id] = time.perf_counter()
+
+            def on_retriever_end(self, documents, *, run_id, **kwargs):
+                self._finish("retrieve", run_id)
+                self.retrieved_at = time.perf_counter()
+
+            def on_retriever_error(self, error, *, run_id, **kwargs):
+                self._finish("retrieve", run_id, error=True)
+
+            def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+                now = time.perf_counter()
+                if self.retrieved_at is not None:
+                    recorder.record("prompt", now - self.retrieved_at)
+                    self.retrieved_at = None
+                self.started[run_id] = now
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+                self.on_llm_start(serialized, [], run_id=run_id, **kwargs)
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                self._finish("generate", run_id)
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                self._finish("generate", run_id, error=True)
+
+        _span_callback_class = SpanCallbackHandler
+    return [_span_callback_class()]
+
+
 class RAGSystem:
-    def __init__(self, persist_directory: str = "./chroma_db"):
+    def __init__(self, persist_directory: str = "./chroma_db",
+                 embedding_factory: Optional[Callable[[str], Embeddings]] = None,
+                 llm_factory: Optional[Callable[[Dict[str, Any]], Any]] = None):
         """
         Inicializa el sistema RAG mejorado
         Args:
             persist_directory: Directorio para persistir la base de datos vectorial
+            embedding_factory: Crea los embeddings a partir del nombre del modelo; por
+                defecto los de Google (p. ej. `offline_providers.HashEmbeddings` en benchmarks)
+            llm_factory: Crea el modelo de chat a partir de `llm_config`; por defecto Gemini
+                (p. ej. `offline_providers.SimulatedChatModel` en pruebas de carga)
         """
         try:
             google_api_key = os.getenv("GOOGLE_API_KEY")
-            if not google_api_key:
+            if not google_api_key and embedding_factory is None:
                 raise ValueError("GOOGLE_API_KEY no está configurada en las variables de entorno.")
 
-            self.embeddings = GoogleGenerativeAIEmbeddings(
-                model="models/embedding-001", 
-                google_api_key=google_api_key
-            )
-            
-            # Configuración mejorada del text splitter
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-                separators=["\n\n", "\n", " ", ""]
-            )
-            
             self.persist_directory = persist_directory
+            self.embedding_factory = embedding_factory
+            self.llm_factory = llm_factory
             self.vectorstore = None
             self.qa_chain = None
             self.google_api_key = google_api_key
             
+            # Generación activa del índice (blue/green): colección, embeddings y chunking
+            self.index_state = self._load_index_state()
+            index_config = self.index_state["config"]
+            self.collection_name = self.index_state["active"]
+            self.vector_backend = index_config.get("vector_backend", rag_config.vector_backend)
+            self.embedding_model = index_config["embedding_model"]
+            self.embeddings = self._make_embeddings(self.embedding_model)
+            
+            # Configuración mejorada del text splitter
+            self.text_splitter = make_text_splitter(
+                chunk_size=index_config["chunk_size"],
+                chunk_overlap=index_config["chunk_overlap"]
+            )
+            
+            # Reindexado en segundo plano
+            self.rebuild_status: Dict[str, Any] = {"state": "idle"}
+            self._rebuild_thread: Optional[threading.Thread] = None
+            self._rebuild_dirty_sources: Optional[Dict[str, str]] = None
+            
+            # Estado de preparación ('cold', 'warming', 'ready', 'degraded')
+            self.readiness = "cold"
+            self.warmup_timings: Dict[str, float] = {}
+            
+            # Chunks borrados pendientes de compactar: se excluyen de las búsquedas
+            self._index_lock = threading.RLock()
+            self._tombstones = self._load_tombstones()
+            self._compaction_thread: Optional[threading.Thread] = None
+            
+            # Catálogo de estadísticas (se abre al primer uso) y caché del tamaño en disco
+            self._catalog = None
+            self._files = None
+            self._disk_size_cache = (0.0, 0)
+            self._pdf_cache = None
+            
+            # Documentos y chunks de las ingestas en curso (para el informe de memoria)
+            self._ingest_buffers: Dict[str, list] = {}
+            self._memory_warned = False
+            
             # Configuraciones avanzadas
             self.retrieval_config = {
                 "search_type": "similarity",
@@ -82,18 +265,21 @@ class RAGSystem:
             logger.error(f"Error inicializando RAGSystem: {str(e)}")
             raise
 
-    def load_documents(self, file_paths: List[str]) -> List[Document]:
+    def load_documents(self, file_paths: List[str],
+                       display_names: Optional[List[str]] = None) -> List[Document]:
         """
         Carga documentos desde archivos con manejo mejorado de errores
         Args:
             file_paths: Lista de rutas a los archivos
+            display_names: Nombres a mostrar (`file_name`) si difieren del nombre en disco,
+                p. ej. para blobs del almacén de subidas
         Returns:
             Lista de documentos cargados
         """
         documents = []
-        supported_formats = {'.pdf', '.txt', '.md'}
+        supported_formats = set(DOCUMENT_LOADERS)
         
-        for file_path in file_paths:
+        for index, file_path in enumerate(file_paths):
             try:
                 file_extension = os.path.splitext(file_path)[1].lower()
                 
@@ -106,21 +292,21 @@ class RAGSystem:
                     logger.error(f"Archivo no encontrado: {file_path}")
                     continue
                 
-                # Cargar según el tipo de archivo
-                if file_extension == '.pdf':
-                    loader = PyPDFLoader(file_path)
-                elif file_extension == '.txt':
-                    loader = TextLoader(file_path, encoding='utf-8')
-                elif file_extension == '.md':
-                    loader = UnstructuredMarkdownLoader(file_path)
-                
-                docs = loader.load()
+                # Cargar según el tipo de archivo (los PDF pasan por la caché de extracción)
+                with span("load"):
+                    if file_extension == '.pdf' and rag_config.pdf_cache_enabled:
+                        from pdf_cache import load_pdf
+                        
+                        docs = load_pdf(file_path, self._get_pdf_cache())
+                    else:
+                        loader = get_loader(file_path, file_extension)
+                        docs = loader.load()
                 
                 # Agregar metadata adicional
                 for doc in docs:
                     doc.metadata.update({
                         'file_path': file_path,
-                        'file_name': os.path.basename(file_path),
+                        'file_name': display_names[index] if display_names else os.path.basename(file_path),
                         'file_type': file_extension,
                         'load_time': time.time()
                     })
@@ -135,6 +321,18 @@ class RAGSystem:
         logger.info(f"Total de documentos cargados: {len(documents)}")
         return documents
 
+    def split_documents(self, documents: List[Document], splitter=None) -> List[Document]:
+        """
+        Divide documentos en chunks
+        Args:
+            documents: Documentos cargados
+            splitter: Text splitter a usar (por defecto el de la generación activa)
+        Returns:
+            Lista de chunks
+        """
+        with span("split"):
+            return (splitter or self.text_splitter).split_documents(documents)
+
     def process_documents(self, documents: List[Document]) -> bool:
         """
         Procesa documentos: los divide en chunks y crea embeddings
@@ -148,26 +346,35 @@ class RAGSystem:
                 logger.warning("No hay documentos para procesar")
                 return False
             
-            # Dividir documentos en chunks
-            texts = self.text_splitter.split_documents(documents)
-            logger.info(f"Documentos divididos en {len(texts)} chunks")
+            started = time.perf_counter()
+            with profile_request("ingest", self._ingest_label(documents)), self._ingest_buffer() as buffer:
+                # Dividir documentos en chunks
+                buffer.append(documents)
+                texts = self.split_documents(documents)
+                buffer.append(texts)
+                logger.info(f"Documentos divididos en {len(texts)} chunks")
             
-            if not texts:
-                logger.warning("No se generaron chunks válidos")
-                return False
+                if not texts:
+                    logger.warning("No se generaron chunks válidos")
+                    return False
             
-            # Crear vector store
-            self.vectorstore = Chroma.from_documents(
-                documents=texts,
-                embedding=self.embeddings,
-                persist_directory=self.persist_directory
-            )
+                # Crear vector store
+                with self._index_lock:
+                    self.vectorstore = self._open_collection(self.collection_name, self.embeddings)
+                    self._clear_tombstones(texts)
+                    self.vectorstore.add_documents(texts)
+                    self._record_chunks(self.collection_name, [t.metadata for t in texts])
+                    # La cadena anterior apunta al vectorstore reemplazado
+                    self.qa_chain = None
+                    self._mark_rebuild_dirty(texts)
             
-            logger.info("Base de datos vectorial creada y guardada exitosamente")
-            return True
+                self._record_index(texts, started)
+                logger.info("Base de datos vectorial creada y guardada exitosamente")
+                return True
             
         except Exception as e:
             logger.error(f"Error procesando documentos: {str(e)}")
+            _ERRORS_TOTAL.labels("ingest").inc()
             return False
 
     def load_existing_vectorstore(self) -> bool:
@@ -181,18 +388,83 @@ class RAGSystem:
                 logger.warning(f"Directorio de persistencia no existe: {self.persist_directory}")
                 return False
             
-            self.vectorstore = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embeddings
-            )
+            self.vectorstore = self._open_collection(self.collection_name, self.embeddings)
             
-            logger.info("Base de datos vectorial cargada exitosamente")
+            logger.info(f"Base de datos vectorial cargada exitosamente (colección {self.collection_name})")
+            
+            # Retomar una compactación que quedó pendiente antes de reiniciar
+            if self._tombstones["ids"]:
+                self._schedule_compaction()
             return True
             
         except Exception as e:
             logger.error(f"Error cargando base de datos: {str(e)}")
             return False
 
+    def warm_up(self, embed_probe: bool = False) -> Dict[str, float]:
+        """
+        Precarga la base de datos, el índice y la cadena QA para evitar el arranque en frío
+        Args:
+            embed_probe: Si True, hace una llamada de embedding de prueba para abrir el cliente
+        Returns:
+            Diccionario con el tiempo (ms) de cada paso
+        """
+        self.readiness = "warming"
+        timings: Dict[str, float] = {}
+        total_start = time.perf_counter()
+
+        def timed(step: str, func) -> bool:
+            start = time.perf_counter()
+            try:
+                ok = func() is not False
+            except Exception as e:
+                logger.warning(f"Warm-up: fallo en '{step}': {str(e)}")
+                ok = False
+            timings[step] = round(1000 * (time.perf_counter() - start), 1)
+            logger.info(f"Warm-up: {step} en {timings[step]} ms{'' if ok else ' (fallido)'}")
+            return ok
+
+        healthy = True
+        if self.vectorstore is None:
+            healthy = timed("open_collection", self.load_existing_vectorstore)
+
+        if self.vectorstore is not None:
+            healthy = timed("page_in_index", self._page_in_index) and healthy
+            healthy = timed("build_qa_chain", self.setup_qa_chain) and healthy
+
+        if embed_probe:
+            healthy = timed("embedding_probe", lambda: self.embeddings.embed_query("warm-up")) and healthy
+
+        timings["total"] = round(1000 * (time.perf_counter() - total_start), 1)
+        self.warmup_timings = timings
+        self.readiness = "ready" if healthy and self.qa_chain is not None else "degraded"
+        logger.info(f"Warm-up completado en {timings['total']} ms (estado: {self.readiness})")
+        return timings
+
+    def _page_in_index(self) -> bool:
+        """Fuerza la carga del índice en memoria con una consulta por un vector ya almacenado"""
+        backend = self.vectorstore.backend
+        if backend.count() == 0:
+            return True
+        sample = backend.get(limit=1, include_embeddings=True)
+        if not sample["embeddings"]:
+            return True
+        backend.query(sample["embeddings"][0], k=1)
+        return True
+
+    def get_readiness(self) -> Dict[str, Any]:
+        """
+        Obtiene el estado de preparación del sistema
+        Returns:
+            Diccionario con el estado y los tiempos del último warm-up
+        """
+        return {
+            "state": self.readiness,
+            "vectorstore_loaded": self.vectorstore is not None,
+            "qa_chain_ready": self.qa_chain is not None,
+            "warmup_ms": dict(self.warmup_timings)
+        }
+
     def setup_qa_chain(self) -> bool:
         """
         Configura la cadena de pregunta-respuesta con prompt personalizado
@@ -203,10 +475,20 @@ class RAGSystem:
             if not self.vectorstore:
                 raise ValueError("Primero debes procesar documentos o cargar una base de datos existente")
             
+            from langchain.chains import RetrievalQA
+            from langchain_core.prompts import PromptTemplate
+            
             # Crear retriever con configuración avanzada
+            search_kwargs = {"k": self.retrieval_config["k"]}
+            tombstone_filter = self._tombstone_filter()
+            if tombstone_filter:
+                search_kwargs["filter"] = tombstone_filter
+            if self.retrieval_config["search_type"] == "similarity_score_threshold":
+                search_kwargs["score_threshold"] = self.retrieval_config["score_threshold"]
+            
             retriever = self.vectorstore.as_retriever(
                 search_type=self.retrieval_config["search_type"],
-                search_kwargs={"k": self.retrieval_config["k"]}
+                search_kwargs=search_kwargs
             )
             
             # Prompt personalizado en español
@@ -231,12 +513,7 @@ Respuesta:""",
             )
             
             # Crear LLM con configuración optimizada
-            llm = ChatGoogleGenerativeAI(
-                model=self.llm_config["model"],
-                temperature=self.llm_config["temperature"],
-                max_tokens=self.llm_config["max_tokens"],
-                google_api_key=self.google_api_key
-            )
+            llm = self._make_llm()
             
             # Crear cadena QA con prompt personalizado
             self.qa_chain = RetrievalQA.from_chain_type(
@@ -262,6 +539,7 @@ Respuesta:""",
         Returns:
             Diccionario con la respuesta y documentos fuente
         """
+        started = time.perf_counter()
         try:
             if not self.qa_chain:
                 raise ValueError("Primero debes configurar la cadena QA")
@@ -271,7 +549,8 @@ Respuesta:""",
             
             logger.info(f"Procesando pregunta: {question[:100]}...")
             
-            result = self.qa_chain.invoke({"query": question})
+            with profile_request("question", question), span("question"):
+                result = self.qa_chain.invoke({"query": question}, config={"callbacks": make_span_callbacks()})
             
             response = {
                 "answer": result["result"], 
@@ -280,11 +559,16 @@ Respuesta:""",
                 "timestamp": time.time()
             }
             
+            self._record_question(question, started, response["source_documents"])
+            _QUESTIONS_TOTAL.labels("ok").inc()
             logger.info("Pregunta procesada exitosamente")
             return response
             
         except Exception as e:
             logger.error(f"Error procesando pregunta: {str(e)}")
+            self._record_question(question, started, [], error=str(e))
+            _QUESTIONS_TOTAL.labels("error").inc()
+            _ERRORS_TOTAL.labels("question").inc()
             return {
                 "answer": f"Lo siento, ocurrió un error al procesar tu pregunta: {str(e)}",
                 "source_documents": [],
@@ -293,6 +577,68 @@ Respuesta:""",
                 "error": True
             }
 
+    def _config_snapshot(self) -> Dict[str, Any]:
+        """Configuración vigente que influye en la respuesta (para grabaciones y reproducción)"""
+        index_config = self.index_state["config"]
+        return {
+            "retrieval": dict(self.retrieval_config),
+            "llm": dict(self.llm_config),
+            "index": {key: index_config.get(key) for key in ("chunk_size", "chunk_overlap", "embedding_model")},
+            "vector_backend": self.vector_backend,
+        }
+
+    def _record_question(self, question: str, started: float, source_documents: list,
+                         error: Optional[str] = None):
+        recorder = get_session_recorder()
+        if recorder is None:
+            return
+        recorder.record(
+            "question",
+            question=question,
+            duration_ms=round(1000 * (time.perf_counter() - started), 2),
+            error=error,
+            sources=[{"file": doc.metadata.get("file_name"), "page": doc.metadata.get("page")}
+                     for doc in source_documents],
+            config=self._config_snapshot()
+        )
+
+    @staticmethod
+    def _ingest_label(documents: List[Document]) -> str:
+        names = dict.fromkeys(doc.metadata.get("file_name") or doc.metadata.get("source", "") for doc in documents)
+        return ", ".join(name for name in names if name)
+
+    @contextlib.contextmanager
+    def _ingest_buffer(self):
+        """Registra las listas de una ingesta en curso mientras dura el bloque"""
+        buffer: list = []
+        token = uuid.uuid4().hex
+        self._ingest_buffers[token] = buffer
+        try:
+            yield buffer
+        finally:
+            self._ingest_buffers.pop(token, None)
+
+    def _record_index(self, chunks: List[Document], started: float):
+        recorder = get_session_recorder()
+        if recorder is None:
+            return
+        files = {}
+        for chunk in chunks:
+            path = chunk.metadata.get("file_path")
+            if path and path not in files:
+                files[path] = {
+                    "path": path,
+                    "name": chunk.metadata.get("file_name") or os.path.basename(path),
+                    "size": os.path.getsize(path) if os.path.exists(path) else None,
+                }
+        recorder.record(
+            "index",
+            files=list(files.values()),
+            chunks=len(chunks),
+            duration_ms=round(1000 * (time.perf_counter() - started), 2),
+            config=self._config_snapshot()
+        )
+
     def add_documents(self, file_paths: List[str]) -> bool:
         """
         Añade nuevos documentos a la base de datos existente
@@ -302,30 +648,829 @@ Respuesta:""",
             True si la adición fue exitosa
         """
         try:
-            documents = self.load_documents(file_paths)
-            if not documents:
-                logger.warning("No se cargaron documentos válidos")
+            started = time.perf_counter()
+            with profile_request("ingest", ", ".join(os.path.basename(p) for p in file_paths)), \
+                    self._ingest_buffer() as buffer:
+                documents = self.load_documents(file_paths)
+                if not documents:
+                    logger.warning("No se cargaron documentos válidos")
+                    return False
+            
+                buffer.append(documents)
+                texts = self.split_documents(documents)
+                buffer.append(texts)
+            
+                if self.vectorstore:
+                    # Añadir a vectorstore existente
+                    with self._index_lock:
+                        restored = self._clear_tombstones(texts)
+                        self.vectorstore.add_documents(texts)
+                        self._record_chunks(self.collection_name, [t.metadata for t in texts])
+                        self._mark_rebuild_dirty(texts)
+                    # La cadena filtra los archivos borrados: rehacerla para que vea los reindexados
+                    if restored and self.qa_chain is not None:
+                        self.setup_qa_chain()
+                    self._record_index(texts, started)
+                    logger.info(f"Añadidos {len(texts)} chunks nuevos a la base de datos existente")
+                else:
+                    # Crear nuevo vectorstore
+                    success = self.process_documents(documents)
+                    if not success:
+                        return False
+                    logger.info(f"Creada nueva base de datos con {len(texts)} chunks")
+            
+                return True
+            
+        except Exception as e:
+            logger.error(f"Error añadiendo documentos: {str(e)}")
+            _ERRORS_TOTAL.labels("ingest").inc()
+            return False
+
+    def add_chunks(self, chunks: List[Document], ids: Optional[List[str]] = None,
+                   embeddings: Optional[List[List[float]]] = None) -> bool:
+        """
+        Inserta chunks ya divididos en la base de datos, creándola si no existe
+        Args:
+            chunks: Lista de chunks a insertar
+            ids: Identificadores estables; reinsertar el mismo id no duplica el chunk
+            embeddings: Embeddings precalculados (se calculan si no se indican)
+        Returns:
+            True si la inserción fue exitosa
+        """
+        try:
+            if not chunks:
+                return True
+            
+            with self._index_lock:
+                if self.vectorstore is None:
+                    self.vectorstore = self._open_collection(self.collection_name, self.embeddings)
+                restored = self._clear_tombstones(chunks, ids)
+                
+                # Reinsertar un id existente no suma chunks a las estadísticas
+                existing = set(self.vectorstore.backend.get(ids=ids)["ids"]) if ids else set()
+                
+                if embeddings is None:
+                    self.vectorstore.add_documents(chunks, ids=ids)
+                else:
+                    self.vectorstore.upsert(
+                        ids or [uuid.uuid4().hex for _ in chunks],
+                        embeddings,
+                        [chunk.page_content for chunk in chunks],
+                        [chunk.metadata for chunk in chunks]
+                    )
+                self._record_chunks(
+                    self.collection_name,
+                    [chunk.metadata for i, chunk in enumerate(chunks) if not ids or ids[i] not in existing],
+                    dim=len(embeddings[0]) if embeddings else 0
+                )
+                self._mark_rebuild_dirty(chunks)
+            
+            if restored and self.qa_chain is not None:
+                self.setup_qa_chain()
+            logger.debug(f"Insertados {len(chunks)} chunks")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error insertando chunks: {str(e)}")
+            return False
+
+    def delete_file_chunks(self, file_paths: List[str]) -> int:
+        """
+        Borra físicamente todos los chunks de unos archivos de la colección activa,
+        p. ej. antes de insertar una versión nueva con menos chunks
+        Args:
+            file_paths: Rutas (`file_path`) de los archivos
+        Returns:
+            Número de chunks eliminados
+        """
+        try:
+            if not self.vectorstore or not file_paths:
+                return 0
+            
+            backend = self.vectorstore.backend
+            with self._index_lock:
+                ids = []
+                for path in file_paths:
+                    where = self._file_condition(path)
+                    if where:
+                        ids.extend(backend.get(where=where)["ids"])
+                batch_size = 500
+                for i in range(0, len(ids), batch_size):
+                    backend.delete(ids=ids[i:i + batch_size])
+                self._get_catalog().remove_files(self.collection_name, file_paths)
+            
+            if ids:
+                logger.info(f"Eliminados {len(ids)} chunks de {len(file_paths)} archivos")
+            return len(ids)
+            
+        except Exception as e:
+            logger.error(f"Error eliminando chunks: {str(e)}")
+            return 0
+
+    def remove_documents(self, file_names: List[str], compact: bool = True) -> int:
+        """
+        Elimina documentos de la base de datos por nombre o ruta de archivo.
+        Los chunks quedan marcados (tombstones) y dejan de recuperarse de inmediato;
+        el borrado físico lo hace una compactación en segundo plano.
+        Args:
+            file_names: Nombres (`file_name`) o rutas (`file_path`) de los documentos
+            compact: Si True, lanza la compactación en segundo plano
+        Returns:
+            Número de chunks marcados como borrados
+        """
+        try:
+            if not self.vectorstore or not file_names:
+                return 0
+            
+            backend = self.vectorstore.backend
+            ids, file_paths = set(), set()
+            for name in file_names:
+                for where in self._file_lookup_filters(name):
+                    found = backend.get(where=where)
+                    ids.update(found["ids"])
+                    file_paths.update(m.get("file_path") for m in self.vectorstore.decode_metadatas(found["metadatas"])
+                                      if m.get("file_path"))
+            
+            if not ids:
+                logger.warning(f"No se encontraron chunks para: {file_names}")
+                return 0
+            
+            with self._index_lock:
+                self._tombstones["ids"] = sorted(set(self._tombstones["ids"]) | ids)
+                self._tombstones["file_paths"] = sorted(set(self._tombstones["file_paths"]) | file_paths)
+                self._save_tombstones()
+                self._get_catalog().remove_files(self.collection_name, file_paths)
+            
+            # Reconstruir la cadena para que el filtro se aplique ya
+            if self.qa_chain is not None:
+                self.setup_qa_chain()
+            
+            recorder = get_session_recorder()
+            if recorder is not None:
+                recorder.record("remove", files=list(file_names), chunks=len(ids))
+            logger.info(f"Marcados {len(ids)} chunks como borrados ({len(file_paths)} archivos)")
+            if compact:
+                self._schedule_compaction()
+            return len(ids)
+            
+        except Exception as e:
+            logger.error(f"Error eliminando documentos: {str(e)}")
+            return 0
+
+    def compact(self) -> int:
+        """
+        Borra físicamente los chunks marcados y libera espacio en disco
+        Returns:
+            Número de chunks eliminados
+        """
+        with self._index_lock:
+            ids = list(self._tombstones["ids"])
+            file_paths = list(self._tombstones["file_paths"])
+        if not ids or not self.vectorstore:
+            return 0
+        
+        try:
+            backend = self.vectorstore.backend
+            batch_size = 500
+            for i in range(0, len(ids), batch_size):
+                # Solo los ids que siguen marcados: un archivo reindexado mientras tanto
+                # puede haber reutilizado alguno (ids deterministas de ingest.py)
+                with self._index_lock:
+                    tombstoned = set(self._tombstones["ids"])
+                    batch = [chunk_id for chunk_id in ids[i:i + batch_size] if chunk_id in tombstoned]
+                    if batch:
+                        backend.delete(ids=batch)
+            
+            with self._index_lock:
+                self._tombstones["ids"] = sorted(set(self._tombstones["ids"]) - set(ids))
+                self._tombstones["file_paths"] = sorted(set(self._tombstones["file_paths"]) - set(file_paths))
+                self._save_tombstones()
+            
+            backend.vacuum()
+            if self.qa_chain is not None:
+                self.setup_qa_chain()
+            
+            logger.info(f"Compactación completada: {len(ids)} chunks eliminados")
+            return len(ids)
+            
+        except Exception as e:
+            logger.error(f"Error compactando la base de datos: {str(e)}")
+            return 0
+
+    def _clear_tombstones(self, chunks: List[Document], ids: Optional[List[str]] = None) -> bool:
+        """
+        Un archivo borrado que se vuelve a indexar deja de estar marcado. Sus chunks
+        antiguos se eliminan ya (el filtro dejaría de ocultarlos) y los ids reutilizados
+        dejan de estar pendientes de compactar. Se llama con `_index_lock` tomado y
+        antes de insertar.
+        Returns:
+            True si cambiaron las marcas
+        """
+        paths = {chunk.metadata.get("file_path") for chunk in chunks} & set(self._tombstones["file_paths"])
+        tombstoned = set(self._tombstones["ids"])
+        reused = tombstoned.intersection(ids or ())
+        if not paths and not reused:
+            return False
+        
+        backend = self.vectorstore.backend
+        stale = []
+        for path in paths:
+            where = self._file_condition(path)
+            if where:
+                stale.extend(chunk_id for chunk_id in backend.get(where=where)["ids"] if chunk_id in tombstoned)
+        batch_size = 500
+        for i in range(0, len(stale), batch_size):
+            backend.delete(ids=stale[i:i + batch_size])
+        
+        self._tombstones["ids"] = sorted(tombstoned - set(stale) - reused)
+        self._tombstones["file_paths"] = sorted(set(self._tombstones["file_paths"]) - paths)
+        self._save_tombstones()
+        logger.info(f"Reindexados {len(paths)} archivos marcados como borrados ({len(stale)} chunks antiguos eliminados)")
+        return True
+
+    def _schedule_compaction(self):
+        """Lanza la compactación en un hilo de fondo si no hay una en curso"""
+        with self._index_lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(target=self.compact, name="rag-compaction", daemon=True)
+            self._compaction_thread.start()
+
+    def _tombstone_filter(self) -> Optional[Dict[str, Any]]:
+        """Filtro de metadata que excluye los archivos con chunks pendientes de borrar"""
+        with self._index_lock:
+            paths = list(self._tombstones["file_paths"])
+        clauses = [clause for clause in (self._file_condition(path, negate=True) for path in paths) if clause]
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def _compact_metadata(self, config: Optional[Dict[str, Any]] = None) -> bool:
+        """Indica si la generación guarda metadata compacta (fid/page/offset)"""
+        return (config or self.index_state["config"]).get("metadata_format") == "compact"
+
+    def _file_condition(self, path: str, negate: bool = False,
+                        config: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Condición where que selecciona (o excluye) los chunks de un archivo en una generación"""
+        if self._compact_metadata(config):
+            key, value = "fid", self._get_files().fid_of(path)
+            if value is None:
+                return None
+        else:
+            key, value = "file_path", path
+        return {key: {"$ne": value}} if negate else {key: value}
+
+    def _file_lookup_filters(self, name: str) -> List[Dict[str, Any]]:
+        """Filtros where para buscar los chunks de un archivo por nombre o ruta"""
+        if self._compact_metadata():
+            return [{"fid": record.fid} for record in self._get_files().find(name)]
+        return [{"file_name": name}, {"file_path": name}]
+
+    def _tombstones_path(self) -> str:
+        return os.path.join(self.persist_directory, "tombstones.json")
+
+    def _load_tombstones(self) -> Dict[str, List[str]]:
+        try:
+            with open(self._tombstones_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {"ids": data.get("ids", []), "file_paths": data.get("file_paths", [])}
+        except (OSError, ValueError):
+            return {"ids": [], "file_paths": []}
+
+    def _save_tombstones(self):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        tmp_path = self._tombstones_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._tombstones, f)
+        os.replace(tmp_path, self._tombstones_path())
+
+    def rebuild_index(self, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None,
+                      embedding_model: Optional[str] = None, vector_backend: Optional[str] = None,
+                      shards: Optional[int] = None, shard_strategy: Optional[str] = None,
+                      background: bool = True) -> bool:
+        """
+        Reconstruye el índice en una colección nueva (blue/green) sin dejar de servir la actual.
+        Al terminar valida la nueva colección y la activa de forma atómica; la anterior se
+        conserva para poder volver atrás con `rollback_index`.
+        Args:
+            chunk_size: Nuevo tamaño de chunk (por defecto el actual)
+            chunk_overlap: Nueva superposición (por defecto la actual)
+            embedding_model: Nuevo modelo de embeddings (por defecto el actual)
+            vector_backend: Backend de almacenamiento de la nueva colección (por defecto el actual)
+            shards: Número de fragmentos de la nueva colección (por defecto el actual)
+            shard_strategy: Enrutado entre fragmentos, 'document' o 'directory' (por defecto el actual)
+            background: Si True, construye en un hilo y retorna de inmediato
+        Returns:
+            True si el reindexado se lanzó (o terminó, en modo síncrono) correctamente
+        """
+        with self._index_lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                logger.warning("Ya hay un reindexado en curso")
                 return False
+            if self.vectorstore is None:
+                logger.warning("No hay base de datos que reindexar")
+                return False
+            
+            new_config = {
+                "embedding_model": embedding_model or self.embedding_model,
+                "vector_backend": vector_backend or self.vector_backend,
+                "shards": shards or self.index_state["config"].get("shards", 1),
+                "shard_strategy": shard_strategy or self.index_state["config"].get(
+                    "shard_strategy", rag_config.shard_strategy),
+                "chunk_size": chunk_size or self.text_splitter._chunk_size,
+                "chunk_overlap": self.text_splitter._chunk_overlap if chunk_overlap is None else chunk_overlap,
+                # Reindexar migra las colecciones antiguas a metadata compacta
+                "metadata_format": "compact"
+            }
+            self._rebuild_dirty_sources = {}
+            self.rebuild_status = {"state": "building", "config": new_config, "started": time.time()}
+        
+        if not background:
+            return self._run_rebuild(new_config)
+        
+        self._rebuild_thread = threading.Thread(
+            target=self._run_rebuild, args=(new_config,), name="rag-rebuild", daemon=True
+        )
+        self._rebuild_thread.start()
+        return True
+
+    def _run_rebuild(self, new_config: Dict[str, Any]) -> bool:
+        """Construye, valida y activa una nueva generación del índice"""
+        generation = self.index_state["generation"] + 1
+        collection_name = f"rag_v{generation}"
+        new_store = None
+        try:
+            sources = self._indexed_sources()
+            missing = [path for path in sorted(sources) if not os.path.exists(path)]
+            if missing:
+                raise ValueError(f"Faltan {len(missing)} documentos fuente, p. ej. {missing[0]}")
             
-            texts = self.text_splitter.split_documents(documents)
+            embeddings = self._make_embeddings(new_config["embedding_model"])
+            splitter = make_text_splitter(new_config["chunk_size"], new_config["chunk_overlap"])
+            # Descartar restos de un intento anterior fallido con el mismo nombre
+            self._drop_collection(self._open_collection(collection_name, embeddings, new_config))
+            new_store = self._open_collection(collection_name, embeddings, new_config)
             
-            if self.vectorstore:
-                # Añadir a vectorstore existente
-                self.vectorstore.add_documents(texts)
-                logger.info(f"Añadidos {len(texts)} chunks nuevos a la base de datos existente")
-            else:
-                # Crear nuevo vectorstore
-                success = self.process_documents(documents)
-                if not success:
+            expected = self._index_sources(new_store, splitter, sources)
+            
+            # Ponerse al día con lo ingerido durante la construcción y activar
+            with self._index_lock:
+                while self._rebuild_dirty_sources:
+                    pending = self._rebuild_dirty_sources
+                    self._rebuild_dirty_sources = {}
+                    # Quitar lo que la primera pasada ya indexó de esas fuentes
+                    for path in pending:
+                        where = self._file_condition(path, config=new_config)
+                        stale = new_store.backend.get(where=where)["ids"] if where else []
+                        if stale:
+                            new_store.backend.delete(ids=stale)
+                            expected -= len(stale)
+                    self._get_catalog().remove_files(collection_name, list(pending))
+                    expected += self._index_sources(new_store, splitter, pending)
+                
+                # Archivos borrados durante la construcción: la compactación solo elimina
+                # los ids marcados, que son de la colección anterior
+                removed_paths = list(self._tombstones["file_paths"])
+                for path in removed_paths:
+                    where = self._file_condition(path, config=new_config)
+                    stale = new_store.backend.get(where=where)["ids"] if where else []
+                    if stale:
+                        new_store.backend.delete(ids=stale)
+                        expected -= len(stale)
+                self._get_catalog().remove_files(collection_name, removed_paths)
+                
+                self.rebuild_status["state"] = "validating"
+                self._validate_collection(new_store, expected)
+                self._promote_generation(generation, new_store, embeddings, splitter, new_config)
+                self._rebuild_dirty_sources = None
+            
+            self.rebuild_status.update({"state": "done", "generation": generation,
+                                        "chunks": expected, "finished": time.time()})
+            logger.info(f"Reindexado completado: colección {collection_name} activa ({expected} chunks)")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error reindexando: {str(e)}")
+            with self._index_lock:
+                self._rebuild_dirty_sources = None
+            if new_store is not None:
+                self._drop_collection(new_store)
+            self.rebuild_status.update({"state": "failed", "error": str(e), "finished": time.time()})
+            return False
+
+    def _promote_generation(self, generation: int, store, embeddings, splitter, config: Dict[str, Any]):
+        """
+        Activa una colección nueva ya validada y conserva la actual para rollback.
+        Debe llamarse con `_index_lock` tomado.
+        """
+        to_drop = self.index_state.get("previous")
+        to_drop_config = self.index_state.get("previous_config")
+        self.index_state = {
+            "generation": generation,
+            "active": store.backend.collection_name,
+            "previous": self.collection_name,
+            "previous_config": self.index_state["config"],
+            "config": config
+        }
+        self._save_index_state()
+        self._activate(store, embeddings, splitter, config)
+        
+        # La generación anterior a la previa ya no sirve para rollback
+        if to_drop and to_drop not in (self.collection_name, self.index_state["previous"]):
+            self._drop_collection(self._open_collection(to_drop, embeddings, to_drop_config))
+
+    def export_snapshot(self, output_dir: str, dtype: str = "float32") -> Dict[str, Any]:
+        """
+        Exporta la colección activa a un snapshot portable (ver index_snapshot.py).
+        Los chunks borrados lógicamente no se exportan.
+        Args:
+            output_dir: Directorio de destino
+            dtype: Precisión de los vectores ('float32' o 'float16')
+        Returns:
+            Manifiesto del snapshot o diccionario con 'error'
+        """
+        try:
+            if not self.vectorstore:
+                return {"error": "No hay base de datos cargada"}
+            
+            from index_snapshot import write_snapshot
+            
+            # Sin ingestas ni compactaciones a mitad de la exportación
+            with self._index_lock:
+                removed_ids = set(self._tombstones["ids"])
+                removed_paths = set(self._tombstones["file_paths"])
+                store = self.vectorstore
+                # Los ids de archivo son locales a este nodo: el snapshot lleva la metadata completa
+                batches = (
+                    {**batch, "metadatas": store.decode_metadatas(batch["metadatas"])}
+                    for batch in store.backend.snapshot(batch_size=2000)
+                )
+                manifest = write_snapshot(
+                    batches,
+                    output_dir,
+                    info={
+                        "collection": self.collection_name,
+                        "generation": self.index_state["generation"],
+                        "config": self.index_state["config"]
+                    },
+                    dtype=dtype,
+                    keep=lambda chunk_id, metadata: chunk_id not in removed_ids
+                    and metadata.get("file_path") not in removed_paths
+                )
+            
+            logger.info(f"Snapshot exportado en {output_dir}: {manifest['count']} chunks")
+            return manifest
+            
+        except Exception as e:
+            logger.error(f"Error exportando snapshot: {str(e)}")
+            return {"error": str(e)}
+
+    def import_snapshot(self, snapshot_dir: str, vector_backend: Optional[str] = None) -> bool:
+        """
+        Carga un snapshot en una colección nueva sin recalcular embeddings y la activa
+        como siguiente generación; la colección actual queda disponible para `rollback_index`.
+        Args:
+            snapshot_dir: Directorio del snapshot
+            vector_backend: Backend de la nueva colección (por defecto el actual)
+        Returns:
+            True si la importación fue exitosa
+        """
+        new_store = None
+        try:
+            from index_snapshot import iter_snapshot, read_manifest
+            
+            manifest = read_manifest(snapshot_dir)
+            # Los vectores vienen del snapshot; el almacenamiento sigue la disposición local
+            current = self.index_state["config"]
+            config = dict(manifest["config"])
+            config.update({
+                "vector_backend": vector_backend or self.vector_backend,
+                "shards": current.get("shards", 1),
+                "shard_strategy": current.get("shard_strategy", rag_config.shard_strategy),
+                "metadata_format": "compact"
+            })
+            
+            with self._index_lock:
+                if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                    logger.warning("Hay un reindexado en curso; importación cancelada")
                     return False
-                logger.info(f"Creada nueva base de datos con {len(texts)} chunks")
+                
+                generation = self.index_state["generation"] + 1
+                collection_name = f"rag_v{generation}"
+                embeddings = self._make_embeddings(config["embedding_model"])
+                self._drop_collection(self._open_collection(collection_name, embeddings, config))
+                new_store = self._open_collection(collection_name, embeddings, config)
+                
+                for batch in iter_snapshot(snapshot_dir, manifest):
+                    new_store.upsert(batch["ids"], batch["embeddings"], batch["texts"], batch["metadatas"])
+                    self._record_chunks(collection_name, batch["metadatas"], dim=manifest["dim"])
+                
+                self._validate_collection(new_store, manifest["count"])
+                splitter = make_text_splitter(config["chunk_size"], config["chunk_overlap"])
+                self._promote_generation(generation, new_store, embeddings, splitter, config)
             
+            logger.info(f"Snapshot importado: colección {collection_name} activa ({manifest['count']} chunks)")
             return True
             
         except Exception as e:
-            logger.error(f"Error añadiendo documentos: {str(e)}")
+            logger.error(f"Error importando snapshot: {str(e)}")
+            if new_store is not None and self.vectorstore is not new_store:
+                self._drop_collection(new_store)
             return False
 
+    def rollback_index(self) -> bool:
+        """
+        Vuelve a activar la generación anterior del índice
+        Returns:
+            True si el rollback fue exitoso
+        """
+        try:
+            with self._index_lock:
+                previous = self.index_state.get("previous")
+                previous_config = self.index_state.get("previous_config")
+                if not previous or not previous_config:
+                    logger.warning("No hay generación anterior a la que volver")
+                    return False
+                
+                embeddings = self._make_embeddings(previous_config["embedding_model"])
+                store = self._open_collection(previous, embeddings, previous_config)
+                splitter = make_text_splitter(previous_config["chunk_size"], previous_config["chunk_overlap"])
+                
+                self.index_state = {
+                    "generation": self.index_state["generation"],
+                    "active": previous,
+                    "previous": self.collection_name,
+                    "previous_config": self.index_state["config"],
+                    "config": previous_config
+                }
+                self._save_index_state()
+                self._activate(store, embeddings, splitter, previous_config)
+            
+            logger.info(f"Rollback completado: colección {previous} activa")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error en rollback del índice: {str(e)}")
+            return False
+
+    def _activate(self, store, embeddings, splitter, config: Dict[str, Any]):
+        """Sustituye la colección servida; las consultas en curso terminan con la anterior"""
+        self.collection_name = self.index_state["active"]
+        self.embedding_model = config["embedding_model"]
+        self.vector_backend = config.get("vector_backend", rag_config.vector_backend)
+        self.embeddings = embeddings
+        self.text_splitter = splitter
+        self.vectorstore = store
+        if self.qa_chain is not None:
+            self.setup_qa_chain()
+
+    def _index_sources(self, store, splitter, sources: Dict[str, str]) -> int:
+        """
+        Carga, divide e inserta documentos fuente en una colección; devuelve los chunks.
+        `sources` asocia cada ruta con su `file_name`, que en los blobs de subidas no es
+        el nombre en disco.
+        """
+        total = 0
+        batch_size = 20
+        paths = sorted(sources)
+        for i in range(0, len(paths), batch_size):
+            batch = paths[i:i + batch_size]
+            documents = self.load_documents(batch, display_names=[sources[path] for path in batch])
+            chunks = self.split_documents(documents, splitter)
+            if chunks:
+                store.add_documents(chunks)
+                self._record_chunks(store.backend.collection_name, [c.metadata for c in chunks])
+            total += len(chunks)
+            self.rebuild_status["progress"] = f"{min(i + batch_size, len(paths))}/{len(paths)}"
+        return total
+
+    def _indexed_sources(self) -> Dict[str, str]:
+        """Rutas de los documentos fuente presentes en la colección activa, con su `file_name`"""
+        metadatas = self.vectorstore.decode_metadatas(self.vectorstore.backend.get()["metadatas"])
+        with self._index_lock:
+            removed = set(self._tombstones["file_paths"])
+        return {
+            m["file_path"]: m.get("file_name") or os.path.basename(m["file_path"])
+            for m in metadatas if m.get("file_path") and m["file_path"] not in removed
+        }
+
+    def _validate_collection(self, store, expected: int):
+        """Comprueba que la colección nueva está completa y responde consultas"""
+        backend = store.backend
+        count = backend.count()
+        if count == 0 or count != expected:
+            raise ValueError(f"Validación fallida: {count} chunks en la colección, se esperaban {expected}")
+        sample = backend.get(limit=1, include_embeddings=True)
+        result = backend.query(sample["embeddings"][0], k=1)
+        if not result or result[0].id != sample["ids"][0]:
+            raise ValueError("Validación fallida: la colección no devuelve sus propios vectores")
+
+    def _mark_rebuild_dirty(self, chunks: List[Document]):
+        """Anota las fuentes ingeridas mientras se construye una nueva generación"""
+        if self._rebuild_dirty_sources is not None:
+            self._rebuild_dirty_sources.update(
+                (c.metadata["file_path"], c.metadata.get("file_name") or os.path.basename(c.metadata["file_path"]))
+                for c in chunks if c.metadata.get("file_path")
+            )
+
+    def _make_embeddings(self, model: str) -> CountingEmbeddings:
+        if self.embedding_factory is not None:
+            return CountingEmbeddings(self.embedding_factory(model))
+
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        return CountingEmbeddings(GoogleGenerativeAIEmbeddings(
+            model=model,
+            google_api_key=self.google_api_key
+        ))
+
+    def _make_llm(self):
+        if self.llm_factory is not None:
+            return self.llm_factory(dict(self.llm_config))
+
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(
+            model=self.llm_config["model"],
+            temperature=self.llm_config["temperature"],
+            max_tokens=self.llm_config["max_tokens"],
+            google_api_key=self.google_api_key
+        )
+
+    def _open_collection(self, collection_name: str, embeddings, config: Optional[Dict[str, Any]] = None):
+        """
+        Abre (o crea) una colección como VectorStore de langchain
+        `config` es la configuración de la generación (backend y fragmentación); por
+        defecto la de la generación activa.
+        """
+        from vector_backends import BackendVectorStore, create_backend
+
+        config = config or self.index_state["config"]
+        files = self._get_files() if self._compact_metadata(config) else None
+        backend = create_backend(
+            config.get("vector_backend", rag_config.vector_backend),
+            self.persist_directory,
+            collection_name,
+            shards=config.get("shards", 1),
+            shard_strategy=config.get("shard_strategy", rag_config.shard_strategy),
+            shard_timeout=rag_config.shard_timeout_seconds,
+            route_key=files.path_of if files else None,
+            read_connections=rag_config.vector_read_connections
+        )
+        return BackendVectorStore(backend, embeddings, codec=files)
+
+    def _drop_collection(self, store):
+        try:
+            self._get_catalog().reset_collection(store.backend.collection_name)
+            store.backend.drop()
+        except Exception as e:
+            logger.warning(f"No se pudo eliminar la colección: {str(e)}")
+
+    def _index_state_path(self) -> str:
+        return os.path.join(self.persist_directory, "index_state.json")
+
+    def _load_index_state(self) -> Dict[str, Any]:
+        try:
+            with open(self._index_state_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+        
+        # Generación 0: la colección por defecto de langchain
+        config = {
+            "embedding_model": "models/embedding-001",
+            "vector_backend": rag_config.vector_backend,
+            "shards": rag_config.vector_shards,
+            "shard_strategy": rag_config.shard_strategy,
+            "chunk_size": 1000,
+            "chunk_overlap": 200
+        }
+        from vector_backends import existing_collections
+        
+        # Un índice existente conserva su forma (backend, fragmentos y metadata completa),
+        # sea cual sea la configuración; solo un directorio nuevo usa metadata compacta
+        collections = existing_collections(self.persist_directory)
+        shard_names = [name for name in collections if re.fullmatch(r"langchain_s\d+", name)]
+        if "langchain" in collections:
+            config.update({"vector_backend": collections["langchain"], "shards": 1})
+        elif shard_names:
+            config.update({"vector_backend": collections[shard_names[0]], "shards": len(shard_names)})
+        else:
+            config["metadata_format"] = "compact"
+        return {"generation": 0, "active": "langchain", "previous": None, "config": config}
+
+    def _save_index_state(self):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        tmp_path = self._index_state_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index_state, f, indent=2)
+        os.replace(tmp_path, self._index_state_path())
+
+    def _get_catalog(self):
+        """Catálogo de estadísticas del directorio de persistencia (se abre al primer uso)"""
+        if self._catalog is None:
+            from index_catalog import IndexCatalog
+            
+            with self._index_lock:
+                if self._catalog is None:
+                    self._catalog = IndexCatalog(self.persist_directory)
+        return self._catalog
+
+    def _get_files(self):
+        """Registro de archivos fuente del directorio de persistencia (se abre al primer uso)"""
+        if self._files is None:
+            from file_registry import FileRegistry
+            
+            with self._index_lock:
+                if self._files is None:
+                    self._files = FileRegistry(self.persist_directory)
+        return self._files
+
+    def _get_pdf_cache(self):
+        """Caché de extracción de PDF del directorio de persistencia (se abre al primer uso)"""
+        if self._pdf_cache is None:
+            from pdf_cache import PdfPageCache
+            
+            with self._index_lock:
+                if self._pdf_cache is None:
+                    self._pdf_cache = PdfPageCache(os.path.join(self.persist_directory, "pdf_cache.sqlite3"))
+        return self._pdf_cache
+
+    def _record_chunks(self, collection_name: str, metadatas: List[Dict[str, Any]], dim: int = 0):
+        """Actualiza el catálogo tras una inserción; un fallo no interrumpe la ingesta"""
+        _INGEST_CHUNKS_TOTAL.inc(len(metadatas))
+        if not os.path.exists(self._index_state_path()):
+            # La generación 0 se deduce del directorio mientras no hay estado guardado:
+            # fijarla en la primera escritura para que no se reinterprete al reabrir
+            self._save_index_state()
+        try:
+            self._get_catalog().record_chunks(collection_name, metadatas, dim=dim)
+        except Exception as e:
+            logger.warning(f"No se pudo actualizar el catálogo: {str(e)}")
+
+    def _reconcile_catalog(self):
+        """Recalcula los contadores de la colección activa recorriéndola (una sola vez)"""
+        catalog = self._get_catalog()
+        backend = self.vectorstore.backend
+        with self._index_lock:
+            removed_ids = set(self._tombstones["ids"])
+            removed_paths = set(self._tombstones["file_paths"])
+            found = backend.get()
+            metadatas = [
+                metadata for chunk_id, metadata in zip(found["ids"], self.vectorstore.decode_metadatas(found["metadatas"]))
+                if chunk_id not in removed_ids and metadata.get("file_path") not in removed_paths
+            ]
+            catalog.reset_collection(self.collection_name)
+            last_load = max((m.get("load_time") or 0 for m in metadatas), default=0)
+            catalog.record_chunks(self.collection_name, metadatas, timestamp=last_load or None)
+        logger.info(f"Catálogo recalculado para {self.collection_name}: {len(metadatas)} chunks")
+
+    def indexed_file_paths(self) -> Set[str]:
+        """
+        Rutas de los documentos fuente que algún índice del directorio aún usa (la
+        colección activa y la conservada para rollback), según el catálogo. Un
+        reindexado necesita que sigan en disco.
+        """
+        catalog = self._get_catalog()
+        if self.vectorstore is not None and not catalog.has_collection(self.collection_name):
+            if self.vectorstore.backend.count() > 0:
+                # Base de datos anterior al catálogo
+                self._reconcile_catalog()
+        return catalog.file_paths()
+
+    def get_index_stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas reales del índice activo, leídas del catálogo (sin recorrer la colección)
+        Returns:
+            Chunks, archivos, chunks por archivo, bytes de vectores, tamaño en disco,
+            generación y fecha de la última ingesta
+        """
+        if not self.vectorstore:
+            return {}
+        
+        catalog = self._get_catalog()
+        if not catalog.has_collection(self.collection_name) and self.vectorstore.backend.count() > 0:
+            # Base de datos anterior al catálogo
+            self._reconcile_catalog()
+        
+        stats = catalog.get_stats(self.collection_name)
+        if stats["chunks"] and not stats["vector_dim"]:
+            sample = self.vectorstore.backend.get(limit=1, include_embeddings=True)
+            if sample["embeddings"]:
+                catalog.set_dim(self.collection_name, len(sample["embeddings"][0]))
+                stats = catalog.get_stats(self.collection_name)
+        
+        # El tamaño en disco se recalcula como mucho cada 30 s
+        measured_at, disk_bytes = self._disk_size_cache
+        if time.time() - measured_at > 30:
+            from index_catalog import directory_size
+            
+            disk_bytes = directory_size(self.persist_directory)
+            self._disk_size_cache = (time.time(), disk_bytes)
+        
+        stats.update({"disk_bytes": disk_bytes, "index_generation": self.index_state["generation"]})
+        return stats
+
     def get_database_stats(self) -> Dict[str, Any]:
         """
         Obtiene estadísticas de la base de datos vectorial
@@ -340,23 +1485,84 @@ Respuesta:""",
             stats = {
                 "status": "Base de datos activa",
                 "persist_directory": self.persist_directory,
-                "embedding_model": "models/embedding-001",
+                "embedding_model": self.embedding_model,
+                "collection": self.collection_name,
+                "vector_backend": self.vector_backend,
+                "index_generation": self.index_state["generation"],
                 "llm_model": self.llm_config["model"],
                 "chunk_size": self.text_splitter._chunk_size,
-                "chunk_overlap": self.text_splitter._chunk_overlap
+                "chunk_overlap": self.text_splitter._chunk_overlap,
+                **self.get_index_stats(),
+                **self.embeddings.get_stats()
             }
+            if self._pdf_cache is not None:
+                stats.update(self._pdf_cache.get_stats())
+            if self._files is not None:
+                stats.update(self._files.get_stats())
+            
+            backend = self.vectorstore.backend
+            if hasattr(backend, "shard_counts"):
+                stats.update({
+                    "shard_strategy": backend.strategy,
+                    "shard_chunks": backend.shard_counts(),
+                    "shard_timeouts": backend.stats["shard_timeouts"],
+                    "shard_errors": backend.stats["shard_errors"]
+                })
             
+            stats["memory"] = self.get_memory_report()
             return stats
             
         except Exception as e:
             logger.error(f"Error obteniendo estadísticas: {str(e)}")
             return {"status": f"Error: {str(e)}"}
 
+    def get_memory_report(self) -> Dict[str, Any]:
+        """
+        Bytes aproximados retenidos por cada componente frente a la memoria residente del proceso
+        Returns:
+            Diccionario con 'components' (bytes por componente), 'sessions' (mensajes y bytes
+            por sesión), 'tracked_bytes', 'rss_bytes', 'warning_bytes' y 'warning'
+        """
+        components: Dict[str, int] = {}
+        try:
+            components["vector_index"] = self.vectorstore.backend.memory_bytes() if self.vectorstore else 0
+        except Exception as e:
+            logger.warning(f"No se pudo medir el índice vectorial: {str(e)}")
+            components["vector_index"] = 0
+        # La cadena referencia el vectorstore y los embeddings: se cuentan aparte
+        components["qa_chain"] = deep_sizeof(self.qa_chain, exclude=(self.vectorstore, self.embeddings)) \
+            if self.qa_chain is not None else 0
+        buffers = list(self._ingest_buffers.values())
+        components["ingest_buffers"] = deep_sizeof(buffers) if buffers else 0
+        components["tombstones"] = deep_sizeof(self._tombstones)
+        components.update({f"cache_{name}": size for name, size in module_cache_sizes().items()})
+        
+        sessions = session_history_sizes()
+        components["session_histories"] = sum(session["bytes"] for session in sessions.values())
+        
+        tracked = sum(components.values())
+        rss = current_rss_bytes()
+        warning_bytes = int(rag_config.memory_warning_mb * 1024 * 1024)
+        warning = rss is not None and warning_bytes > 0 and rss >= warning_bytes
+        if warning and not self._memory_warned:
+            # Se avisa al cruzar el umbral, no en cada consulta de estadísticas
+            logger.warning(f"Memoria residente {rss / 1024 / 1024:.0f} MB por encima del umbral "
+                           f"de {rag_config.memory_warning_mb:.0f} MB")
+        self._memory_warned = warning
+        return {
+            "components": components,
+            "sessions": sessions,
+            "tracked_bytes": tracked,
+            "rss_bytes": rss,
+            "warning_bytes": warning_bytes,
+            "warning": warning,
+        }
+
     def update_config(self, config_type: str, new_config: Dict[str, Any]) -> bool:
         """
         Actualiza la configuración del sistema
         Args:
-            config_type: Tipo de configuración ('retrieval' o 'llm')
+            config_type: Tipo de configuración ('retrieval', 'llm' o 'splitter')
             new_config: Nueva configuración
         Returns:
             True si la actualización fue exitosa
@@ -368,6 +1574,13 @@ Respuesta:""",
             elif config_type == "llm":
                 self.llm_config.update(new_config)
                 logger.info("Configuración de LLM actualizada")
+            elif config_type == "splitter":
+                self.text_splitter = make_text_splitter(
+                    chunk_size=new_config.get("chunk_size", self.text_splitter._chunk_size),
+                    chunk_overlap=new_config.get("chunk_overlap", self.text_splitter._chunk_overlap)
+                )
+                logger.info("Configuración del text splitter actualizada")
+                return True
             else:
                 logger.warning(f"Tipo de configuración no reconocido: {config_type}")
                 return False
@@ -0,0 +1,72 @@
+"""
+Grabación opcional de sesiones reales para reproducirlas como prueba de rendimiento
+
+Con `RAG_SESSION_RECORDING=true`, cada interacción (preguntas, documentos
+indexados, re-subidas omitidas y borrados) se añade como una línea JSON a
+`RAG_SESSION_RECORDING_PATH` con su instante, su sesión, su duración y la
+configuración vigente. `session_replay.py` reproduce la grabación contra
+proveedores offline y compara perfiles de latencia y caché entre versiones.
+
+La sesión activa se fija por hilo con `set_current_session` (la app lo hace en
+cada ejecución del script y el endpoint HTTP en cada petición).
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import rag_config
+
+logger = logging.getLogger(__name__)
+
+_current_session: contextvars.ContextVar = contextvars.ContextVar("rag_session_id", default=None)
+
+
+def set_current_session(session_id: Optional[str]):
+    """Fija la sesión a la que se atribuyen los eventos grabados en este hilo"""
+    _current_session.set(session_id)
+
+
+class SessionRecorder:
+    """Añade eventos a un JSONL; cada línea es independiente y se escribe completa"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.events = 0
+
+    def record(self, kind: str, **fields: Any):
+        """Graba un evento; un fallo de escritura nunca interrumpe la interacción"""
+        event: Dict[str, Any] = {"t": round(time.time(), 3), "session": _current_session.get(), "kind": kind}
+        event.update(fields)
+        try:
+            line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                self.events += 1
+        except Exception as e:
+            logger.warning(f"No se pudo grabar el evento '{kind}': {str(e)}")
+
+
+_recorder: Optional[SessionRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_session_recorder() -> Optional[SessionRecorder]:
+    """Grabador compartido por el proceso, o None si la grabación está desactivada"""
+    global _recorder
+    if not rag_config.session_recording_enabled:
+        return None
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = SessionRecorder(rag_config.session_recording_path)
+                logger.info(f"Grabación de sesiones activa en {rag_config.session_recording_path}")
+    return _recorder
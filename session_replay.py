@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Reproducción de sesiones grabadas y comparación de rendimiento entre versiones
+
+`replay` vuelve a ejecutar una grabación de `session_recorder.py` contra un
+índice nuevo con proveedores offline (latencia simulada), respetando el ritmo
+original o acelerándolo (`--speed 10`; `--speed 0` sin esperas). Cada sesión se
+reproduce en su propio hilo y en orden, así que se conservan las preguntas de
+seguimiento y las ráfagas entre sesiones. Se aplican la configuración grabada
+de cada interacción, las indexaciones, las re-subidas y los borrados.
+
+El informe JSON contiene el perfil de latencia por tipo de interacción y por
+tramo (`metrics.span`), el retraso sobre el calendario original y el perfil de
+caché (caché de páginas PDF, re-subidas deduplicadas y llamadas de embedding).
+`diff` compara dos informes, p. ej. de dos commits, y sale con código 1 si hay
+regresiones.
+
+Uso:
+    RAG_SESSION_RECORDING=true streamlit run app.py        # grabar
+    python session_replay.py replay recordings/sessions.jsonl --speed 10 --output antes.json
+    git checkout otra-rama
+    python session_replay.py replay recordings/sessions.jsonl --speed 10 --output despues.json
+    python session_replay.py diff antes.json despues.json --tolerance 0.15
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+from metrics import LatencyHistogram
+
+REPLAYED_KINDS = ("question", "index", "reupload", "remove")
+
+
+def load_recording(path: str) -> List[Dict[str, Any]]:
+    """Eventos de la grabación en orden temporal (se ignoran líneas incompletas)"""
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if event.get("kind") in REPLAYED_KINDS and "t" in event:
+                # `t` es el final de la interacción; se reproduce desde su comienzo
+                event["start"] = event["t"] - (event.get("duration_ms") or 0) / 1000
+                events.append(event)
+    events.sort(key=lambda event: event["start"])
+    return events
+
+
+class Replayer:
+    """Reproduce eventos grabados sobre un RAGSystem y acumula su perfil"""
+
+    def __init__(self, rag, documents_dir: Optional[str] = None):
+        self.rag = rag
+        self.documents_dir = documents_dir
+        self.latency = {kind: LatencyHistogram() for kind in REPLAYED_KINDS}
+        self.lag = LatencyHistogram()
+        self.counts = {kind: {"ok": 0, "error": 0, "skipped": 0} for kind in REPLAYED_KINDS}
+        self.errors: Dict[str, int] = {}
+        self.indexed_paths = set()
+        self.duplicate_indexes = 0
+        # En la app las ingestas no se solapan (control de admisión) y la
+        # configuración es compartida por todas las sesiones
+        self._ingest_lock = threading.Lock()
+        self._config_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _resolve(self, entry: Dict[str, Any]) -> Optional[str]:
+        if entry.get("path") and os.path.exists(entry["path"]):
+            return entry["path"]
+        if self.documents_dir and entry.get("name"):
+            candidate = os.path.join(self.documents_dir, entry["name"])
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def _apply_config(self, config: Optional[Dict[str, Any]]):
+        if not config:
+            return
+        with self._config_lock:
+            index = config.get("index") or {}
+            splitter = {key: index[key] for key in ("chunk_size", "chunk_overlap") if index.get(key)}
+            if splitter and (self.rag.text_splitter._chunk_size, self.rag.text_splitter._chunk_overlap) != (
+                    splitter.get("chunk_size", self.rag.text_splitter._chunk_size),
+                    splitter.get("chunk_overlap", self.rag.text_splitter._chunk_overlap)):
+                self.rag.update_config("splitter", splitter)
+            for config_type, current in (("retrieval", self.rag.retrieval_config), ("llm", self.rag.llm_config)):
+                recorded = config.get(config_type) or {}
+                if any(current.get(key) != value for key, value in recorded.items()):
+                    self.rag.update_config(config_type, recorded)
+
+    def _finish(self, kind: str, status: str, started: float, detail: str = ""):
+        with self._stats_lock:
+            self.counts[kind][status] += 1
+            if status == "ok":
+                self.latency[kind].record(time.perf_counter() - started)
+            elif detail:
+                key = f"{kind}: {detail[:160]}"
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def replay_event(self, event: Dict[str, Any]):
+        kind = event["kind"]
+        self._apply_config(event.get("config"))
+        started = time.perf_counter()
+
+        if kind == "question":
+            rag = self.rag
+            if rag.vectorstore is None:
+                # Si hay una indexación en curso, la pregunta llegó justo después de subir
+                with self._ingest_lock:
+                    pass
+            if rag.vectorstore is None:
+                self._finish(kind, "skipped", started, "sin índice")
+                return
+            if rag.qa_chain is None:
+                with self._config_lock:
+                    if rag.qa_chain is None and not rag.setup_qa_chain():
+                        self._finish(kind, "error", started, "no se pudo configurar la cadena QA")
+                        return
+            response = rag.ask_question(event["question"])
+            self._finish(kind, "error" if response.get("error") else "ok", started,
+                         response["answer"] if response.get("error") else "")
+
+        elif kind == "index":
+            entries = event.get("files") or []
+            paths = [self._resolve(entry) for entry in entries]
+            missing = [entry.get("name") for entry, path in zip(entries, paths) if path is None]
+            paths = [path for path in paths if path]
+            if not paths:
+                self._finish(kind, "skipped", started, f"archivos no encontrados: {', '.join(map(str, missing))}")
+                return
+            with self._ingest_lock:
+                with self._stats_lock:
+                    self.duplicate_indexes += sum(1 for path in paths if path in self.indexed_paths)
+                    self.indexed_paths.update(paths)
+                documents = self.rag.load_documents(paths, display_names=[os.path.basename(p) for p in paths])
+                ok = bool(documents) and self.rag.process_documents(documents)
+            self._finish(kind, "ok" if ok else "error", started, "" if ok else "fallo al indexar")
+
+        elif kind == "reupload":
+            # La app deduplica por contenido: no hay trabajo, solo se cuenta
+            self._finish(kind, "ok", started)
+
+        elif kind == "remove":
+            with self._ingest_lock:
+                self.rag.remove_documents(event.get("files") or [])
+            self._finish(kind, "ok", started)
+
+    def run(self, events: List[Dict[str, Any]], speed: float) -> float:
+        """Reproduce los eventos; cada sesión en su hilo, en el orden y ritmo grabados"""
+        sessions: Dict[Any, List[Dict[str, Any]]] = OrderedDict()
+        for event in events:
+            sessions.setdefault(event.get("session"), []).append(event)
+        first = events[0]["start"] if events else 0.0
+        start = time.perf_counter()
+
+        def play(session_events: List[Dict[str, Any]]):
+            for event in session_events:
+                scheduled = (event["start"] - first) / speed if speed > 0 else 0.0
+                delay = start + scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if speed > 0:
+                    self.lag.record(max(0.0, time.perf_counter() - start - scheduled))
+                try:
+                    self.replay_event(event)
+                except Exception as e:
+                    self._finish(event["kind"], "error", time.perf_counter(), str(e))
+
+        threads = [threading.Thread(target=play, args=(session_events,), daemon=True)
+                   for session_events in sessions.values()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def cache_profile(self) -> Dict[str, Any]:
+        stats = self.rag.get_database_stats()
+        hits, misses = stats.get("pdf_cache_hits", 0), stats.get("pdf_cache_misses", 0)
+        return {
+            "pdf_cache_hits": hits,
+            "pdf_cache_misses": misses,
+            "pdf_cache_hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            "reuploads_deduplicated": self.counts["reupload"]["ok"],
+            "duplicate_indexes": self.duplicate_indexes,
+            **self.rag.embeddings.get_stats(),
+        }
+
+
+def replay(args) -> int:
+    import logging
+
+    logging.disable(logging.ERROR)
+    from bench_ingest import git_commit
+    from metrics import get_span_recorder
+    from offline_providers import build_offline_rag
+
+    events = load_recording(args.recording)
+    if not events:
+        print(f"No hay eventos reproducibles en {args.recording}", file=sys.stderr)
+        return 2
+    random.seed(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="rag_replay_")
+    try:
+        rag = build_offline_rag(os.path.join(workdir, "index"), args.preload, args.embed_latency_ms,
+                                args.llm_latency_ms, args.llm_jitter, args.llm_error_rate)
+        spans = get_span_recorder()
+        spans.reset()
+        replayer = Replayer(rag, args.documents)
+        sessions = len({event.get("session") for event in events})
+        span_seconds = events[-1]["t"] - events[0]["start"]
+        print(f"Reproduciendo {len(events)} eventos de {sessions} sesiones "
+              f"({span_seconds:.0f} s grabados, velocidad {'máxima' if args.speed <= 0 else f'x{args.speed:g}'})")
+        elapsed = replayer.run(events, args.speed)
+
+        report = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": git_commit(),
+            "recording": os.path.abspath(args.recording),
+            "params": {key: value for key, value in vars(args).items() if key not in ("func", "output")},
+            "events": len(events),
+            "sessions": sessions,
+            "elapsed_seconds": round(elapsed, 2),
+            "latency": {kind: {**replayer.latency[kind].summary(), **replayer.counts[kind]}
+                        for kind in REPLAYED_KINDS},
+            "schedule_lag": replayer.lag.summary(),
+            "spans": spans.summary(),
+            "cache": replayer.cache_profile(),
+            "errors": replayer.errors,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\nReproducción completada en {report['elapsed_seconds']} s")
+    for kind, stats in report["latency"].items():
+        if stats["ok"] or stats["error"] or stats["skipped"]:
+            print(f"  {kind:10s} ok {stats['ok']:5d}  errores {stats['error']:4d}  omitidos {stats['skipped']:4d}  "
+                  f"p50 {stats['p50_ms']:9.1f} ms  p95 {stats['p95_ms']:9.1f} ms")
+    print(f"  retraso sobre el calendario: p95 {report['schedule_lag']['p95_ms']} ms, "
+          f"máx {report['schedule_lag']['max_ms']} ms")
+    print(f"  caché: {json.dumps(report['cache'], ensure_ascii=False)}")
+    for error, count in sorted(report["errors"].items(), key=lambda item: -item[1])[:5]:
+        print(f"  {count:5d}  {error}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nInforme guardado en {args.output}")
+    return 0
+
+
+def _change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old
+
+
+def diff(args) -> int:
+    with open(args.before, "r", encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, "r", encoding="utf-8") as f:
+        after = json.load(f)
+    regressions = []
+
+    print(f"Antes:   {before.get('git_commit') or '?'} ({before.get('created_at')})")
+    print(f"Después: {after.get('git_commit') or '?'} ({after.get('created_at')})")
+
+    def compare_latency(section: str, label: str, names: List[str]):
+        print(f"\n{label}:")
+        for name in names:
+            old, new = before[section].get(name), after[section].get(name)
+            if not old or not new or not old.get("count") or not new.get("count"):
+                continue
+            cells = []
+            for metric in ("p50_ms", "p95_ms"):
+                change = _change(old[metric], new[metric])
+                cells.append(f"{metric} {old[metric]:9.1f} -> {new[metric]:9.1f}"
+                             + (f" ({change:+.1%})" if change is not None else ""))
+                if (metric == "p95_ms" and change is not None and change > args.tolerance
+                        and new[metric] - old[metric] > args.min_delta_ms):
+                    regressions.append(f"{label.lower()} {name}: p95 {old[metric]} -> {new[metric]} ms ({change:+.1%})")
+            print(f"  {name:12s} " + "  ".join(cells))
+
+    compare_latency("latency", "Latencia por interacción", list(REPLAYED_KINDS))
+    compare_latency("spans", "Latencia por tramo", sorted(set(before["spans"]) | set(after["spans"])))
+
+    print("\nCaché:")
+    for key in sorted(set(before["cache"]) | set(after["cache"])):
+        old, new = before["cache"].get(key), after["cache"].get(key)
+        print(f"  {key:24s} {old!s:>10} -> {new!s:<10}")
+    old_rate, new_rate = before["cache"].get("pdf_cache_hit_rate"), after["cache"].get("pdf_cache_hit_rate")
+    if old_rate is not None and new_rate is not None and old_rate - new_rate > args.tolerance:
+        regressions.append(f"tasa de aciertos de la caché PDF {old_rate:.1%} -> {new_rate:.1%}")
+    old_calls, new_calls = before["cache"].get("embedded_texts"), after["cache"].get("embedded_texts")
+    change = _change(old_calls, new_calls)
+    if change is not None and change > args.tolerance:
+        regressions.append(f"textos enviados a embeddings {old_calls} -> {new_calls} ({change:+.1%})")
+
+    if regressions:
+        print("\nRegresiones:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nSin regresiones por encima de la tolerancia")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Reproduce sesiones grabadas y compara versiones")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("replay", help="Reproduce una grabación con proveedores offline")
+    run.add_argument("recording", help="JSONL grabado con RAG_SESSION_RECORDING=true")
+    run.add_argument("--speed", type=float, default=1.0, help="Factor de aceleración (0 = sin esperas)")
+    run.add_argument("--documents", default=None, help="Directorio donde buscar por nombre los archivos que ya no existen")
+    run.add_argument("--preload", default=None, help="Directorio a indexar antes de reproducir (índice previo)")
+    run.add_argument("--embed-latency-ms", type=float, default=50.0)
+    run.add_argument("--llm-latency-ms", type=float, default=800.0)
+    run.add_argument("--llm-jitter", type=float, default=0.3)
+    run.add_argument("--llm-error-rate", type=float, default=0.0)
+    run.add_argument("--seed", type=int, default=0, help="Semilla de la latencia simulada")
+    run.add_argument("--output", default=None, help="Archivo JSON con el informe")
+    run.set_defaults(func=replay)
+
+    compare = commands.add_parser("diff", help="Compara dos informes de reproducción")
+    compare.add_argument("before")
+    compare.add_argument("after")
+    compare.add_argument("--tolerance", type=float, default=0.15, help="Empeoramiento relativo tolerado")
+    compare.add_argument("--min-delta-ms", type=float, default=5.0,
+                         help="Empeoramiento absoluto mínimo para contar una regresión de latencia")
+    compare.set_defaults(func=diff)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Ajuste automático de chunk_size, chunk_overlap, k, search_type y modelo
+
+Recorre una rejilla de configuraciones contra un conjunto de preguntas de
+referencia (JSONL con `question` y `expected_sources`, los nombres de archivo
+que deberían recuperarse) y mide para cada una la latencia de respuesta, los
+tokens del prompt (estimados, ~4 caracteres por token) y la tasa de acierto de
+la recuperación (preguntas con al menos una fuente esperada entre las
+recuperadas). Imprime y exporta las configuraciones Pareto-óptimas en el
+formato de importación de Configuración (`{"rag_config": {...}}`).
+
+El barrido es barato: los documentos se cargan una sola vez (con la caché de
+páginas PDF de `--cache-dir`), cada combinación de chunking se indexa una vez
+para todas las de k, búsqueda y modelo, y los embeddings se guardan en una
+caché SQLite por texto y modelo que se reutiliza entre ejecuciones.
+
+Uso:
+    python tune_rag.py golden.jsonl documents/ --export-dir tuned/
+    python tune_rag.py golden.jsonl documents/ --offline --chunk-sizes 500 1000 --k 2 4 6
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from itertools import product
+from typing import Any, Dict, List, Optional, Sequence
+
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import numpy as np
+
+from bench_ingest import git_commit
+from config import AppConfig, RAGConfig, rag_config
+from metrics import LatencyHistogram
+from query_log import estimate_tokens
+
+logger = logging.getLogger("tune_rag")
+
+DEFAULT_MODEL_LATENCY_MS = {"gemini-1.5-flash": 400.0, "gemini-1.5-pro": 1200.0}
+
+
+class CachedEmbeddings:
+    """
+    Embeddings con caché persistente en SQLite por (modelo, tipo, texto).
+    Los chunks que se repiten entre configuraciones y las preguntas que se
+    repiten entre combinaciones solo se envían al modelo una vez.
+    """
+
+    def __init__(self, inner, conn: sqlite3.Connection, lock: threading.Lock, model: str):
+        self.inner = inner
+        self.model = model
+        self._conn = conn
+        self._lock = lock
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _embed(self, kind: str, texts: List[str], compute) -> List[List[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update((key, np.frombuffer(blob, dtype=np.float32).tolist()) for key, blob in rows)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = compute([texts[i] for i in missing])
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                    [(keys[i], np.asarray(vector, dtype=np.float32).tobytes()) for i, vector in zip(missing, vectors)]
+                )
+            found.update((keys[i], list(vector)) for i, vector in zip(missing, vectors))
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed("document", texts, self.inner.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed("query", [text], lambda texts: [self.inner.embed_query(texts[0])])[0]
+
+
+class EmbeddingCache:
+    """Archivo de caché compartido por todos los modelos de embeddings del barrido"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.wrappers: List[CachedEmbeddings] = []
+
+    def wrap(self, inner, model: str) -> CachedEmbeddings:
+        wrapper = CachedEmbeddings(inner, self._conn, self._lock, model)
+        self.wrappers.append(wrapper)
+        return wrapper
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(wrapper.hits for wrapper in self.wrappers)
+        misses = sum(wrapper.misses for wrapper in self.wrappers)
+        return {"hits": hits, "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0}
+
+
+def load_golden(path: str) -> List[Dict[str, Any]]:
+    """Preguntas de referencia: `question` y `expected_sources` (o `expected_source`)"""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            expected = record.get("expected_sources") or record.get("expected_source") or []
+            if isinstance(expected, str):
+                expected = [expected]
+            questions.append({"question": record["question"], "expected": {os.path.basename(s) for s in expected}})
+    if not questions:
+        raise ValueError(f"No hay preguntas en {path}")
+    return questions
+
+
+def make_factories(args, cache: EmbeddingCache):
+    """Fábricas de embeddings (con caché) y de LLM, reales u offline"""
+    if args.offline:
+        from offline_providers import HashEmbeddings, SimulatedChatModel
+
+        latencies = dict(DEFAULT_MODEL_LATENCY_MS)
+        for item in args.offline_model_latency or []:
+            model, _, value = item.partition("=")
+            latencies[model] = float(value)
+
+        def embedding_factory(model: str):
+            # Clave propia: los vectores por hashing no deben mezclarse con los del modelo real
+            return cache.wrap(HashEmbeddings(call_latency_ms=args.embed_latency_ms), f"offline-hash:{model}")
+
+        def llm_factory(config: Dict[str, Any]):
+            return SimulatedChatModel(latency_ms=latencies.get(config["model"], 800.0), jitter=args.llm_jitter)
+
+        return embedding_factory, llm_factory
+
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY no está configurada (usa --offline para un barrido sin API)")
+
+    def embedding_factory(model: str):
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        return cache.wrap(GoogleGenerativeAIEmbeddings(model=model, google_api_key=api_key), model)
+
+    # None: RAGSystem crea el modelo de Gemini de llm_config
+    return embedding_factory, None
+
+
+def prompt_tokens(rag, question: str, documents: list) -> int:
+    """Tokens estimados del prompt que recibe el LLM (plantilla, contexto y pregunta)"""
+    context = "\n\n".join(doc.page_content for doc in documents)
+    try:
+        prompt = rag.qa_chain.combine_documents_chain.llm_chain.prompt.format(context=context, question=question)
+    except Exception:
+        prompt = f"{context}\n{question}"
+    return estimate_tokens(prompt)
+
+
+def evaluate(rag, golden: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Responde las preguntas de referencia con la configuración activa de `rag`"""
+    latency = LatencyHistogram()
+    tokens, hits, recalls, errors = [], 0, [], 0
+    for item in golden:
+        start = time.perf_counter()
+        response = rag.ask_question(item["question"])
+        elapsed = time.perf_counter() - start
+        if response.get("error"):
+            errors += 1
+            continue
+        latency.record(elapsed)
+        documents = response["source_documents"]
+        found = {doc.metadata.get("file_name") or os.path.basename(doc.metadata.get("source", ""))
+                 for doc in documents}
+        tokens.append(prompt_tokens(rag, item["question"], documents))
+        if item["expected"]:
+            hits += bool(found & item["expected"])
+            recalls.append(len(found & item["expected"]) / len(item["expected"]))
+    scored = sum(1 for item in golden if item["expected"])
+    summary = latency.summary()
+    return {
+        "latency_p50_ms": summary["p50_ms"],
+        "latency_p95_ms": summary["p95_ms"],
+        "latency_mean_ms": summary["mean_ms"],
+        "prompt_tokens": round(float(np.mean(tokens)), 1) if tokens else None,
+        "hit_rate": round(hits / scored, 4) if scored else None,
+        "source_recall": round(float(np.mean(recalls)), 4) if recalls else None,
+        "errors": errors,
+    }
+
+
+def pareto_front(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Configuraciones no dominadas: menor latencia p50, menos tokens y mayor tasa de acierto"""
+    def objectives(result):
+        metrics = result["metrics"]
+        return (metrics["latency_p50_ms"], metrics["prompt_tokens"], -(metrics["hit_rate"] or 0.0))
+
+    candidates = [r for r in results if r["metrics"]["prompt_tokens"] is not None]
+    front = []
+    for result in candidates:
+        own = objectives(result)
+        dominated = any(
+            all(o <= s for o, s in zip(objectives(other), own)) and objectives(other) != own
+            for other in candidates
+        )
+        if not dominated:
+            front.append(result)
+    return sorted(front, key=lambda r: (-(r["metrics"]["hit_rate"] or 0.0), r["metrics"]["latency_p50_ms"]))
+
+
+def settings_export(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Configuración en el formato de importación de la página de Configuración"""
+    defaults = RAGConfig()
+    return {
+        "rag_config": {
+            "chunk_size": config["chunk_size"],
+            "chunk_overlap": config["chunk_overlap"],
+            "embedding_model": config["embedding_model"],
+            "k": config["k"],
+            "search_type": config["search_type"],
+            "score_threshold": config["score_threshold"],
+            "llm_model": config["llm_model"],
+            "temperature": defaults.temperature,
+            "max_tokens": defaults.max_tokens,
+        }
+    }
+
+
+def run_sweep(args, golden: List[Dict[str, Any]]) -> Dict[str, Any]:
+    from rag_system import RAGSystem
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    cache = EmbeddingCache(os.path.join(args.cache_dir, "embeddings.sqlite3"))
+    embedding_factory, llm_factory = make_factories(args, cache)
+
+    # Documentos cargados una vez; los PDF pasan por la caché de páginas de cache_dir
+    loader = RAGSystem(persist_directory=args.cache_dir, embedding_factory=embedding_factory,
+                       llm_factory=llm_factory)
+    paths = sorted(
+        os.path.join(args.documents, name) for name in os.listdir(args.documents)
+        if os.path.splitext(name)[1].lower() in rag_config.supported_formats
+    )
+    start = time.perf_counter()
+    documents = loader.load_documents(paths)
+    if not documents:
+        raise ValueError(f"No se cargaron documentos de {args.documents}")
+    # Sin índice cargado, get_database_stats no incluye la caché de páginas
+    page_stats = loader._pdf_cache.get_stats() if loader._pdf_cache is not None else {}
+    print(f"{len(documents)} páginas/documentos de {len(paths)} archivos en {time.perf_counter() - start:.1f} s "
+          f"({page_stats.get('pdf_cache_hits', 0)} páginas PDF desde caché)")
+
+    results = []
+    for chunk_size, chunk_overlap in product(args.chunk_sizes, args.chunk_overlaps):
+        if chunk_overlap >= chunk_size:
+            continue
+        directory = tempfile.mkdtemp(prefix="rag_tune_")
+        try:
+            rag = RAGSystem(persist_directory=directory, embedding_factory=embedding_factory,
+                            llm_factory=llm_factory)
+            rag.update_config("splitter", {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap})
+            start = time.perf_counter()
+            if not rag.process_documents(documents):
+                print(f"  chunk {chunk_size}/{chunk_overlap}: no se pudo indexar")
+                continue
+            index_seconds = time.perf_counter() - start
+            chunks = rag.vectorstore.backend.count()
+            print(f"chunk_size {chunk_size}, overlap {chunk_overlap}: {chunks} chunks en {index_seconds:.1f} s")
+
+            for k, search_type, model in product(args.k, args.search_types, args.models):
+                rag.update_config("retrieval", {"k": k, "search_type": search_type,
+                                                "score_threshold": args.score_threshold})
+                rag.update_config("llm", {"model": model})
+                if rag.qa_chain is None and not rag.setup_qa_chain():
+                    print(f"  k={k} {search_type} {model}: no se pudo configurar la cadena QA")
+                    continue
+                config = {
+                    "chunk_size": chunk_size, "chunk_overlap": chunk_overlap,
+                    "embedding_model": rag.embedding_model, "k": k, "search_type": search_type,
+                    "score_threshold": args.score_threshold, "llm_model": model,
+                }
+                metrics = evaluate(rag, golden)
+                results.append({"config": config, "metrics": metrics, "chunks": chunks,
+                                "index_seconds": round(index_seconds, 2)})
+                hit_rate = f"{metrics['hit_rate']:.2f}" if metrics["hit_rate"] is not None else " n/d"
+                tokens = f"{metrics['prompt_tokens']:.0f}" if metrics["prompt_tokens"] is not None else "n/d"
+                print(f"  k={k:<2d} {search_type:26s} {model:18s} p50 {metrics['latency_p50_ms']:8.1f} ms  "
+                      f"tokens {tokens:>6s}  acierto {hit_rate}  errores {metrics['errors']}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return {"results": results, "embedding_cache": cache.stats(),
+            "pdf_cache": {key: page_stats.get(key, 0) for key in ("pdf_cache_hits", "pdf_cache_misses")}}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Barrido de configuraciones con frente de Pareto latencia/calidad")
+    parser.add_argument("golden", help="JSONL con `question` y `expected_sources`")
+    parser.add_argument("documents", help="Directorio de documentos a indexar")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[500, 1000, 1500])
+    parser.add_argument("--chunk-overlaps", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 4, 6])
+    parser.add_argument("--search-types", nargs="+", choices=AppConfig.SEARCH_TYPES, default=["similarity", "mmr"])
+    parser.add_argument("--models", nargs="+", default=["gemini-1.5-flash", "gemini-1.5-pro"])
+    parser.add_argument("--score-threshold", type=float, default=rag_config.score_threshold)
+    parser.add_argument("--cache-dir", default="./tuning_cache",
+                        help="Caché de páginas PDF y embeddings reutilizada entre ejecuciones")
+    parser.add_argument("--offline", action="store_true",
+                        help="Proveedores offline: embeddings por hashing y LLM con latencia simulada por modelo")
+    parser.add_argument("--offline-model-latency", nargs="*", metavar="MODELO=MS",
+                        help="Con --offline: latencia media por modelo (por defecto flash=400, pro=1200)")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Con --offline: latencia de embeddings")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="Con --offline: dispersión lognormal del LLM")
+    parser.add_argument("--output", default=None, help="Archivo JSON con todos los resultados")
+    parser.add_argument("--export-dir", default=None,
+                        help="Directorio donde escribir cada configuración Pareto-óptima para importarla")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        golden = load_golden(args.golden)
+        sweep = run_sweep(args, golden)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    front = pareto_front(sweep["results"])
+    print(f"\n=== Frente de Pareto ({len(front)} de {len(sweep['results'])} configuraciones) ===")
+    for rank, result in enumerate(front, 1):
+        config, metrics = result["config"], result["metrics"]
+        print(f"{rank:2d}. chunk {config['chunk_size']}/{config['chunk_overlap']}  k={config['k']}  "
+              f"{config['search_type']}  {config['llm_model']}: p50 {metrics['latency_p50_ms']:.1f} ms, "
+              f"tokens {metrics['prompt_tokens']:.0f}, acierto {metrics['hit_rate']}")
+    cache = sweep["embedding_cache"]
+    print(f"Caché de embeddings: {cache['hits']} aciertos, {cache['misses']} llamadas al modelo "
+          f"(tasa {cache['hit_rate']:.0%})")
+
+    if args.export_dir:
+        os.makedirs(args.export_dir, exist_ok=True)
+        for rank, result in enumerate(front, 1):
+            path = os.path.join(args.export_dir, f"pareto_{rank:02d}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(settings_export(result["config"]), f, indent=2)
+        print(f"Configuraciones exportadas en {args.export_dir} (importables desde Configuración)")
+
+    if args.output:
+        report = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": git_commit(),
+            "params": {key: value for key, value in vars(args).items() if key not in ("output", "export_dir")},
+            "questions": len(golden),
+            **sweep,
+            "pareto": [result["config"] for result in front],
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,9 +4,8 @@ Utilidades y funciones auxiliares para el sistema RAG
 
 import os
 import json
-import pandas as pd
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set
 import streamlit as st
 import time
 
@@ -53,24 +52,39 @@ def export_chat_history(chat_history: List[Dict], format_type: str = "json") ->
         return "\n".join(output)
     
     elif format_type == "csv":
+        import pandas as pd
+
         df = pd.DataFrame(chat_history)
         return df.to_csv(index=False)
     
     else:
         raise ValueError(f"Formato no soportado: {format_type}")
 
-def clean_temp_files(temp_dir: str, max_age_hours: int = 24):
+def clean_temp_files(temp_dir: str, max_age_hours: int = 24, keep_paths: Optional[Set[str]] = None):
     """
     Limpia archivos temporales antiguos
+    Los blobs del almacén de subidas solo se eliminan si ningún documento
+    indexado los referencia; los archivos de `keep_paths` (p. ej. los que
+    devuelve `RAGSystem.indexed_file_paths`) nunca se eliminan.
     """
     if not os.path.exists(temp_dir):
         return
     
+    from blob_store import get_blob_store
+    
     current_time = time.time()
     max_age_seconds = max_age_hours * 3600
+    keep = {os.path.abspath(path) for path in keep_paths or ()}
+    
+    removed = get_blob_store(temp_dir).collect_garbage(max_age_seconds, keep_paths=keep)
+    if removed:
+        st.info(f"Blobs sin referencias eliminados: {len(removed)}")
     
+    # Archivos sueltos guardados por nombre en versiones anteriores
     for filename in os.listdir(temp_dir):
         file_path = os.path.join(temp_dir, filename)
+        if filename.startswith("blobs") or os.path.abspath(file_path) in keep:
+            continue
         if os.path.isfile(file_path):
             file_age = current_time - os.path.getmtime(file_path)
             if file_age > max_age_seconds:
@@ -280,6 +294,7 @@ def initialize_session_state():
     default_values = {
         'chat_history': [],
         'processed_documents': [],
+        'document_blobs': {},
         'total_questions': 0,
         'total_docs': 0,
         'current_theme': 'default',
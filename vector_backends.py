@@ -0,0 +1,840 @@
+"""
+Backends de almacenamiento vectorial para el sistema RAG
+
+Define una interfaz mínima (insertar por lotes, borrar por filtro, top-k con
+puntuación, conteo y snapshot) con dos implementaciones: Chroma y un backend
+embebido SQLite + NumPy. `ShardedBackend` reparte un índice entre varios
+backends con búsqueda en paralelo. `BackendVectorStore` adapta cualquier backend a la
+interfaz VectorStore de langchain para usarlo como retriever.
+
+Las puntuaciones son distancias L2 al cuadrado (menor es más parecido), igual
+que el espacio por defecto de Chroma. Los filtros usan la sintaxis `where` de
+Chroma ($eq, $ne, $gt, $gte, $lt, $lte, $and, $or); el backend SQLite acepta
+además $in y $nin, que Chroma 0.4.8 no soporta.
+"""
+
+import heapq
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import urllib.request
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+class QueryResult(NamedTuple):
+    """Resultado de una búsqueda top-k"""
+    id: str
+    text: str
+    metadata: Dict[str, Any]
+    distance: float
+    embedding: Optional[List[float]] = None
+
+
+class VectorBackend(ABC):
+    """Interfaz común de los backends de almacenamiento vectorial"""
+
+    name = "base"
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], texts: List[str],
+               metadatas: List[Dict[str, Any]]) -> None:
+        """Inserta o reemplaza un lote de chunks"""
+
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        """Borra por ids, por filtro de metadata, o por ambos"""
+
+    @abstractmethod
+    def query(self, embedding: List[float], k: int, where: Optional[Dict[str, Any]] = None,
+              include_embeddings: bool = False) -> List[QueryResult]:
+        """Devuelve los k chunks más cercanos, ordenados por distancia ascendente"""
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, include_embeddings: bool = False) -> Dict[str, list]:
+        """Obtiene chunks por id o filtro: {'ids', 'texts', 'metadatas', 'embeddings'}"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Número de chunks almacenados"""
+
+    @abstractmethod
+    def snapshot(self, batch_size: int = 1000) -> Iterator[Dict[str, list]]:
+        """Recorre todo el contenido en lotes {'ids', 'texts', 'metadatas', 'embeddings'}"""
+
+    @abstractmethod
+    def drop(self) -> None:
+        """Elimina la colección y sus datos"""
+
+    def vacuum(self) -> None:
+        """Recupera el espacio en disco liberado por borrados (opcional)"""
+
+    def memory_bytes(self) -> int:
+        """Bytes aproximados que el backend mantiene en memoria (0 si no lo sabe estimar)"""
+        return 0
+
+
+def _vacuum_sqlite_file(db_path: str):
+    """VACUUM sobre un archivo SQLite con una conexión propia (mejor esfuerzo)"""
+    if not os.path.exists(db_path):
+        return
+    try:
+        connection = sqlite3.connect(db_path, timeout=30)
+        try:
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+    except Exception as e:
+        logger.warning(f"No se pudo compactar {db_path}: {str(e)}")
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evalúa un filtro `where` con la semántica de Chroma sobre la metadata de un chunk"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key not in metadata:
+            # Como en Chroma, cualquier condición (incluso $ne) excluye los chunks sin la clave
+            return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, expected in condition.items():
+                if not _compare(value, op, expected):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _compare(value: Any, op: str, expected: Any) -> bool:
+    if op == "$eq":
+        return value == expected
+    if op == "$ne":
+        return value != expected
+    if op == "$in":
+        return value in expected
+    if op == "$nin":
+        return value not in expected
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > expected
+    if op == "$gte":
+        return value >= expected
+    if op == "$lt":
+        return value < expected
+    if op == "$lte":
+        return value <= expected
+    raise ValueError(f"Operador de filtro no soportado: {op}")
+
+
+# Un cliente de Chroma por directorio: cada cliente mantiene su propia copia del
+# índice HNSW en memoria y dos clientes sobre el mismo directorio divergen
+_chroma_clients: Dict[str, Any] = {}
+_chroma_clients_lock = threading.Lock()
+
+
+def _get_chroma_client(persist_directory: str):
+    import chromadb
+    from chromadb.config import Settings
+
+    key = os.path.abspath(persist_directory)
+    with _chroma_clients_lock:
+        if key not in _chroma_clients:
+            _chroma_clients[key] = chromadb.PersistentClient(
+                path=persist_directory,
+                settings=Settings(anonymized_telemetry=False)
+            )
+        return _chroma_clients[key]
+
+
+class ChromaBackend(VectorBackend):
+    """Backend sobre una colección persistente de Chroma"""
+
+    name = "chroma"
+    # Límite conservador de filas por llamada (Chroma usa parámetros SQLite)
+    max_batch = 5000
+
+    def __init__(self, persist_directory: str, collection_name: str):
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self._client = _get_chroma_client(persist_directory)
+        self._collection = self._client.get_or_create_collection(collection_name, embedding_function=None)
+
+    def upsert(self, ids, embeddings, texts, metadatas):
+        for i in range(0, len(ids), self.max_batch):
+            self._collection.upsert(
+                ids=ids[i:i + self.max_batch],
+                embeddings=[list(map(float, e)) for e in embeddings[i:i + self.max_batch]],
+                documents=texts[i:i + self.max_batch],
+                metadatas=metadatas[i:i + self.max_batch]
+            )
+
+    def delete(self, ids=None, where=None):
+        if ids is not None:
+            for i in range(0, len(ids), self.max_batch):
+                self._collection.delete(ids=ids[i:i + self.max_batch], where=where or None)
+        elif where:
+            self._collection.delete(where=where)
+
+    def query(self, embedding, k, where=None, include_embeddings=False):
+        total = self._collection.count()
+        if total == 0 or k <= 0:
+            return []
+        include = ["documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
+        try:
+            result = self._collection.query(
+                query_embeddings=[list(map(float, embedding))],
+                n_results=min(k, total),
+                where=where or None,
+                include=include
+            )
+        except Exception as e:
+            # Chroma 0.4 falla si el filtro deja menos candidatos que n_results
+            if "contigious" in str(e) or "Cannot return the results" in str(e):
+                matching = len(self._collection.get(where=where or None, include=[])["ids"])
+                if matching == 0:
+                    return []
+                result = self._collection.query(
+                    query_embeddings=[list(map(float, embedding))],
+                    n_results=min(k, matching),
+                    where=where or None,
+                    include=include
+                )
+            else:
+                raise
+        embeddings = result["embeddings"][0] if include_embeddings else None
+        return [
+            QueryResult(
+                id=result["ids"][0][i],
+                text=result["documents"][0][i],
+                metadata=result["metadatas"][0][i] or {},
+                distance=float(result["distances"][0][i]),
+                embedding=list(embeddings[i]) if embeddings is not None else None
+            )
+            for i in range(len(result["ids"][0]))
+        ]
+
+    def _get_page(self, ids=None, where=None, limit=None, offset=None, include_embeddings=False):
+        if include_embeddings:
+            # Chroma 0.4.8 devuelve todos los vectores si la página queda vacía y
+            # falla tras borrados: se resuelven primero los ids
+            ids = self._collection.get(ids=ids, where=where or None, limit=limit,
+                                       offset=offset, include=[])["ids"]
+            if not ids:
+                return {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+            where = limit = offset = None
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        return self._collection.get(ids=ids, where=where or None, limit=limit,
+                                    offset=offset, include=include)
+
+    def get(self, ids=None, where=None, limit=None, include_embeddings=False):
+        result = self._get_page(ids=ids, where=where, limit=limit, include_embeddings=include_embeddings)
+        return {
+            "ids": result["ids"],
+            "texts": result["documents"],
+            "metadatas": result["metadatas"],
+            "embeddings": [list(e) for e in result["embeddings"]] if include_embeddings else None
+        }
+
+    def count(self):
+        return self._collection.count()
+
+    def snapshot(self, batch_size=1000):
+        offset = 0
+        while True:
+            result = self._get_page(limit=batch_size, offset=offset, include_embeddings=True)
+            if not result["ids"]:
+                return
+            yield {
+                "ids": result["ids"],
+                "texts": result["documents"],
+                "metadatas": result["metadatas"],
+                "embeddings": [list(e) for e in result["embeddings"]]
+            }
+            offset += len(result["ids"])
+
+    def drop(self):
+        try:
+            self._client.delete_collection(self.collection_name)
+        except ValueError:
+            # La colección ya no existía
+            pass
+
+    def vacuum(self):
+        _vacuum_sqlite_file(os.path.join(self.persist_directory, "chroma.sqlite3"))
+
+    # Enlaces del grafo HNSW (M=16 por defecto, el doble en la capa 0) y etiquetas por elemento
+    HNSW_OVERHEAD_BYTES = 2 * 16 * 4 + 64
+
+    def memory_bytes(self):
+        # Chroma carga el índice HNSW completo: vector float32 más sus enlaces por chunk
+        total = self._collection.count()
+        if total == 0:
+            return 0
+        sample = self._collection.get(limit=1, include=["embeddings"])
+        dim = len(sample["embeddings"][0]) if sample["embeddings"] else 0
+        return total * (dim * 4 + self.HNSW_OVERHEAD_BYTES)
+
+
+class ReadConnectionPool:
+    """
+    Conexiones SQLite de solo lectura compartidas entre hilos.
+    Con WAL, los lectores no esperan al escritor ni entre sí; el pool limita
+    cuántas lecturas van en paralelo y reutiliza las conexiones abiertas.
+    """
+
+    def __init__(self, path: str, size: int = 4):
+        self.uri = "file:" + urllib.request.pathname2url(os.path.abspath(path)) + "?mode=ro"
+        self.size = max(1, size)
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._closed = False
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False, timeout=30)
+            try:
+                yield conn
+            finally:
+                if self._closed:
+                    conn.close()
+                else:
+                    self._idle.put(conn)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class SQLiteNumpyBackend(VectorBackend):
+    """
+    Backend embebido: los chunks viven en SQLite (modo WAL) y la búsqueda es
+    exacta por fuerza bruta con NumPy sobre una matriz float32 en memoria, que
+    se recarga de forma perezosa tras cada escritura.
+
+    Las escrituras pasan por una única conexión protegida por un lock; las
+    lecturas usan un pool de conexiones de solo lectura y la matriz en memoria
+    sin tomar ese lock, de modo que las búsquedas concurrentes no se encolan.
+    """
+
+    name = "sqlite_numpy"
+
+    def __init__(self, persist_directory: str, collection_name: str, read_connections: int = 4):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self.path = os.path.join(persist_directory, f"{collection_name}.vectors.sqlite3")
+        # Lock del escritor; las lecturas no lo toman
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id TEXT PRIMARY KEY,"
+            " text TEXT NOT NULL,"
+            " metadata TEXT NOT NULL,"
+            " embedding BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        self._readers = ReadConnectionPool(self.path, read_connections)
+        # Cada escritura confirmada incrementa la versión e invalida la matriz en memoria
+        self._version = 0
+        self._cache_lock = threading.Lock()
+        # (versión, ids, matriz, normas al cuadrado, metadatas) o None si hay que recargar
+        self._cache: Optional[Tuple[int, List[str], np.ndarray, np.ndarray, List[Dict[str, Any]]]] = None
+
+    def _load_cache(self) -> Tuple[List[str], np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        cache = self._cache
+        if cache is not None and cache[0] == self._version:
+            return cache[1:]
+        with self._cache_lock:
+            cache = self._cache
+            if cache is not None and cache[0] == self._version:
+                return cache[1:]
+            # Una escritura durante la carga cambia la versión y fuerza otra recarga
+            version = self._version
+            with self._readers.connection() as conn:
+                rows = conn.execute("SELECT id, metadata, embedding FROM chunks").fetchall()
+            ids = [row[0] for row in rows]
+            metadatas = [json.loads(row[1]) for row in rows]
+            if rows:
+                matrix = np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+            else:
+                matrix = np.zeros((0, 0), dtype=np.float32)
+            norms = np.einsum("ij,ij->i", matrix, matrix) if rows else np.zeros(0, dtype=np.float32)
+            self._cache = (version, ids, matrix, norms, metadatas)
+            return self._cache[1:]
+
+    def upsert(self, ids, embeddings, texts, metadatas):
+        rows = [
+            (chunk_id, text, json.dumps(metadata or {}, ensure_ascii=False),
+             np.asarray(embedding, dtype=np.float32).tobytes())
+            for chunk_id, embedding, text, metadata in zip(ids, embeddings, texts, metadatas)
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO chunks (id, text, metadata, embedding) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET text=excluded.text, "
+                    "metadata=excluded.metadata, embedding=excluded.embedding",
+                    rows
+                )
+            self._version += 1
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            if where:
+                cached_ids, _, _, metadatas = self._load_cache()
+                targets = [i for i, m in zip(cached_ids, metadatas) if matches_where(m, where)]
+                if ids is not None:
+                    targets = list(set(targets) & set(ids))
+            else:
+                targets = list(ids or [])
+            if not targets:
+                return
+            with self._conn:
+                self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in targets])
+            self._version += 1
+
+    def query(self, embedding, k, where=None, include_embeddings=False):
+        ids, matrix, norms, metadatas = self._load_cache()
+        if not ids or k <= 0:
+            return []
+        q = np.asarray(embedding, dtype=np.float32)
+        # ||m - q||² = ||m||² - 2 m·q + ||q||²
+        distances = norms - 2.0 * (matrix @ q) + float(q @ q)
+        if where:
+            mask = np.fromiter((matches_where(m, where) for m in metadatas), dtype=bool, count=len(ids))
+            distances = np.where(mask, distances, np.inf)
+            k = min(k, int(mask.sum()))
+            if k == 0:
+                return []
+        k = min(k, len(ids))
+        top = np.argpartition(distances, k - 1)[:k] if k < len(ids) else np.arange(len(ids))
+        top = top[np.argsort(distances[top])]
+
+        top_ids = [ids[i] for i in top]
+        texts = self._fetch_texts(top_ids)
+        return [
+            QueryResult(
+                id=ids[i],
+                text=texts[ids[i]],
+                metadata=metadatas[i],
+                distance=max(0.0, float(distances[i])),
+                embedding=matrix[i].tolist() if include_embeddings else None
+            )
+            for i in top
+        ]
+
+    def _fetch_texts(self, ids: List[str]) -> Dict[str, str]:
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._readers.connection() as conn:
+            rows = conn.execute(f"SELECT id, text FROM chunks WHERE id IN ({placeholders})", ids).fetchall()
+        return dict(rows)
+
+    def get(self, ids=None, where=None, limit=None, include_embeddings=False):
+        with self._readers.connection() as conn:
+            if ids is not None:
+                placeholders = ",".join("?" * len(ids))
+                rows = conn.execute(
+                    f"SELECT id, text, metadata, embedding FROM chunks WHERE id IN ({placeholders})", ids
+                ).fetchall() if ids else []
+            else:
+                rows = conn.execute("SELECT id, text, metadata, embedding FROM chunks").fetchall()
+        result = {"ids": [], "texts": [], "metadatas": [], "embeddings": [] if include_embeddings else None}
+        for chunk_id, text, metadata_json, blob in rows:
+            metadata = json.loads(metadata_json)
+            if not matches_where(metadata, where):
+                continue
+            result["ids"].append(chunk_id)
+            result["texts"].append(text)
+            result["metadatas"].append(metadata)
+            if include_embeddings:
+                result["embeddings"].append(np.frombuffer(blob, dtype=np.float32).tolist())
+            if limit is not None and len(result["ids"]) >= limit:
+                break
+        return result
+
+    def count(self):
+        with self._readers.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def snapshot(self, batch_size=1000):
+        # Conexión propia en una transacción de lectura: vista consistente con WAL
+        connection = sqlite3.connect(self._readers.uri, uri=True, timeout=30)
+        try:
+            connection.execute("BEGIN")
+            cursor = connection.execute("SELECT id, text, metadata, embedding FROM chunks ORDER BY rowid")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield {
+                    "ids": [row[0] for row in rows],
+                    "texts": [row[1] for row in rows],
+                    "metadatas": [json.loads(row[2]) for row in rows],
+                    "embeddings": [np.frombuffer(row[3], dtype=np.float32).tolist() for row in rows]
+                }
+        finally:
+            connection.close()
+
+    def vacuum(self):
+        with self._lock:
+            self._conn.execute("VACUUM")
+
+    def memory_bytes(self):
+        # Solo la matriz cargada cuenta; antes de la primera búsqueda no hay nada en memoria
+        cache = self._cache
+        if cache is None:
+            return 0
+        from memory_report import sampled_sizeof
+
+        _, ids, matrix, norms, metadatas = cache
+        return matrix.nbytes + norms.nbytes + sampled_sizeof(ids) + sampled_sizeof(metadatas)
+
+    def drop(self):
+        with self._lock:
+            self._readers.close()
+            self._conn.close()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+            self._cache = None
+
+
+SHARD_STRATEGIES = ("document", "directory")
+
+# Pool compartido por todos los índices fragmentados del proceso
+_shard_pool: Optional[ThreadPoolExecutor] = None
+_shard_pool_lock = threading.Lock()
+
+
+def _get_shard_pool() -> ThreadPoolExecutor:
+    global _shard_pool
+    with _shard_pool_lock:
+        if _shard_pool is None:
+            _shard_pool = ThreadPoolExecutor(max_workers=max(4, os.cpu_count() or 1),
+                                             thread_name_prefix="rag-shard")
+        return _shard_pool
+
+
+class ShardedBackend(VectorBackend):
+    """
+    Índice repartido en N backends independientes.
+
+    Las escrituras se enrutan por documento (hash de `file_path`) o por directorio
+    de origen (hash de su carpeta), así que todos los chunks de un documento viven
+    en el mismo fragmento. Las búsquedas se lanzan en paralelo a todos los
+    fragmentos y se mezclan en un top-k global; un fragmento que no responde dentro
+    de `timeout` se omite de esa respuesta en lugar de bloquearla.
+    """
+
+    name = "sharded"
+
+    def __init__(self, shards: List[VectorBackend], strategy: str = "document",
+                 timeout: Optional[float] = None,
+                 route_key: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None):
+        if strategy not in SHARD_STRATEGIES:
+            raise ValueError(f"Estrategia de fragmentación no soportada: {strategy}")
+        self.shards = shards
+        self.strategy = strategy
+        self.timeout = timeout
+        # Ruta del documento de un chunk cuando la metadata no la lleva (metadata compacta)
+        self.route_key = route_key
+        self.collection_name = shards[0].collection_name.rsplit("_s", 1)[0]
+        self.stats = {"queries": 0, "shard_timeouts": 0, "shard_errors": 0}
+        self._stats_lock = threading.Lock()
+
+    def route(self, chunk_id: str, metadata: Optional[Dict[str, Any]]) -> int:
+        """Fragmento destino de un chunk"""
+        metadata = metadata or {}
+        key = ((self.route_key(metadata) if self.route_key else None)
+               or metadata.get("file_path") or metadata.get("source") or chunk_id)
+        if self.strategy == "directory" and key != chunk_id:
+            key = os.path.dirname(os.path.abspath(key))
+        return zlib.crc32(key.encode("utf-8")) % len(self.shards)
+
+    def _fan_out(self, call: Callable[[VectorBackend], Any], timeout: Optional[float] = None) -> List[Any]:
+        """Ejecuta `call` en todos los fragmentos en paralelo; omite los que fallan o tardan"""
+        pool = _get_shard_pool()
+        futures = {pool.submit(call, shard): index for index, shard in enumerate(self.shards)}
+        done, pending = wait(futures, timeout=timeout)
+        results = []
+        for future in done:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                with self._stats_lock:
+                    self.stats["shard_errors"] += 1
+                logger.warning(f"Fragmento {futures[future]} falló: {str(e)}")
+        if pending:
+            with self._stats_lock:
+                self.stats["shard_timeouts"] += len(pending)
+            logger.warning(f"{len(pending)} fragmento(s) superaron {timeout}s; respuesta parcial")
+        return results
+
+    def _broadcast(self, call: Callable[[VectorBackend], Any]) -> List[Any]:
+        """Ejecuta `call` en todos los fragmentos y propaga el primer error (escrituras)"""
+        pool = _get_shard_pool()
+        return [future.result() for future in [pool.submit(call, shard) for shard in self.shards]]
+
+    def upsert(self, ids, embeddings, texts, metadatas):
+        groups: Dict[int, List[int]] = {}
+        for i, chunk_id in enumerate(ids):
+            groups.setdefault(self.route(chunk_id, metadatas[i]), []).append(i)
+        pool = _get_shard_pool()
+        futures = [
+            pool.submit(self.shards[shard_index].upsert,
+                        [ids[i] for i in rows], [embeddings[i] for i in rows],
+                        [texts[i] for i in rows], [metadatas[i] for i in rows])
+            for shard_index, rows in groups.items()
+        ]
+        for future in futures:
+            future.result()
+
+    def delete(self, ids=None, where=None):
+        # Los ids no indican el fragmento: el borrado se difunde a todos
+        self._broadcast(lambda shard: shard.delete(ids=ids, where=where))
+
+    def query(self, embedding, k, where=None, include_embeddings=False):
+        with self._stats_lock:
+            self.stats["queries"] += 1
+        partials = self._fan_out(lambda shard: shard.query(embedding, k, where, include_embeddings),
+                                 timeout=self.timeout)
+        return heapq.nsmallest(k, (r for partial in partials for r in partial), key=lambda r: r.distance)
+
+    def get(self, ids=None, where=None, limit=None, include_embeddings=False):
+        result = {"ids": [], "texts": [], "metadatas": [], "embeddings": [] if include_embeddings else None}
+        for shard in self.shards:
+            remaining = None if limit is None else limit - len(result["ids"])
+            if remaining is not None and remaining <= 0:
+                break
+            part = shard.get(ids=ids, where=where, limit=remaining, include_embeddings=include_embeddings)
+            for key in ("ids", "texts", "metadatas"):
+                result[key].extend(part[key])
+            if include_embeddings:
+                result["embeddings"].extend(part["embeddings"])
+        return result
+
+    def count(self):
+        return sum(self.shard_counts())
+
+    def shard_counts(self) -> List[int]:
+        """Chunks por fragmento"""
+        return self._broadcast(lambda shard: shard.count())
+
+    def snapshot(self, batch_size=1000):
+        for shard in self.shards:
+            yield from shard.snapshot(batch_size)
+
+    def drop(self):
+        self._broadcast(lambda shard: shard.drop())
+
+    def vacuum(self):
+        for shard in self.shards:
+            shard.vacuum()
+
+    def memory_bytes(self):
+        return sum(shard.memory_bytes() for shard in self.shards)
+
+
+VECTOR_BACKENDS: Dict[str, Callable[[str, str], VectorBackend]] = {
+    ChromaBackend.name: ChromaBackend,
+    SQLiteNumpyBackend.name: SQLiteNumpyBackend,
+}
+
+
+def existing_collections(persist_directory: str) -> Dict[str, str]:
+    """
+    Colecciones presentes en un directorio y el backend que las guarda, sin abrir
+    los backends (se lee el catálogo SQLite de Chroma y los archivos de `sqlite_numpy`)
+    """
+    found: Dict[str, str] = {}
+    if not os.path.isdir(persist_directory):
+        return found
+    suffix = ".vectors.sqlite3"
+    for filename in os.listdir(persist_directory):
+        if filename.endswith(suffix):
+            found[filename[:-len(suffix)]] = SQLiteNumpyBackend.name
+    chroma_path = os.path.join(persist_directory, "chroma.sqlite3")
+    if os.path.exists(chroma_path):
+        try:
+            connection = sqlite3.connect(f"file:{chroma_path}?mode=ro", uri=True)
+            try:
+                for (name,) in connection.execute("SELECT name FROM collections"):
+                    found[name] = ChromaBackend.name
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudieron leer las colecciones de {chroma_path}: {str(e)}")
+    return found
+
+
+def create_backend(kind: str, persist_directory: str, collection_name: str, shards: int = 1,
+                   shard_strategy: str = "document", shard_timeout: Optional[float] = None,
+                   route_key: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None,
+                   read_connections: int = 4) -> VectorBackend:
+    """
+    Crea un backend por nombre ('chroma' o 'sqlite_numpy')
+    Con shards > 1 devuelve un ShardedBackend sobre las colecciones `<nombre>_s<i>`;
+    `route_key` resuelve la ruta del documento de un chunk para enrutarlo.
+    `read_connections` es el tamaño del pool de lectura de `sqlite_numpy` (Chroma
+    ya usa una conexión por hilo).
+    """
+    if kind not in VECTOR_BACKENDS:
+        raise ValueError(f"Backend vectorial no soportado: {kind}. Disponibles: {', '.join(VECTOR_BACKENDS)}")
+
+    def make(name: str) -> VectorBackend:
+        if kind == SQLiteNumpyBackend.name:
+            return SQLiteNumpyBackend(persist_directory, name, read_connections=read_connections)
+        return VECTOR_BACKENDS[kind](persist_directory, name)
+
+    if shards <= 1:
+        return make(collection_name)
+    return ShardedBackend(
+        [make(f"{collection_name}_s{i}") for i in range(shards)],
+        strategy=shard_strategy,
+        timeout=shard_timeout,
+        route_key=route_key
+    )
+
+
+class BackendVectorStore(VectorStore):
+    """
+    Adaptador de un VectorBackend a la interfaz VectorStore de langchain.
+    Con `codec` (p. ej. un FileRegistry) la metadata se guarda compacta y se
+    rehidrata solo en los documentos devueltos.
+    """
+
+    def __init__(self, backend: VectorBackend, embedding: Embeddings, codec: Any = None):
+        self.backend = backend
+        self._embedding = embedding
+        self.codec = codec
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def encode_metadatas(self, metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Metadata tal como se guarda en el backend"""
+        return self.codec.encode(metadatas) if self.codec is not None else metadatas
+
+    def decode_metadatas(self, metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Metadata completa a partir de la guardada en el backend"""
+        return self.codec.decode(metadatas) if self.codec is not None else metadatas
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], texts: List[str],
+               metadatas: List[Dict[str, Any]]):
+        """Inserta chunks con embeddings ya calculados (metadata completa)"""
+        with span("upsert"):
+            self.backend.upsert(ids, embeddings, texts, self.encode_metadatas(metadatas))
+
+    def _to_documents(self, results: List[QueryResult]) -> List[Document]:
+        metadatas = self.decode_metadatas([r.metadata for r in results])
+        return [Document(page_content=r.text, metadata=metadata) for r, metadata in zip(results, metadatas)]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self.upsert(ids, vectors, texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        self.backend.delete(ids=ids, where=kwargs.get("where"))
+        return True
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        results = self.backend.query(embedding, k, where=filter)
+        return list(zip(self._to_documents(results), (r.distance for r in results)))
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return self._euclidean_relevance_score_fn
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5,
+                                                filter: Optional[Dict[str, Any]] = None,
+                                                **kwargs: Any) -> List[Document]:
+        from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+        candidates = self.backend.query(embedding, fetch_k, where=filter, include_embeddings=True)
+        if not candidates:
+            return []
+        selected = maximal_marginal_relevance(
+            np.array(embedding, dtype=np.float32),
+            [c.embedding for c in candidates],
+            lambda_mult=lambda_mult,
+            k=k
+        )
+        return self._to_documents([candidates[i] for i in selected])
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, filter: Optional[Dict[str, Any]] = None,
+                                      **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k, fetch_k, lambda_mult, filter
+        )
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, backend: Optional[VectorBackend] = None,
+                   **kwargs: Any) -> "BackendVectorStore":
+        if backend is None:
+            raise ValueError("BackendVectorStore.from_texts necesita un backend")
+        store = cls(backend, embedding)
+        store.add_texts(texts, metadatas, ids)
+        return store